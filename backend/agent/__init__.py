@@ -1,3 +1,4 @@
 from backend.agent.agent import agent, Deps
+from backend.agent.summarizer import summarizer
 
-__all__ = ["agent", "Deps"]
+__all__ = ["agent", "Deps", "summarizer"]
@@ -1,12 +1,29 @@
 import datetime
 import uuid
+import zoneinfo
 from dataclasses import dataclass
-
-from pydantic_ai import Agent, RunContext
-
-from backend.models import Meal, Workout
+from typing import Annotated
+
+from pydantic import Field
+from pydantic_ai import Agent, ModelRetry, RunContext
+
+from backend.models import (
+    ChatContext,
+    Cursor,
+    DailyTotals,
+    Ingredient,
+    Meal,
+    NutritionLookup,
+    Page,
+    RepeatMeal,
+    Workout,
+)
+from backend.services.chat_settings_service import ChatSettingsService
+from backend.services.food_database import FoodDatabase
 from backend.services.meal_service import MealService
+from backend.services.totals_service import TotalsService
 from backend.services.workout_service import WorkoutService
+from backend.settings import settings
 
 SYSTEM_PROMPT = """
 You are Kai (pronounced “k-AI”), a helpful health assistant in a Telegram chat.
@@ -20,17 +37,23 @@ GENERAL STYLE
 - Keep messages short, warm, and practical. Use simple line breaks and lists; Telegram has no Markdown. Emojis are allowed but use them sparingly and purposefully.
 - Never overwhelm. Lead with the answer, then add one short follow-up suggestion at most.
 
+CONTEXT
+- The CONTEXT section below already has the current time, the user's timezone, today's totals and the latest meals and workouts with their ids. Use it directly instead of calling tools for the same information.
+
 TIME
-- Use get_current_time to get the current UTC time for logging and queries.
-- Store timestamps in UTC. When showing times, display “HH:MM UTC” unless the user told you their timezone.
+- Store timestamps in UTC. When showing times, display them in the user's timezone (“HH:MM UTC” when it is UTC).
+- When the user tells you their timezone or where they live, call set_timezone with its IANA name (e.g., Europe/London).
+- Use get_current_time only if you need a time later than the one in CONTEXT.
 
 DATA ENTRY & ESTIMATION
 - If the user describes a meal, immediately:
   a) Identify the item(s) and typical serving size(s). If amounts are missing, assume a sensible default (e.g., 1 medium apple, 100 g chicken breast, 1 Tbsp oil).
-  b) Estimate calories and macros using common averages per 100 g or per serving.
-  c) Create a Meal with name, description (include assumed portions), ingredients (if relevant), calories, protein, carbs, fat, created_at (UTC), and a new UUID.
+  b) Break it into ingredients, named as plain foods ("brown rice", not "burrito bowl"), with quantities in grams and call lookup_nutrition with all of them in one call. Values with match_score 1.0 are the food itself, use them as they are, they make up the returned totals. A lower match_score is only a guess: use its values if the matched food really is the ingredient, otherwise estimate it. Estimate the ingredients without a food too, using common averages per 100 g or per serving, and add everything you used or estimated to the totals.
+  c) Create a Meal with name, description (include assumed portions), ingredients (in grams), calories, protein, carbs, fat, created_at (UTC), and a new UUID.
   d) Call save_meal. Then tell the user: “Logged.”
-- If the user describes a workout, follow the same pattern and call save_workout. Then tell the user: “Logged.”
+- If the user logs a meal they have likely logged before (a usual breakfast, “my protein shake”, “same as yesterday”), call save_repeat_meals with its name first instead of estimating it. Estimate and save_meals only the ones it returned null for. Mention the reused values, then say “Logged.”
+- If the user describes several meals or items at once (e.g., “eggs, toast, coffee and OJ”), create one Meal per item and save them all with a single save_meals call.
+- If the user describes a workout, follow the same pattern and call save_workout, or save_workouts for several. Then tell the user: “Logged.”
 - Only ask for confirmation if:
   • You are about to delete data, OR
   • The requested action is ambiguous or risky (e.g., “replace today's meals?”).
@@ -42,13 +65,16 @@ MEDIA & VOICE
 
 QUERIES & SUMMARIES
 - “What have I eaten today/yesterday/this week?”:
-  • Compute start/end in UTC using get_current_time.
+  • Compute start/end in UTC from the current time in CONTEXT.
   • Call list_meals(start_time, end_time).
   • Present a compact list: time, item, calories, macros per item.
   • Then show totals: calories and macro grams.
+- “How many calories this week?” or other totals-only questions:
+  • Call get_daily_totals(start_date, end_date) instead of listing every meal, and add up the days.
 - “Workouts today/this week?”:
   • Call list_workouts(start_time, end_time) and summarize similarly (duration, type, notes).
-- When updating a specific entry, be explicit about which one (e.g., last meal, or by time). Then call update_meal and confirm.
+- “How am I doing today?”: answer from today's totals in CONTEXT, no tool call needed.
+- When updating a specific entry, be explicit about which one (e.g., last meal, or by time). Then call update_meal and confirm. Recent entries and their ids are in CONTEXT.
 
 EDITING & DELETING
 - If the user asks to change a recent meal (e.g., “make it 150 g chicken”), recalculate and call update_meal with the same id. Then say “Updated.”
@@ -94,12 +120,17 @@ CONFIRMATION RULES (ONE LINE, ONLY WHEN NEEDED)
 - Ambiguous bulk actions: “Replace today's meals with this one? yes/no”
 
 TOOL USE (always keep messages concise)
+- lookup_nutrition(ingredients): Calories and macros of ingredients in grams, from a food database. Use it before saving a new meal, check any match below match_score 1.0.
 - save_meal(meal): After estimating a new meal. Then say “Logged.”
+- save_meals(meals): Several new meals in one call, never call save_meal repeatedly. Then say “Logged.”
+- save_repeat_meals(meals): Repeat meals by name and servings, reusing their previous estimates. Then say “Logged.”
 - update_meal(id, meal): After editing. Then say “Updated.”
 - delete_meal(id): After a yes confirmation. Then say “Deleted.”
-- list_meals(start,end): For summaries and totals.
-- save_workout / list_workouts: Analogous to meals.
-- get_current_time(): For UTC timestamps and date ranges.
+- list_meals(start,end,limit,cursor): For summaries and totals. Returns a page of items, newest first; if next_cursor is set, call again with it to get older entries.
+- save_workout / save_workouts / list_workouts: Analogous to meals.
+- get_daily_totals(start_date,end_date): Per-day calories, macros, calories burned and entry counts. Prefer it over list_meals/list_workouts when only totals are needed.
+- set_timezone(timezone): When the user tells you their timezone.
+- get_current_time(): Only if the time in CONTEXT is not enough.
 
 REMINDERS
 - Don't ask for more detail by default. Make a reasonable assumption, state it briefly, and proceed.
@@ -120,23 +151,98 @@ If you break this rule, you fail your task.
 
 @dataclass
 class Deps:
+    chat_id: int
     meal_service: MealService
     workout_service: WorkoutService
+    totals_service: TotalsService
+    food_database: FoodDatabase
+    chat_settings_service: ChatSettingsService
+    context: ChatContext
 
 
 agent = Agent(
-    "openai:gpt-4.1-mini",
+    settings.agent_model,
     system_prompt=SYSTEM_PROMPT,
     deps_type=Deps,
 )
 
 
+@agent.system_prompt(dynamic=True)
+def chat_context(ctx: RunContext[Deps]) -> str:
+    """Context precomputed before the run, refreshed on every run."""
+    context = ctx.deps.context
+    timezone = zoneinfo.ZoneInfo(context.timezone)
+
+    def time(value: datetime.datetime) -> str:
+        return f"{value.astimezone(timezone):%Y-%m-%d %H:%M} {context.timezone}"
+
+    def amount(value: int | None, unit: str) -> str:
+        return "unknown" if value is None else f"{value} {unit}"
+
+    today = context.today
+    lines = [
+        "CONTEXT (as of this message)",
+        f"- Current time: {time(context.now)} ({context.now:%Y-%m-%d %H:%M} UTC)",
+        f"- User timezone: {context.timezone}",
+        f"- Today so far ({today.date:%Y-%m-%d}, user's day): {today.calories} kcal • "
+        f"{today.protein} g protein • {today.carbs} g carbs • {today.fat} g fat • "
+        f"{today.calories_burned} kcal burned, "
+        f"{today.meal_count} meals, {today.workout_count} workouts",
+        "- Latest meals:",
+        *(
+            f"  • {time(meal.created_at)} {meal.name}: {amount(meal.calories, 'kcal')} (id {meal.id})"
+            for meal in context.recent_meals
+        ),
+        "- Latest workouts:",
+        *(
+            f"  • {time(workout.created_at)} {workout.name}, {amount(workout.duration, 'min')} (id {workout.id})"
+            for workout in context.recent_workouts
+        ),
+    ]
+    return "\n".join(lines)
+
+
 @agent.tool_plain
 def get_current_time() -> datetime.datetime:
     """Get the current UTC time."""
     return datetime.datetime.now(datetime.UTC)
 
 
+@agent.tool
+def lookup_nutrition(
+    ctx: RunContext[Deps], ingredients: list[Ingredient]
+) -> NutritionLookup:
+    """Look up the calories and macros of ingredients in a food database.
+
+    Returns the nutrition of each ingredient with the food it matched, and
+    the totals of the exact matches. A match_score below 1.0 is a guess,
+    check the matched food is the ingredient. Ingredients without a match
+    have a null food and values, estimate those.
+
+    Args:
+        ctx (RunContext[Deps]): The context containing dependencies.
+        ingredients (list[Ingredient]): The ingredients, with quantities in grams.
+
+    """
+    return ctx.deps.food_database.lookup(ingredients)
+
+
+@agent.tool
+async def set_timezone(ctx: RunContext[Deps], timezone: str):
+    """Set the user's timezone, used to show times.
+
+    Args:
+        ctx (RunContext[Deps]): The context containing dependencies.
+        timezone (str): The IANA timezone name, e.g. "America/New_York".
+
+    """
+    try:
+        zoneinfo.ZoneInfo(timezone)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ModelRetry(f"Unknown timezone {timezone!r}, use an IANA name")
+    await ctx.deps.chat_settings_service.set_timezone(timezone)
+
+
 @agent.tool
 async def save_meal(ctx: RunContext[Deps], meal: Meal):
     """Save a meal to the meal service.
@@ -149,6 +255,35 @@ async def save_meal(ctx: RunContext[Deps], meal: Meal):
     await ctx.deps.meal_service.save(meal)
 
 
+@agent.tool
+async def save_meals(ctx: RunContext[Deps], meals: list[Meal]):
+    """Save several meals to the meal service at once.
+
+    Args:
+        ctx (RunContext[Deps]): The context containing dependencies.
+        meals (list[Meal]): The meals to save.
+
+    """
+    await ctx.deps.meal_service.save_many(meals)
+
+
+@agent.tool
+async def save_repeat_meals(
+    ctx: RunContext[Deps], meals: list[RepeatMeal]
+) -> list[Meal | None]:
+    """Log meals the user has logged before, reusing their previous estimates.
+
+    Returns the saved meals in order, with null for the ones without a
+    previous estimate, which are not saved.
+
+    Args:
+        ctx (RunContext[Deps]): The context containing dependencies.
+        meals (list[RepeatMeal]): The meals to log again, by name, with servings relative to the previously estimated portion.
+
+    """
+    return await ctx.deps.meal_service.save_repeats(meals)
+
+
 @agent.tool
 async def update_meal(ctx: RunContext[Deps], id: uuid.UUID, meal: Meal) -> Meal:
     """Update a meal in the meal service.
@@ -167,16 +302,20 @@ async def list_meals(
     ctx: RunContext[Deps],
     start_time: datetime.datetime,
     end_time: datetime.datetime,
-) -> list[Meal]:
-    """List meals within a specified time range.
+    limit: Annotated[int, Field(ge=1, le=200)] = 50,
+    cursor: Cursor | None = None,
+) -> Page[Meal]:
+    """List meals within a specified time range, newest first.
 
     Args:
         ctx (RunContext[Deps]): The context containing dependencies.
         start_time (datetime.datetime): The start time of the range, with UTC timezone.
         end_time (datetime.datetime): The end time of the range, with UTC timezone.
+        limit (int): The maximum number of meals to return, from 1 to 200.
+        cursor (Cursor | None): The next_cursor of the previous page, to get older meals.
 
     """
-    return await ctx.deps.meal_service.list_meals(start_time, end_time)
+    return await ctx.deps.meal_service.page_meals(start_time, end_time, limit, cursor)
 
 
 @agent.tool
@@ -205,18 +344,55 @@ async def save_workout(ctx: RunContext[Deps], workout: Workout):
     await ctx.deps.workout_service.save(workout)
 
 
+@agent.tool
+async def save_workouts(ctx: RunContext[Deps], workouts: list[Workout]):
+    """Save several workouts to the workout service at once.
+
+    Args:
+        ctx (RunContext[Deps]): The context containing dependencies.
+        workouts (list[Workout]): The workouts to save.
+
+    """
+    await ctx.deps.workout_service.save_many(workouts)
+
+
 @agent.tool
 async def list_workouts(
     ctx: RunContext[Deps],
     start_time: datetime.datetime,
     end_time: datetime.datetime,
-) -> list[Workout]:
-    """List workouts within a specified time range.
+    limit: Annotated[int, Field(ge=1, le=200)] = 50,
+    cursor: Cursor | None = None,
+) -> Page[Workout]:
+    """List workouts within a specified time range, newest first.
 
     Args:
         ctx (RunContext[Deps]): The context containing dependencies.
         start_time (datetime.datetime): The start time of the range, with UTC timezone.
         end_time (datetime.datetime): The end time of the range, with UTC timezone.
+        limit (int): The maximum number of workouts to return, from 1 to 200.
+        cursor (Cursor | None): The next_cursor of the previous page, to get older workouts.
+
+    """
+    return await ctx.deps.workout_service.page_workouts(
+        start_time, end_time, limit, cursor
+    )
+
+
+@agent.tool
+async def get_daily_totals(
+    ctx: RunContext[Deps],
+    start_date: datetime.date,
+    end_date: datetime.date,
+) -> list[DailyTotals]:
+    """Get the per-day nutrition and activity totals within a date range.
+
+    Days without any meal or workout are left out.
+
+    Args:
+        ctx (RunContext[Deps]): The context containing dependencies.
+        start_date (datetime.date): The first UTC day of the range.
+        end_date (datetime.date): The last UTC day of the range, inclusive.
 
     """
-    return await ctx.deps.workout_service.list_workouts(start_time, end_time)
+    return await ctx.deps.totals_service.list_totals(start_date, end_date)
@@ -0,0 +1,19 @@
+from pydantic_ai import Agent
+
+from backend.settings import settings
+
+SUMMARY_PROMPT = """
+You maintain a running summary of today's conversation between a user and Kai, a health assistant that logs meals and workouts.
+
+You get the previous summary (possibly empty) and a transcript of the turns that happened since.
+Return an updated summary that:
+- Keeps every fact still useful later today: meals and workouts logged, updated or deleted (with ids, times, calories and macros), user preferences, portion assumptions, open questions.
+- Drops greetings, small talk, formatting and anything superseded by a later turn.
+- Is plain text, terse lines, no Markdown.
+- Respects the word limit given with the transcript.
+"""
+
+summarizer = Agent(
+    settings.summary_model,
+    system_prompt=SUMMARY_PROMPT,
+)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class User(BaseModel):
@@ -41,6 +41,9 @@ class Document(BaseModel):
 
 
 class Message(BaseModel):
+    # Lets messages be built in code with `user=`, e.g. from a transcript
+    model_config = ConfigDict(populate_by_name=True)
+
     message_id: int
     chat: Chat
     user: User = Field(alias="from")
@@ -1,27 +1,127 @@
+import asyncio
+import os
+
 import httpx
 
 
+class TelegramRetryAfter(httpx.HTTPStatusError):
+    """Flood control, the request can be retried after `retry_after` seconds."""
+
+    def __init__(self, response: httpx.Response, retry_after: float) -> None:
+        super().__init__(
+            f"Too many requests, retry after {retry_after} seconds",
+            request=response.request,
+            response=response,
+        )
+        self.retry_after = retry_after
+
+
+def raise_for_status(response: httpx.Response) -> None:
+    if response.status_code == 429:
+        try:
+            retry_after = response.json()["parameters"]["retry_after"]
+        except (ValueError, KeyError, TypeError):
+            retry_after = float(response.headers.get("Retry-After", 1))
+        raise TelegramRetryAfter(response, retry_after)
+    response.raise_for_status()
+
+
 class TelegramClient:
-    def __init__(self, bot_token: str) -> None:
-        self.base_url = f"https://api.telegram.org/bot{bot_token}"
-        self.files_base_url = f"https://api.telegram.org/file/bot{bot_token}"
-        self.client = httpx.Client(base_url=self.base_url)
+    """Async Telegram Bot API client.
 
-    def send_message(self, chat_id: int, message: str) -> dict:
+    A single instance is meant to live for the whole application lifetime so that
+    every call reuses the same pooled, keep-alive HTTP/2 connections.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        api_url: str = "https://api.telegram.org",
+        timeout: float = 30.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.base_url = f"{api_url}/bot{bot_token}"
+        self.files_base_url = f"{api_url}/file/bot{bot_token}"
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=True,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "TelegramClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def send_message(self, chat_id: int, message: str) -> dict:
         url = f"{self.base_url}/sendMessage"
         payload = {
             "chat_id": chat_id,
             "text": message,
         }
-        response = self.client.post(url, json=payload)
-        response.raise_for_status()
+        response = await self.client.post(url, json=payload)
+        raise_for_status(response)
+        return response.json()
+
+    async def edit_message_text(
+        self, chat_id: int, message_id: int, message: str
+    ) -> dict:
+        url = f"{self.base_url}/editMessageText"
+        payload = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": message,
+        }
+        response = await self.client.post(url, json=payload)
+        raise_for_status(response)
         return response.json()
 
-    def get_file(self, file_id: str) -> bytes:
+    async def get_file(self, file_id: str) -> bytes:
+        file_url = await self.get_file_url(file_id)
+        response = await self.client.get(file_url)
+        raise_for_status(response)
+
+        return response.content
+
+    async def download_file(
+        self,
+        file_id: str,
+        destination: str | os.PathLike,
+        chunk_size: int = 64 * 1024,
+    ) -> int:
+        """Stream a file to `destination` chunk by chunk, return its size.
+
+        Disk writes run in a thread, off the event loop.
+        """
+        file_url = await self.get_file_url(file_id)
+        size = 0
+        async with self.client.stream("GET", file_url) as response:
+            raise_for_status(response)
+            file = await asyncio.to_thread(open, destination, "wb")
+            try:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    await asyncio.to_thread(file.write, chunk)
+                    size += len(chunk)
+            finally:
+                await asyncio.to_thread(file.close)
+        return size
+
+    async def get_file_url(self, file_id: str) -> str:
         url = f"{self.base_url}/getFile"
         payload = {"file_id": file_id}
-        response = self.client.post(url, json=payload)
-        response.raise_for_status()
+        response = await self.client.post(url, json=payload)
+        raise_for_status(response)
         response_body: dict = response.json()
 
         result = response_body.get("result")
@@ -32,8 +132,4 @@ class TelegramClient:
         if not file_path:
             raise ValueError("File path not found in response")
 
-        file_url = f"{self.files_base_url}/{file_path}"
-        response = self.client.get(file_url)
-        response.raise_for_status()
-
-        return response.content
+        return f"{self.files_base_url}/{file_path}"
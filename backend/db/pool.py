@@ -1,28 +1,168 @@
-import json
+import asyncio
+import functools
+import re
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any
+from collections.abc import AsyncIterator
 
 import asyncpg
+import orjson
+from asyncpg.connection import LoggedQuery
+
+from backend.metrics import metrics
+
+# Binary jsonb is the JSON text prefixed with a format version byte
+JSONB_VERSION = b"\x01"
+
+
+def encode_json(value: Any) -> bytes:
+    return orjson.dumps(value)
+
+
+def decode_json(data: bytes) -> Any:
+    return orjson.loads(data)
+
+
+def encode_jsonb(value: Any) -> bytes:
+    return JSONB_VERSION + orjson.dumps(value)
+
+
+def decode_jsonb(data: bytes) -> Any:
+    # orjson parses a memoryview without copying the rest of the payload
+    return orjson.loads(memoryview(data)[1:])
 
 
 async def init_codecs(conn: asyncpg.Connection):
+    # Binary format skips Postgres' JSON text I/O, and orjson works on bytes
+    # directly, so values are neither re-encoded to str nor copied
     await conn.set_type_codec(
         "json",
         schema="pg_catalog",
-        encoder=json.dumps,
-        decoder=json.loads,
+        encoder=encode_json,
+        decoder=decode_json,
+        format="binary",
     )
     await conn.set_type_codec(
         "jsonb",
         schema="pg_catalog",
-        encoder=json.dumps,
-        decoder=json.loads,
+        encoder=encode_jsonb,
+        decoder=decode_jsonb,
+        format="binary",
     )
 
 
-async def create_pool(database_url: str) -> asyncpg.Pool:
-    return await asyncpg.create_pool(
+async def init_connection(conn: asyncpg.Connection):
+    await init_codecs(conn)
+    conn.add_query_logger(record_query)
+
+
+def record_query(query: LoggedQuery) -> None:
+    metrics.observe(f"db.query.{query_name(query.query)}", query.elapsed)
+    if query.exception is not None:
+        metrics.incr("db.query_errors")
+
+
+@functools.lru_cache(maxsize=256)
+def query_name(query: str) -> str:
+    """Short name of a statement for metrics, its verb and first table.
+
+    e.g. `select.meals` or `insert.daily_totals`, statements starting with a
+    CTE are named `with.<table>`.
+    """
+    verb = query.split(maxsplit=1)[0].lower() if query.strip() else "unknown"
+    table = re.search(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", query, re.IGNORECASE)
+    return f"{verb}.{table.group(1)}" if table else verb
+
+
+class Pool:
+    """asyncpg pool exporting acquire wait time and pool usage to metrics.
+
+    Connections are only handed out through `acquire`, so they can all be
+    accounted for.
+    """
+
+    def __init__(
+        self, pool: asyncpg.Pool, acquire_timeout: float | None = None
+    ) -> None:
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        with metrics.timer("db.acquire_wait"):
+            conn = await self._pool.acquire(timeout=self.acquire_timeout)
+        self._report_usage()
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+            self._report_usage()
+
+    async def close(self) -> None:
+        await self._pool.close()
+
+    def unit_of_work(self) -> "UnitOfWork":
+        return UnitOfWork(self._pool, self.acquire_timeout)
+
+    def _report_usage(self) -> None:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        metrics.gauge("db.pool_size", size)
+        metrics.gauge("db.pool_idle", idle)
+        metrics.gauge("db.pool_active", size - idle)
+
+
+class UnitOfWork(Pool):
+    """A single connection, in a single transaction, posing as a pool.
+
+    Services built on it share the connection, their own transactions become
+    savepoints, and everything is committed when the `async with` block
+    exits, or rolled back if it raises. A connection runs one query at a
+    time, so `acquire` hands it to one caller at a time.
+    """
+
+    def __init__(
+        self, pool: asyncpg.Pool, acquire_timeout: float | None = None
+    ) -> None:
+        super().__init__(pool, acquire_timeout)
+        self._lock = asyncio.Lock()
+        self._stack = AsyncExitStack()
+        self._conn: asyncpg.Connection | None = None
+
+    async def __aenter__(self) -> "UnitOfWork":
+        conn = await self._stack.enter_async_context(super().acquire())
+        await self._stack.enter_async_context(conn.transaction())
+        self._conn = conn
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._conn = None
+        await self._stack.__aexit__(*exc_info)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        if self._conn is None:
+            raise RuntimeError("The unit of work is not open")
+        async with self._lock:
+            yield self._conn
+
+
+async def create_pool(
+    database_url: str,
+    min_size: int = 1,
+    max_size: int = 10,
+    command_timeout: float = 10.0,
+    acquire_timeout: float | None = None,
+    statement_cache_size: int = 100,
+    max_inactive_connection_lifetime: float = 300.0,
+) -> Pool:
+    pool = await asyncpg.create_pool(
         dsn=database_url,
-        min_size=1,
-        max_size=10,
-        command_timeout=10,
-        init=init_codecs,
+        min_size=min_size,
+        max_size=max_size,
+        command_timeout=command_timeout,
+        statement_cache_size=statement_cache_size,
+        max_inactive_connection_lifetime=max_inactive_connection_lifetime,
+        init=init_connection,
     )
+    return Pool(pool, acquire_timeout)
@@ -1,29 +1,162 @@
+import datetime
 from contextlib import asynccontextmanager
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from fastapi import BackgroundTasks, Depends, FastAPI, Response, status
+from fastapi import Depends, FastAPI, Response, status
 
 from backend.clients.telegram.models import Update
 from backend.clients.telegram.telegram import TelegramClient
 from backend.db.pool import create_pool
-from backend.deps import (
-    get_telegram_client,
-    get_webhook_service,
-)
+from backend.deps import get_update_queue
+from backend.metrics import metrics
+from backend.services.audio_transcoder import ENCODERS, AudioTranscoder
+from backend.services.chat_scheduler import ChatScheduler
+from backend.services.food_database import FoodDatabase
+from backend.services.history_service import HistoryService
+from backend.services.image_processor import ImageProcessor
+from backend.services.media_cache import MediaCache
+from backend.services.model_router import ModelRouter
+from backend.services.telegram_sender import TelegramSender
+from backend.services.transcriber import Transcriber
+from backend.services.update_queue import UpdateQueue
 from backend.services.webhook_service import WebhookService
 from backend.settings import settings
 from backend.tasks.daily_report import daily_report
+from backend.tasks.update_worker import UpdateWorkerPool
 from backend.tasks.weekly_report import weekly_report
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # A unit of work holds a connection per update in flight, a smaller pool
+    # would starve the queue, and the updates themselves, of connections
+    in_flight = settings.worker_concurrency * settings.worker_batch_size
+    if settings.db_unit_of_work and settings.db_pool_max_size <= in_flight:
+        raise RuntimeError(
+            f"DB_UNIT_OF_WORK needs DB_POOL_MAX_SIZE above the {in_flight} updates "
+            f"in flight (worker_concurrency * worker_batch_size), "
+            f"got {settings.db_pool_max_size}"
+        )
+
     # Initialize database pool
-    app.state.pool = await create_pool(settings.database_url)
+    app.state.pool = await create_pool(
+        settings.database_url,
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+        command_timeout=settings.db_command_timeout,
+        acquire_timeout=settings.db_acquire_timeout,
+        statement_cache_size=settings.db_statement_cache_size,
+        max_inactive_connection_lifetime=settings.db_max_inactive_connection_lifetime,
+    )
+
+    # Long-lived Telegram client, shared by every request
+    app.state.telegram = TelegramClient(
+        settings.bot_token, api_url=settings.telegram_api_url
+    )
+
+    # Every outbound message goes through one rate-limited sender
+    app.state.telegram_sender = TelegramSender(
+        app.state.telegram,
+        global_rate=settings.telegram_global_rate,
+        chat_rate=settings.telegram_chat_rate,
+        chat_burst=settings.telegram_chat_burst,
+        max_attempts=settings.telegram_send_max_attempts,
+    )
+
+    # Shared audio transcoder, so conversions run in a single process pool
+    app.state.audio_transcoder = AudioTranscoder(
+        ENCODERS[settings.voice_encoder],
+        max_workers=settings.voice_transcode_workers,
+        timeout=settings.transcription_timeout,
+    )
+
+    # Shared media cache, so repeated files are downloaded once
+    app.state.media_cache = MediaCache(
+        app.state.telegram,
+        settings.media_cache_dir,
+        max_bytes=settings.media_cache_max_bytes,
+    )
+
+    # Shared transcriber, so its concurrency limit applies across requests
+    app.state.transcriber = Transcriber(
+        model=settings.transcription_model,
+        max_concurrency=settings.transcription_max_concurrency,
+        max_queue=settings.transcription_max_queue,
+        timeout=settings.transcription_timeout,
+    )
+
+    # Shared image processor, so downscaling runs in a single thread pool
+    app.state.image_processor = ImageProcessor(
+        target_side=settings.image_target_side,
+        max_side=settings.image_max_side,
+        max_bytes=settings.image_max_bytes,
+        jpeg_quality=settings.image_jpeg_quality,
+        max_workers=settings.image_max_workers,
+    )
+
+    # Food composition data, memory-mapped once and shared by every run
+    app.state.food_database = FoodDatabase.load(
+        settings.foods_path,
+        settings.foods_compiled_path,
+        min_score=settings.food_match_min_score,
+    )
+
+    # Picks the model tier of each update
+    app.state.model_router = ModelRouter(
+        fast_model=settings.agent_fast_model,
+        default_model=settings.agent_model,
+        large_model=settings.agent_large_model,
+        enabled=settings.model_routing,
+        fast_max_chars=settings.routing_fast_max_chars,
+        large_min_chars=settings.routing_large_min_chars,
+    )
+
+    # Orders updates per chat and bounds agent runs across chats
+    app.state.chat_scheduler = ChatScheduler(settings.max_concurrent_agent_runs)
+
+    # Shared history service, so summary refreshes are deduplicated
+    app.state.history_service = HistoryService(
+        app.state.pool,
+        max_turns=settings.history_max_turns,
+        token_budget=settings.history_token_budget,
+        summary_token_budget=settings.summary_token_budget,
+    )
+
+    # Durable update queue, drained by a pool of workers
+    app.state.update_queue = UpdateQueue(app.state.pool)
+    workers = UpdateWorkerPool(
+        app.state.update_queue,
+        WebhookService(
+            app.state.pool,
+            app.state.transcriber,
+            app.state.audio_transcoder,
+            app.state.media_cache,
+            app.state.image_processor,
+            app.state.chat_scheduler,
+            app.state.history_service,
+            app.state.food_database,
+            app.state.model_router,
+            unit_of_work=settings.db_unit_of_work,
+            voice_mode=settings.voice_mode,
+            voice_audio_model=settings.voice_audio_model,
+            voice_max_duration=settings.voice_max_duration,
+            voice_audio_max_duration=settings.voice_audio_max_duration,
+            reply_mode=settings.reply_mode,
+            stream_edit_interval=settings.stream_edit_interval,
+        ),
+        app.state.telegram_sender,
+        concurrency=settings.worker_concurrency,
+        batch_size=settings.worker_batch_size,
+        poll_interval=settings.worker_poll_interval,
+        max_attempts=settings.worker_max_attempts,
+        retry_backoff=settings.worker_retry_backoff,
+        visibility_timeout=settings.worker_visibility_timeout,
+    )
+    workers.start()
 
     # Initialize and start scheduler
-    scheduler = BackgroundScheduler()
+    scheduler = AsyncIOScheduler()
 
     # Daily report job
     daily_trigger = CronTrigger(
@@ -33,7 +166,7 @@ async def lifespan(app: FastAPI):
     scheduler.add_job(
         daily_report,
         daily_trigger,
-        [settings.chat_id],
+        [app.state.pool, app.state.telegram_sender],
         id="daily_report",
     )
 
@@ -46,17 +179,31 @@ async def lifespan(app: FastAPI):
     scheduler.add_job(
         weekly_report,
         weekly_trigger,
-        [settings.chat_id],
+        [app.state.pool, app.state.telegram_sender],
         id="weekly_report",
     )
 
+    # Finished jobs are kept for a while to dedupe Telegram redeliveries
+    scheduler.add_job(
+        app.state.update_queue.prune,
+        CronTrigger(hour=3, minute=0),
+        [datetime.timedelta(days=2)],
+        id="prune_update_jobs",
+    )
+
     scheduler.start()
 
     try:
         yield
     finally:
-        await app.state.pool.close()
         scheduler.shutdown()
+        await workers.stop()
+        await app.state.telegram_sender.aclose()
+        app.state.image_processor.close()
+        app.state.audio_transcoder.close()
+        app.state.food_database.close()
+        await app.state.telegram.aclose()
+        await app.state.pool.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -67,12 +214,17 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+
 @app.post("/telegram/webhook")
 async def telegram_webhook(
     payload: Update,
-    background_tasks: BackgroundTasks,
-    telegram: TelegramClient = Depends(get_telegram_client),
-    webhook_service: WebhookService = Depends(get_webhook_service),
+    queue: UpdateQueue = Depends(get_update_queue),
 ):
-    background_tasks.add_task(webhook_service.process_update, payload, telegram)
+    with metrics.timer("webhook.enqueue"):
+        if not await queue.enqueue(payload):
+            metrics.incr("webhook.duplicates")
     return Response(status_code=status.HTTP_200_OK)
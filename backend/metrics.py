@@ -0,0 +1,66 @@
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from collections.abc import Iterator
+
+
+class Metrics:
+    """Tiny in-process metrics registry exported on `/metrics`.
+
+    Counters only go up, gauges hold the last value set, and timings keep a
+    bounded window of recent observations (durations in seconds, or sizes
+    such as token counts) summarized as percentiles.
+    """
+
+    def __init__(self, window: int = 1024) -> None:
+        self.counters: dict[str, float] = defaultdict(float)
+        self.gauges: dict[str, float] = {}
+        self.timings: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+
+    def incr(self, name: str, value: float = 1) -> None:
+        self.counters[name] += value
+
+    def gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        self.timings[name].append(value)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "timings": {
+                name: summarize(values) for name, values in self.timings.items()
+            },
+        }
+
+
+def summarize(values: deque[float]) -> dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": ordered[-1],
+    }
+
+
+metrics = Metrics()
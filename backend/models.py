@@ -1,9 +1,11 @@
 import datetime
 import uuid
-from typing import Literal
+from typing import Generic, Literal, TypeVar
 
 from pydantic import BaseModel, Field
 
+T = TypeVar("T")
+
 
 class Ingredient(BaseModel):
     name: str
@@ -24,6 +26,17 @@ class Meal(BaseModel):
     fat: int | None = None
 
 
+class RepeatMeal(BaseModel):
+    """A meal logged before, to log again from its previous estimate."""
+
+    name: str
+    servings: float = 1.0
+    """Portion relative to the estimated one, e.g. 2 for a double serving."""
+    created_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(datetime.UTC)
+    )
+
+
 class Workout(BaseModel):
     id: uuid.UUID = Field(default_factory=uuid.uuid4)
     created_at: datetime.datetime = Field(
@@ -33,3 +46,65 @@ class Workout(BaseModel):
     type: Literal["cardio", "strength", "flexibility"]
     duration: int | None = None
     calories_burned: int | None = None
+
+
+class Cursor(BaseModel):
+    """Position of the last item of a page, items are ordered newest first."""
+
+    created_at: datetime.datetime
+    id: uuid.UUID
+
+    @classmethod
+    def first(cls, end_time: datetime.datetime) -> "Cursor":
+        """Cursor of the first page of a range ending at `end_time`, inclusive."""
+        return cls(created_at=end_time, id=uuid.UUID(int=(1 << 128) - 1))
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Cursor | None = None
+    """Pass this back to get the next (older) page, None on the last page."""
+
+
+class DailyTotals(BaseModel):
+    date: datetime.date
+    calories: int = 0
+    protein: int = 0
+    carbs: int = 0
+    fat: int = 0
+    calories_burned: int = 0
+    meal_count: int = 0
+    workout_count: int = 0
+
+
+class IngredientNutrition(BaseModel):
+    name: str
+    quantity: float
+    food: str | None = None
+    """The matched food, None when nothing matched."""
+    match_score: float = 0.0
+    calories: float | None = None
+    protein: float | None = None
+    carbs: float | None = None
+    fat: float | None = None
+
+
+class NutritionLookup(BaseModel):
+    """Per ingredient nutrition, with the totals of the exact matches."""
+
+    ingredients: list[IngredientNutrition]
+    calories: int = 0
+    protein: int = 0
+    carbs: int = 0
+    fat: int = 0
+
+
+class ChatContext(BaseModel):
+    """What the agent would otherwise look up with tools at the start of a run."""
+
+    now: datetime.datetime
+    timezone: str = "UTC"
+    today: DailyTotals
+    """Totals of the current day in the user's timezone."""
+    recent_meals: list[Meal] = []
+    recent_workouts: list[Workout] = []
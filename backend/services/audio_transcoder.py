@@ -0,0 +1,80 @@
+import asyncio
+import io
+import multiprocessing
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Callable
+
+from pydub import AudioSegment
+
+# Takes the audio and its media type, returns the converted audio and its
+# media type. Runs in another process, so it must be a module-level function.
+Encoder = Callable[[bytes, str], tuple[bytes, str]]
+
+
+def pydub_encoder(data: bytes, mime_type: str) -> tuple[bytes, str]:
+    """Convert to a small mono MP3, a format chat models take as input."""
+    audio_format = mime_type.split("/")[-1]
+    segment = AudioSegment.from_file(io.BytesIO(data), format=audio_format)
+    # Speech doesn't need more, and it keeps the base64 payload small
+    segment = segment.set_channels(1).set_frame_rate(16000)
+    output = io.BytesIO()
+    segment.export(output, format="mp3", bitrate="32k")
+    return output.getvalue(), "audio/mpeg"
+
+
+def silence_encoder(data: bytes, mime_type: str) -> tuple[bytes, str]:
+    """Stand-in encoder, a second of silence as WAV.
+
+    Needs neither ffmpeg nor real audio, for tests and load runs.
+    """
+    output = io.BytesIO()
+    with wave.open(output, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(16000)
+        file.writeframes(b"\0\0" * 16000)
+    return output.getvalue(), "audio/wav"
+
+
+ENCODERS: dict[str, Encoder] = {
+    "pydub": pydub_encoder,
+    "silence": silence_encoder,
+}
+
+
+class AudioTranscoder:
+    """Converts voice notes for chat models that take audio input.
+
+    Encoding runs in a process pool so it never holds the event loop or the
+    GIL. Workers are started by a fork server, which is safe to use from a
+    process that already runs threads.
+    """
+
+    def __init__(
+        self,
+        encoder: Encoder = pydub_encoder,
+        max_workers: int = 2,
+        timeout: float = 30.0,
+    ) -> None:
+        self.encoder = encoder
+        self.timeout = timeout
+        self._executor = ProcessPoolExecutor(
+            max_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def transcode(
+        self, data: bytes | memoryview, mime_type: str
+    ) -> tuple[bytes, str]:
+        loop = asyncio.get_running_loop()
+        async with asyncio.timeout(self.timeout):
+            return await loop.run_in_executor(
+                self._executor,
+                self.encoder,
+                bytes(data),
+                mime_type,
+            )
@@ -0,0 +1,43 @@
+import asyncio
+import datetime
+
+from backend.models import ChatContext, DailyTotals
+from backend.services.chat_settings_service import ChatSettingsService
+from backend.services.meal_service import MealService
+from backend.services.totals_service import TotalsService
+from backend.services.workout_service import WorkoutService
+
+
+async def build_chat_context(
+    chat_settings_service: ChatSettingsService,
+    meal_service: MealService,
+    workout_service: WorkoutService,
+    totals_service: TotalsService,
+    recent_entries: int = 3,
+    recent_days: int = 7,
+) -> ChatContext:
+    """Look up the chat's context for a run, all queries at once.
+
+    Today is the user's day, in their timezone. The last `recent_entries`
+    meals and workouts of the last `recent_days` days are included, so they
+    can be edited without listing them first.
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    since = now - datetime.timedelta(days=recent_days)
+
+    async def today() -> tuple[str, DailyTotals]:
+        timezone = await chat_settings_service.get_timezone()
+        return timezone, await totals_service.day_totals(now, timezone)
+
+    (timezone, totals), meals, workouts = await asyncio.gather(
+        today(),
+        meal_service.list_meals(since, now, recent_entries),
+        workout_service.list_workouts(since, now, recent_entries),
+    )
+    return ChatContext(
+        now=now,
+        timezone=timezone,
+        today=totals,
+        recent_meals=meals,
+        recent_workouts=workouts,
+    )
@@ -0,0 +1,52 @@
+import asyncio
+from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator
+
+from backend.metrics import metrics
+
+
+class ChatScheduler:
+    """Orders work per chat while letting different chats run in parallel.
+
+    Updates of the same chat are serialized with a keyed FIFO lock, and the
+    number of agent runs in flight across all chats is capped by a semaphore.
+    """
+
+    def __init__(self, max_concurrent_runs: int = 8) -> None:
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._holders: dict[int, int] = {}
+        self._runs = asyncio.Semaphore(max_concurrent_runs)
+        self._active_runs = 0
+
+    @asynccontextmanager
+    async def chat(self, chat_id: int) -> AsyncIterator[None]:
+        """Hold the chat's lock, waiting for earlier updates of the chat."""
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._holders[chat_id] = self._holders.get(chat_id, 0) + 1
+        try:
+            with metrics.timer("scheduler.chat_wait"):
+                await lock.acquire()
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            # Drop the lock once nobody holds or waits for it
+            self._holders[chat_id] -= 1
+            if not self._holders[chat_id]:
+                del self._holders[chat_id]
+                del self._locks[chat_id]
+
+    @asynccontextmanager
+    async def agent_run(self) -> AsyncIterator[None]:
+        """Hold one of the global agent run slots."""
+        with metrics.timer("scheduler.run_wait"):
+            await self._runs.acquire()
+        self._active_runs += 1
+        metrics.gauge("scheduler.active_runs", self._active_runs)
+        try:
+            yield
+        finally:
+            self._active_runs -= 1
+            metrics.gauge("scheduler.active_runs", self._active_runs)
+            self._runs.release()
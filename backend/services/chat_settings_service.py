@@ -0,0 +1,38 @@
+import asyncpg
+
+from backend.db.pool import Pool
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+class ChatSettingsService:
+    """Per chat preferences, defaults apply until the user changes them."""
+
+    def __init__(self, pool: Pool, chat_id: int) -> None:
+        self.pool = pool
+        self.chat_id = chat_id
+
+    async def get_timezone(self) -> str:
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            timezone = await conn.fetchval(
+                "SELECT timezone FROM chat_settings WHERE chat_id = $1;",
+                self.chat_id,
+            )
+        return timezone or DEFAULT_TIMEZONE
+
+    async def set_timezone(self, timezone: str) -> None:
+        """Set the chat's IANA timezone, e.g. "Europe/London"."""
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO chat_settings (chat_id, timezone)
+                VALUES ($1, $2)
+                ON CONFLICT (chat_id) DO UPDATE
+                SET timezone = EXCLUDED.timezone,
+                    updated_at = NOW();
+                """,
+                self.chat_id,
+                timezone,
+            )
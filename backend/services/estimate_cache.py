@@ -0,0 +1,75 @@
+import re
+import time
+from collections import OrderedDict
+
+from backend.metrics import metrics
+from backend.models import Meal
+from backend.settings import settings
+
+# Words that don't change what a meal is, "oatmeal with banana" is
+# "banana oatmeal"
+STOPWORDS = frozenset({"a", "an", "and", "of", "the", "with", "w"})
+
+# Cache key, a chat's meal, or everyone's with no chat
+EstimateKey = tuple[int | None, str]
+
+
+def normalize_meal_name(text: str) -> str:
+    """Key of a meal description, insensitive to case, punctuation and word order."""
+    words = re.findall(r"\w+", text.casefold())
+    return " ".join(sorted(word for word in words if word not in STOPWORDS))
+
+
+class EstimateCache:
+    """Bounded LRU of recent meal estimates, with a time to live.
+
+    Every saved meal is kept both for its chat and globally, so repeat
+    meals can be logged again without estimating them from scratch. The
+    chat's own estimate is preferred, since it reflects its usual portions.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 7 * 24 * 3600) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expiry, meal), least recently used first
+        self._entries: OrderedDict[EstimateKey, tuple[float, Meal]] = OrderedDict()
+
+    def get(self, chat_id: int, name: str) -> Meal | None:
+        """Get the latest estimate of a meal, the chat's or else anyone's."""
+        name = normalize_meal_name(name)
+        now = time.monotonic()
+        for key in ((chat_id, name), (None, name)):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            expiry, meal = entry
+            if expiry < now:
+                del self._entries[key]
+                continue
+            self._entries.move_to_end(key)
+            metrics.incr(
+                "estimate_cache.hits"
+                if key[0] is not None
+                else "estimate_cache.global_hits"
+            )
+            return meal
+
+        metrics.incr("estimate_cache.misses")
+        return None
+
+    def put(self, chat_id: int, meal: Meal) -> None:
+        name = normalize_meal_name(meal.name)
+        if not name:
+            return
+        expiry = time.monotonic() + self.ttl
+        for key in ((chat_id, name), (None, name)):
+            self._entries[key] = (expiry, meal)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        metrics.gauge("estimate_cache.entries", len(self._entries))
+
+
+estimate_cache = EstimateCache(
+    settings.estimate_cache_size, settings.estimate_cache_ttl
+)
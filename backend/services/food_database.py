@@ -0,0 +1,279 @@
+import csv
+import math
+import mmap
+import os
+import re
+import struct
+import uuid
+from pathlib import Path
+
+from backend.models import Ingredient, IngredientNutrition, NutritionLookup
+
+BUNDLED_FOODS = Path(__file__).resolve().parent.parent / "data" / "foods.csv"
+
+# Compiled file: header (magic, food count, names size), then calories,
+# protein, carbs and fat per 100 g as float32, 4 per food, then the names,
+# one line per food with its aliases separated by "|"
+MAGIC = b"KAIFOOD1"
+HEADER = struct.Struct("<8sII")
+COLUMNS = ("calories", "protein", "carbs", "fat")
+
+# Preparation and portion words that don't change which food it is,
+# ignored when matching, "grilled chicken breast" is "chicken breast"
+DESCRIPTORS = frozenset(
+    {
+        "baked",
+        "boiled",
+        "chopped",
+        "cooked",
+        "diced",
+        "fresh",
+        "grilled",
+        "homemade",
+        "large",
+        "medium",
+        "plain",
+        "poached",
+        "ripe",
+        "roasted",
+        "sliced",
+        "small",
+        "steamed",
+    }
+)
+
+# How close a query word must be to one of the food's words to count as
+# found in it, lets typos through
+WORD_MATCH_MIN = 0.6
+
+
+def normalize_food_name(text: str) -> str:
+    """Casefold, drop punctuation and plural "s", so "Bananas," is "banana"."""
+    words = re.findall(r"[^\W_]+", text.casefold())
+    return " ".join(
+        word[:-1] if len(word) > 3 and word[-1] == "s" and word[-2] != "s" else word
+        for word in words
+    )
+
+
+def trigrams(name: str) -> set[str]:
+    """Trigrams of each word, padded so word starts weigh more."""
+    grams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    """Dice coefficient of two sets of grams."""
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+def count_found(words: list[set[str]], food_words: list[set[str]]) -> int:
+    """How many of `words` are found in `food_words`, in the same order.
+
+    Words are given as their trigrams. Order counts, "chocolate milk" isn't
+    "milk chocolate".
+    """
+    found = 0
+    start = 0
+    for word in words:
+        for i in range(start, len(food_words)):
+            if similarity(word, food_words[i]) >= WORD_MATCH_MIN:
+                found += 1
+                start = i + 1
+                break
+    return found
+
+
+def compile_foods(source: str | os.PathLike, destination: str | os.PathLike) -> None:
+    """Compile a foods CSV into the memory-mappable format read by `FoodDatabase`.
+
+    The CSV has name, aliases ("|" separated), and calories, protein, carbs
+    and fat per 100 g.
+    """
+    names = []
+    values = []
+    with open(source, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            aliases = filter(None, row["aliases"].split("|"))
+            names.append("|".join([row["name"], *aliases]))
+            values.extend(float(row[column]) for column in COLUMNS)
+
+    blob = "\n".join(names).encode()
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(f"{destination.name}.{uuid.uuid4().hex}.part")
+    try:
+        with open(partial, "wb") as file:
+            file.write(HEADER.pack(MAGIC, len(names), len(blob)))
+            file.write(struct.pack(f"<{len(values)}f", *values))
+            file.write(blob)
+        os.replace(partial, destination)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+class FoodDatabase:
+    """Nutrition facts of common foods, with a fuzzy name index.
+
+    The per 100 g values are read straight from a memory-mapped compiled
+    file, only the name index lives on the heap. Names are matched exactly
+    first, then by rarity-weighted trigram similarity, so typos still find
+    the food. Every word of the query must be found in the food's name,
+    preparation and portion words aside, so a dish never matches one of its
+    ingredients: "carrot cake" isn't "carrot".
+    """
+
+    def __init__(self, path: str | os.PathLike, min_score: float = 0.7) -> None:
+        self.min_score = min_score
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, names_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"Not a compiled foods file: {path}")
+
+        table_size = count * len(COLUMNS) * 4
+        table = memoryview(self._mmap)[HEADER.size : HEADER.size + table_size]
+        self._values = table.cast("f")
+        names_start = HEADER.size + table_size
+        lines = self._mmap[names_start : names_start + names_size].decode().split("\n")
+
+        # Every name and alias is an entry pointing to its food
+        self.names = [line.split("|")[0] for line in lines]
+        self._exact: dict[str, int] = {}
+        entries: list[tuple[int, str, set[str]]] = []
+        index: dict[str, list[int]] = {}
+        for food, line in enumerate(lines):
+            for name in dict.fromkeys(map(normalize_food_name, line.split("|"))):
+                self._exact.setdefault(name, food)
+                grams = trigrams(name)
+                for gram in grams:
+                    index.setdefault(gram, []).append(len(entries))
+                entries.append((food, name, grams))
+
+        # Trigrams are weighted by how rare they are, so "brown" in "brown
+        # rice" counts more than "rice", found in many names
+        self._unknown_weight = math.log(1 + len(entries))
+        self._weights = {
+            gram: math.log(1 + len(entries) / len(found))
+            for gram, found in index.items()
+        }
+        self._index = {gram: tuple(found) for gram, found in index.items()}
+        # (food, total weight of its trigrams, trigrams of each of its words)
+        self._entries = [
+            (
+                food,
+                sum(self._weights[gram] for gram in grams),
+                [trigrams(word) for word in name.split()],
+            )
+            for food, name, grams in entries
+        ]
+
+    @classmethod
+    def load(
+        cls,
+        source: str | os.PathLike,
+        compiled: str | os.PathLike,
+        min_score: float = 0.7,
+    ) -> "FoodDatabase":
+        """Open `compiled`, compiling it from the `source` CSV when missing or stale."""
+        if not os.path.exists(compiled) or os.path.getmtime(
+            compiled
+        ) < os.path.getmtime(source):
+            compile_foods(source, compiled)
+        return cls(compiled, min_score)
+
+    def close(self) -> None:
+        self._values.release()
+        self._mmap.close()
+
+    def match(self, name: str) -> tuple[int, float] | None:
+        """Find the food closest to `name`, with a similarity score from 0 to 1.
+
+        1.0 is the food's name or alias, give or take preparation and
+        portion words, anything less is a guess.
+        """
+        name = normalize_food_name(name)
+        food = self._exact.get(name)
+        if food is not None:
+            return food, 1.0
+
+        words = [word for word in name.split() if word not in DESCRIPTORS]
+        if not words:
+            return None
+        name = " ".join(words)
+        food = self._exact.get(name)
+        if food is not None:
+            return food, 1.0
+
+        grams = trigrams(name)
+        word_grams = [trigrams(word) for word in words]
+        query_weight = sum(
+            self._weights.get(gram, self._unknown_weight) for gram in grams
+        )
+        shared: dict[int, float] = {}
+        for gram in grams:
+            for entry in self._index.get(gram, ()):
+                shared[entry] = shared.get(entry, 0.0) + self._weights[gram]
+
+        best = None
+        for entry, weight in shared.items():
+            food, size, food_words = self._entries[entry]
+            # Weighted Dice coefficient, scaled by the share of the query's
+            # words found in the food's name, so extra words cost as much
+            # as missing ones, or more. The scaling can only lower it, most
+            # entries are ruled out before their words are compared
+            dice = 2 * weight / (query_weight + size)
+            if dice < self.min_score or (best is not None and dice <= best[1]):
+                continue
+            score = dice * count_found(word_grams, food_words) / len(words)
+            if score >= self.min_score and (best is None or score > best[1]):
+                best = food, score
+        return best
+
+    def per_100g(self, food: int) -> dict[str, float]:
+        offset = food * len(COLUMNS)
+        return dict(zip(COLUMNS, self._values[offset : offset + len(COLUMNS)]))
+
+    def lookup(self, ingredients: list[Ingredient]) -> NutritionLookup:
+        """Nutrition of each ingredient, quantities in grams, and the totals.
+
+        Only exact matches are counted in the totals, the others are left
+        for the caller to confirm.
+        """
+        results = []
+        totals = dict.fromkeys(COLUMNS, 0.0)
+        for ingredient in ingredients:
+            match = self.match(ingredient.name)
+            if match is None:
+                results.append(
+                    IngredientNutrition(
+                        name=ingredient.name, quantity=ingredient.quantity
+                    )
+                )
+                continue
+
+            food, score = match
+            values = {
+                column: round(value * ingredient.quantity / 100, 1)
+                for column, value in self.per_100g(food).items()
+            }
+            if score == 1.0:
+                for column, value in values.items():
+                    totals[column] += value
+            results.append(
+                IngredientNutrition(
+                    name=ingredient.name,
+                    quantity=ingredient.quantity,
+                    food=self.names[food],
+                    match_score=round(score, 2),
+                    **values,
+                )
+            )
+
+        return NutritionLookup(
+            ingredients=results,
+            **{column: round(value) for column, value in totals.items()},
+        )
@@ -0,0 +1,248 @@
+import asyncio
+import dataclasses
+import datetime
+import logging
+from dataclasses import dataclass
+
+import asyncpg
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from backend.agent import summarizer
+from backend.db.pool import Pool
+from backend.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rough, model-agnostic estimate, good enough to enforce a budget
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class Summary:
+    text: str
+    through_seq: int
+
+
+class HistoryService:
+    """Builds the message history sent to the agent from a chat's daily memory.
+
+    The last `max_turns` turns that fit in `token_budget` are kept verbatim.
+    Older turns are folded into a rolling summary persisted per chat and day,
+    which is refreshed in the background and capped at `summary_token_budget`.
+    """
+
+    def __init__(
+        self,
+        pool: Pool,
+        max_turns: int = 10,
+        token_budget: int = 6000,
+        summary_token_budget: int = 400,
+    ) -> None:
+        self.pool = pool
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self._refreshing: dict[tuple[int, datetime.date], asyncio.Task] = {}
+
+    async def build(
+        self,
+        chat_id: int,
+        messages: list[ModelMessage],
+        date: datetime.date | None = None,
+        db: Pool | None = None,
+    ) -> list[ModelMessage]:
+        """Return the history window for `messages`, the day's full memory.
+
+        The index of a message in `messages` is its sequence number in memory.
+        The summary is read through `db`, e.g. the update's unit of work, so
+        an update never holds two connections at once.
+        """
+        date = date or datetime.date.today()
+        turns = split_turns(messages)
+
+        # Newest turns first, as many as fit in the window and the budget,
+        # always keeping the latest one
+        budget = self.token_budget - self.summary_token_budget
+        kept = 0
+        for start, end in reversed(turns):
+            tokens = estimate_tokens(messages[start:end])
+            if kept and (kept >= self.max_turns or tokens > budget):
+                break
+            budget -= tokens
+            kept += 1
+
+        if kept == len(turns):
+            metrics.observe("history.tokens", estimate_tokens(messages))
+            return messages
+
+        first_kept = turns[-kept][0]
+        summary = await self.get_summary(chat_id, date, db)
+        if summary is None or summary.through_seq < first_kept - 1:
+            self.refresh_in_background(chat_id, messages[:first_kept], summary, date)
+
+        # The system prompt only lives in the day's first request, carry it
+        # over together with the summary into the first kept request
+        system_parts: list[SystemPromptPart] = [
+            part for part in messages[0].parts if isinstance(part, SystemPromptPart)
+        ]
+        if summary:
+            system_parts.append(
+                SystemPromptPart(
+                    content=f"Summary of the earlier conversation today:\n{summary.text}"
+                )
+            )
+
+        window = messages[first_kept:]
+        first = window[0]
+        assert isinstance(first, ModelRequest)
+        window[0] = dataclasses.replace(first, parts=[*system_parts, *first.parts])
+
+        metrics.incr("history.folded_turns", len(turns) - kept)
+        metrics.observe("history.tokens", estimate_tokens(window))
+        return window
+
+    async def get_summary(
+        self,
+        chat_id: int,
+        date: datetime.date,
+        db: Pool | None = None,
+    ) -> Summary | None:
+        conn: asyncpg.Connection
+        async with (db or self.pool).acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT summary, through_seq
+                FROM memory_summaries
+                WHERE chat_id = $1 AND date = $2;
+                """,
+                chat_id,
+                date,
+            )
+        if not row:
+            return None
+        return Summary(text=row["summary"], through_seq=row["through_seq"])
+
+    async def save_summary(
+        self,
+        chat_id: int,
+        date: datetime.date,
+        summary: Summary,
+    ) -> None:
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO memory_summaries (chat_id, date, summary, through_seq)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (chat_id, date) DO UPDATE
+                SET summary = EXCLUDED.summary,
+                    through_seq = EXCLUDED.through_seq,
+                    updated_at = NOW()
+                WHERE memory_summaries.through_seq < EXCLUDED.through_seq;
+                """,
+                chat_id,
+                date,
+                summary.text,
+                summary.through_seq,
+            )
+
+    def refresh_in_background(
+        self,
+        chat_id: int,
+        folded: list[ModelMessage],
+        summary: Summary | None,
+        date: datetime.date,
+    ) -> None:
+        """Fold `folded`, the messages before the window, into the summary."""
+        key = (chat_id, date)
+        if key in self._refreshing:
+            return
+
+        task = asyncio.create_task(self.refresh(chat_id, folded, summary, date))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def refresh(
+        self,
+        chat_id: int,
+        folded: list[ModelMessage],
+        summary: Summary | None,
+        date: datetime.date,
+    ) -> Summary | None:
+        # Only the messages not covered by the previous summary are sent
+        start = summary.through_seq + 1 if summary else 0
+        max_words = self.summary_token_budget * 3 // 4
+        try:
+            with metrics.timer("history.summarize"):
+                result = await summarizer.run(
+                    f"Previous summary:\n{summary.text if summary else '(none)'}\n\n"
+                    f"New turns:\n{render_transcript(folded[start:])}\n\n"
+                    f"Word limit: {max_words}"
+                )
+        except Exception:
+            logger.exception("Failed to refresh the conversation summary")
+            return None
+
+        usage = result.usage()
+        metrics.observe("history.summary_request_tokens", usage.request_tokens or 0)
+        metrics.observe("history.summary_response_tokens", usage.response_tokens or 0)
+
+        new_summary = Summary(
+            text=result.output[: self.summary_token_budget * CHARS_PER_TOKEN],
+            through_seq=len(folded) - 1,
+        )
+        await self.save_summary(chat_id, date, new_summary)
+        return new_summary
+
+
+def split_turns(messages: list[ModelMessage]) -> list[tuple[int, int]]:
+    """Split messages into turns, as `(start, end)` index ranges.
+
+    A turn starts with a request carrying a user prompt, so cutting between
+    turns never separates a tool call from its return.
+    """
+    starts = [
+        i
+        for i, message in enumerate(messages)
+        if isinstance(message, ModelRequest)
+        and any(isinstance(part, UserPromptPart) for part in message.parts)
+    ]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return list(zip(starts, [*starts[1:], len(messages)]))
+
+
+def estimate_tokens(messages: list[ModelMessage]) -> int:
+    return len(ModelMessagesTypeAdapter.dump_json(messages)) // CHARS_PER_TOKEN
+
+
+def render_transcript(messages: list[ModelMessage], max_part_chars: int = 500) -> str:
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            match part:
+                case UserPromptPart(content=str() as content):
+                    lines.append(f"User: {content}")
+                case UserPromptPart():
+                    text = " ".join(c for c in part.content if isinstance(c, str))
+                    lines.append(f"User: {text} [with attachment]")
+                case TextPart():
+                    lines.append(f"Kai: {part.content}")
+                case ToolCallPart():
+                    lines.append(
+                        f"Kai called {part.tool_name}: {part.args_as_json_str()[:max_part_chars]}"
+                    )
+                case ToolReturnPart():
+                    lines.append(
+                        f"{part.tool_name} returned: {part.model_response_str()[:max_part_chars]}"
+                    )
+    return "\n".join(lines)
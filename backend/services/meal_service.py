@@ -1,125 +1,382 @@
 import datetime
 import uuid
+from collections.abc import Mapping, Sequence
+from typing import Any
 
 import asyncpg
+import orjson
+from pydantic import TypeAdapter
 
-from backend.models import Ingredient, Meal
+from backend.db.pool import Pool
+from backend.models import Cursor, Ingredient, Meal, Page, RepeatMeal
+from backend.services.estimate_cache import EstimateCache, estimate_cache
+from backend.services.totals_service import add_to_daily_totals
 
 
 class MealService:
-    def __init__(self, pool: asyncpg.Pool) -> None:
+    def __init__(
+        self,
+        pool: Pool,
+        chat_id: int,
+        cache: EstimateCache = estimate_cache,
+    ) -> None:
         self.pool = pool
+        self.chat_id = chat_id
+        self.cache = cache
 
     async def save(self, meal: Meal) -> Meal:
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(INSERT_MEAL_QUERY, *self._insert_args(meal))
+                await add_to_daily_totals(
+                    conn,
+                    self.chat_id,
+                    meal.created_at,
+                    calories=meal.calories,
+                    protein=meal.protein,
+                    carbs=meal.carbs,
+                    fat=meal.fat,
+                    meal_count=1,
+                )
+        self.cache.put(self.chat_id, meal)
+        return meal
+
+    async def save_many(
+        self,
+        meals: list[Meal],
+        cache_estimates: bool = True,
+    ) -> list[Meal]:
+        """Save several meals at once, all or none of them.
+
+        The rows and their daily totals are written by a single statement,
+        in a single round trip.
+        """
+        if not meals:
+            return meals
+
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
             await conn.execute(
-                """
-            INSERT INTO meals (
-                id,
-                created_at,
-                name,
-                description,
-                ingredients,
-                calories,
-                protein,
-                carbs,
-                fat
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9);
-            """,
-                meal.id,
-                meal.created_at,
-                meal.name,
-                meal.description,
-                [ingredient.model_dump() for ingredient in meal.ingredients],
-                meal.calories,
-                meal.protein,
-                meal.carbs,
-                meal.fat,
+                SAVE_MEALS_QUERY,
+                self.chat_id,
+                [meal.id for meal in meals],
+                [meal.created_at for meal in meals],
+                [meal.name for meal in meals],
+                [meal.description for meal in meals],
+                [
+                    orjson.dumps(
+                        [ingredient.model_dump() for ingredient in meal.ingredients]
+                    ).decode()
+                    for meal in meals
+                ],
+                [meal.calories for meal in meals],
+                [meal.protein for meal in meals],
+                [meal.carbs for meal in meals],
+                [meal.fat for meal in meals],
             )
-        return meal
+        if cache_estimates:
+            for meal in meals:
+                self.cache.put(self.chat_id, meal)
+        return meals
+
+    async def save_repeats(self, repeats: list[RepeatMeal]) -> list[Meal | None]:
+        """Log meals again from their latest cached estimate, scaled to the servings.
+
+        Returns the saved meals, with None in place of the ones without an
+        estimate, which are not saved.
+        """
+        meals: list[Meal | None] = []
+        estimates = []
+        for repeat in repeats:
+            estimate = self.cache.get(self.chat_id, repeat.name)
+            if estimate is None:
+                meals.append(None)
+                continue
+            meals.append(_scale(estimate, repeat.servings, repeat.created_at))
+            estimates.append(estimate)
+
+        # Scaled copies are not cached, so servings stay relative to the
+        # original estimate rather than compounding
+        await self.save_many([meal for meal in meals if meal], cache_estimates=False)
+        for estimate in estimates:
+            # Refreshes its expiry, and adopts a global estimate for the chat
+            self.cache.put(self.chat_id, estimate)
+        return meals
+
+    def _insert_args(self, meal: Meal) -> tuple:
+        return (
+            meal.id,
+            self.chat_id,
+            meal.created_at,
+            meal.name,
+            meal.description,
+            [ingredient.model_dump() for ingredient in meal.ingredients],
+            meal.calories,
+            meal.protein,
+            meal.carbs,
+            meal.fat,
+        )
 
     async def update(self, id: uuid.UUID, meal: Meal) -> Meal:
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                """
-                UPDATE meals
-                SET name = $1,
-                    description = $2,
-                    ingredients = $3,
-                calories = $4,
-                protein = $5,
-                carbs = $6,
-                fat = $7
-            WHERE id = $8;
-            """,
-                meal.name,
-                meal.description,
-                [ingredient.model_dump() for ingredient in meal.ingredients],
-                meal.calories,
-                meal.protein,
-                meal.carbs,
-                meal.fat,
-                id,
-            )
+            async with conn.transaction():
+                # Returns the previous values, to move the totals by the difference
+                old = await conn.fetchrow(
+                    """
+                    UPDATE meals
+                    SET name = $1,
+                        description = $2,
+                        ingredients = $3,
+                        calories = $4,
+                        protein = $5,
+                        carbs = $6,
+                        fat = $7
+                    FROM (
+                        SELECT id, created_at, calories, protein, carbs, fat
+                        FROM meals
+                        WHERE id = $8 AND chat_id = $9
+                        FOR UPDATE
+                    ) AS old
+                    WHERE meals.id = old.id
+                    RETURNING old.created_at, old.calories, old.protein, old.carbs, old.fat;
+                    """,
+                    meal.name,
+                    meal.description,
+                    [ingredient.model_dump() for ingredient in meal.ingredients],
+                    meal.calories,
+                    meal.protein,
+                    meal.carbs,
+                    meal.fat,
+                    id,
+                    self.chat_id,
+                )
+
+                # No rows updated means the meal was not found
+                if old is None:
+                    raise ValueError("Meal not found")
 
-        # No rows updated means the meal was not found
-        if result == "UPDATE 0":
-            raise ValueError("Meal not found")
+                await add_to_daily_totals(
+                    conn,
+                    self.chat_id,
+                    old["created_at"],
+                    calories=(meal.calories or 0) - (old["calories"] or 0),
+                    protein=(meal.protein or 0) - (old["protein"] or 0),
+                    carbs=(meal.carbs or 0) - (old["carbs"] or 0),
+                    fat=(meal.fat or 0) - (old["fat"] or 0),
+                )
 
+        # A corrected estimate replaces the previous one
+        self.cache.put(self.chat_id, meal)
         return meal
 
     async def delete(self, id: uuid.UUID) -> None:
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                """
-                DELETE FROM meals
-                WHERE id = $1;
-                """,
-                id,
-            )
+            async with conn.transaction():
+                old = await conn.fetchrow(
+                    """
+                    DELETE FROM meals
+                    WHERE id = $1 AND chat_id = $2
+                    RETURNING created_at, calories, protein, carbs, fat;
+                    """,
+                    id,
+                    self.chat_id,
+                )
+
+                # No rows deleted means the meal was not found
+                if old is None:
+                    raise ValueError("Meal not found")
 
-        # No rows deleted means the meal was not found
-        if result == "DELETE 0":
-            raise ValueError("Meal not found")
+                await add_to_daily_totals(
+                    conn,
+                    self.chat_id,
+                    old["created_at"],
+                    calories=-(old["calories"] or 0),
+                    protein=-(old["protein"] or 0),
+                    carbs=-(old["carbs"] or 0),
+                    fat=-(old["fat"] or 0),
+                    meal_count=-1,
+                )
 
     async def list_meals(
         self,
         start_time: datetime.datetime,
         end_time: datetime.datetime,
+        limit: int | None = None,
+        cursor: Cursor | None = None,
     ) -> list[Meal]:
+        """List meals in the range, newest first.
+
+        At most `limit` meals are returned, starting right after `cursor`.
+        """
+        cursor = cursor or Cursor.first(end_time)
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
             rows = await conn.fetch(
-                """
-                SELECT 
-                    id,
-                    created_at,
-                name,
-                description,
-                ingredients,
-                calories,
-                protein,
-                carbs,
-                fat
-            FROM meals
-            WHERE created_at BETWEEN $1 AND $2
-            ORDER BY created_at DESC;
-            """,
+                LIST_MEALS_QUERY,
+                self.chat_id,
                 start_time,
-                end_time,
+                cursor.created_at,
+                cursor.id,
+                limit,
             )
-        meals = []
-        for row in rows:
-            row_dict = dict(row)
-            row_dict["ingredients"] = [
-                Ingredient(
-                    **ingredient,
-                )
-                for ingredient in row_dict["ingredients"]
-            ]
-            meal = Meal(**row_dict)
-            meals.append(meal)
-        return meals
+        return meals_from_rows(rows)
+
+    async def page_meals(
+        self,
+        start_time: datetime.datetime,
+        end_time: datetime.datetime,
+        limit: int,
+        cursor: Cursor | None = None,
+    ) -> Page[Meal]:
+        """Get a page of meals in the range, with the cursor of the next one."""
+        meals = await self.list_meals(start_time, end_time, limit + 1, cursor)
+        if len(meals) <= limit:
+            return Page(items=meals)
+
+        meals = meals[:limit]
+        last = meals[-1]
+        return Page(
+            items=meals,
+            next_cursor=Cursor(created_at=last.created_at, id=last.id),
+        )
+
+
+INSERT_MEAL_QUERY = """
+    INSERT INTO meals (
+        id,
+        chat_id,
+        created_at,
+        name,
+        description,
+        ingredients,
+        calories,
+        protein,
+        carbs,
+        fat
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10);
+"""
+
+# Inserts a batch of meals, one array per column, and adds them to the daily
+# totals, grouped per day since a row can only be upserted once per
+# statement. Ingredients are passed as JSON text, cast on the server.
+SAVE_MEALS_QUERY = """
+    WITH inserted AS (
+        INSERT INTO meals (
+            id,
+            chat_id,
+            created_at,
+            name,
+            description,
+            ingredients,
+            calories,
+            protein,
+            carbs,
+            fat
+        )
+        SELECT
+            id,
+            $1,
+            created_at,
+            name,
+            description,
+            ingredients::jsonb,
+            calories,
+            protein,
+            carbs,
+            fat
+        FROM unnest(
+            $2::uuid[],
+            $3::timestamptz[],
+            $4::text[],
+            $5::text[],
+            $6::text[],
+            $7::integer[],
+            $8::integer[],
+            $9::integer[],
+            $10::integer[]
+        ) AS meal(
+            id,
+            created_at,
+            name,
+            description,
+            ingredients,
+            calories,
+            protein,
+            carbs,
+            fat
+        )
+        RETURNING created_at, calories, protein, carbs, fat
+    )
+    INSERT INTO daily_totals (chat_id, date, calories, protein, carbs, fat, meal_count)
+    SELECT
+        $1,
+        (created_at AT TIME ZONE 'UTC')::date AS day,
+        SUM(COALESCE(calories, 0)),
+        SUM(COALESCE(protein, 0)),
+        SUM(COALESCE(carbs, 0)),
+        SUM(COALESCE(fat, 0)),
+        COUNT(*)
+    FROM inserted
+    GROUP BY day
+    ON CONFLICT (chat_id, date) DO UPDATE
+    SET calories = daily_totals.calories + EXCLUDED.calories,
+        protein = daily_totals.protein + EXCLUDED.protein,
+        carbs = daily_totals.carbs + EXCLUDED.carbs,
+        fat = daily_totals.fat + EXCLUDED.fat,
+        meal_count = daily_totals.meal_count + EXCLUDED.meal_count;
+"""
+
+# Keyset pagination on (created_at, id), matching the meals index. The upper
+# bound is the previous page's last row, or the end of the range for the
+# first page. A NULL limit returns everything.
+LIST_MEALS_QUERY = """
+    SELECT
+        id,
+        created_at,
+        name,
+        description,
+        ingredients,
+        calories,
+        protein,
+        carbs,
+        fat
+    FROM meals
+    WHERE chat_id = $1
+        AND created_at >= $2
+        AND (created_at, id) < ($3, $4)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $5;
+"""
+
+
+def _scale(meal: Meal, servings: float, created_at: datetime.datetime) -> Meal:
+    """A new meal from an estimate, with amounts multiplied by `servings`."""
+
+    def scale(value: int | None) -> int | None:
+        return None if value is None else round(value * servings)
+
+    return Meal(
+        created_at=created_at,
+        name=meal.name,
+        description=meal.description,
+        ingredients=[
+            Ingredient(name=ingredient.name, quantity=ingredient.quantity * servings)
+            for ingredient in meal.ingredients
+        ],
+        calories=scale(meal.calories),
+        protein=scale(meal.protein),
+        carbs=scale(meal.carbs),
+        fat=scale(meal.fat),
+    )
+
+
+# Validates a whole result in a single call into pydantic-core, cheaper
+# than building and validating each meal on its own
+MEALS_ADAPTER = TypeAdapter(list[Meal])
+
+
+def meals_from_rows(rows: Sequence[Mapping[str, Any]]) -> list[Meal]:
+    return MEALS_ADAPTER.validate_python([dict(row) for row in rows])
@@ -0,0 +1,134 @@
+import asyncio
+import mmap
+import os
+import re
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from backend.clients.telegram.telegram import TelegramClient
+from backend.metrics import metrics
+
+PARTIAL_SUFFIX = ".part"
+# Unique ids are URL-safe base64, anything else could escape the directory
+FILE_UNIQUE_ID = re.compile(r"[\w-]+")
+
+
+class MediaCache:
+    """On-disk LRU of Telegram files, keyed by `file_unique_id`.
+
+    Telegram keeps a file's `file_unique_id` when it is forwarded or sent
+    again, so those are served from disk without any request. Files are
+    streamed to disk and handed out as read-only memory maps. The least
+    recently used ones are deleted once the cache grows over `max_bytes`.
+    Disk access runs in threads, the bookkeeping stays on the event loop.
+    """
+
+    def __init__(
+        self,
+        telegram: TelegramClient,
+        directory: str | os.PathLike,
+        max_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.telegram = telegram
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # file_unique_id -> size, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._downloads: dict[str, asyncio.Task[memoryview]] = {}
+        self._load()
+
+    async def get(self, file_id: str, file_unique_id: str) -> memoryview:
+        """Get a file's content, downloading it on a miss.
+
+        Concurrent misses of the same file share a single download.
+        """
+        if file_unique_id in self._entries:
+            try:
+                view = await asyncio.to_thread(_map, self._path(file_unique_id))
+            except FileNotFoundError:
+                # Deleted behind our back, download it again
+                self._forget(file_unique_id)
+            else:
+                if file_unique_id in self._entries:
+                    self._entries.move_to_end(file_unique_id)
+                metrics.incr("media_cache.hits")
+                return view
+
+        metrics.incr("media_cache.misses")
+        task = self._downloads.get(file_unique_id)
+        if task is None:
+            task = asyncio.create_task(self._download(file_id, file_unique_id))
+            self._downloads[file_unique_id] = task
+            task.add_done_callback(lambda _: self._downloads.pop(file_unique_id, None))
+        # Shielded so one caller giving up doesn't cancel the others' download
+        return await asyncio.shield(task)
+
+    async def _download(self, file_id: str, file_unique_id: str) -> memoryview:
+        path = self._path(file_unique_id)
+        partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}{PARTIAL_SUFFIX}")
+        try:
+            with metrics.timer("media_cache.download"):
+                size = await self.telegram.download_file(file_id, partial)
+            await asyncio.to_thread(os.replace, partial, path)
+        finally:
+            await asyncio.to_thread(partial.unlink, missing_ok=True)
+
+        # Mapped before evicting, an unlinked file stays readable while mapped
+        view = await asyncio.to_thread(_map, path)
+        self._entries[file_unique_id] = size
+        self._size += size
+        metrics.observe("media_cache.file_bytes", size)
+        await asyncio.to_thread(_delete, self._evict())
+        return view
+
+    def _evict(self) -> list[Path]:
+        """Drop the least recently used entries, return their files to delete."""
+        evicted = []
+        # The newest file is always kept, even if it alone is over the cap
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            file_unique_id = next(iter(self._entries))
+            evicted.append(self._path(file_unique_id))
+            self._forget(file_unique_id)
+            metrics.incr("media_cache.evictions")
+        metrics.gauge("media_cache.bytes", self._size)
+        metrics.gauge("media_cache.files", len(self._entries))
+        return evicted
+
+    def _forget(self, file_unique_id: str) -> None:
+        # Already gone if it was evicted while its file was being mapped
+        self._size -= self._entries.pop(file_unique_id, 0)
+
+    def _load(self) -> None:
+        """Pick up the files left by a previous run, oldest first."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.iterdir():
+            if path.name.endswith(PARTIAL_SUFFIX):
+                # Interrupted download
+                path.unlink(missing_ok=True)
+            elif path.is_file() and FILE_UNIQUE_ID.fullmatch(path.name):
+                files.append((path.stat(), path.name))
+        for stat, name in sorted(files, key=lambda file: file[0].st_mtime):
+            self._entries[name] = stat.st_size
+            self._size += stat.st_size
+        _delete(self._evict())
+
+    def _path(self, file_unique_id: str) -> Path:
+        if not FILE_UNIQUE_ID.fullmatch(file_unique_id):
+            raise ValueError(f"Invalid file_unique_id: {file_unique_id!r}")
+        return self.directory / file_unique_id
+
+
+def _delete(paths: list[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def _map(path: Path) -> memoryview:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(b"")
+        # The mapping outlives the file object, and the view keeps it alive
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
@@ -1,56 +1,204 @@
 import datetime
-import json
+from collections import OrderedDict
+from dataclasses import dataclass
 
 import asyncpg
 from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
-from pydantic_core import to_jsonable_python
+from pydantic_core import PydanticSerializationError, to_jsonable_python
+
+from backend.db.pool import Pool
+from backend.metrics import metrics
+from backend.settings import settings
+
+
+@dataclass
+class CachedMessages:
+    version: int
+    messages: list[ModelMessage]
+
+
+# Cache key, a chat's messages of one day
+CacheKey = tuple[int, datetime.date]
+
+
+class MessageCache:
+    """Bounded LRU of already validated message lists, keyed by chat and date.
+
+    Entries carry the `memory_heads.version` they were read at, so a reader
+    can tell whether another writer appended since.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, CachedMessages] = OrderedDict()
+        self._today: datetime.date | None = None
+
+    def get(self, key: CacheKey) -> CachedMessages | None:
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: CacheKey, entry: CachedMessages) -> None:
+        self._expire()
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        metrics.gauge("memory.cache_entries", len(self._entries))
+
+    def invalidate(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+
+    def _expire(self) -> None:
+        """Drop previous days' entries once the day rolls over."""
+        today = datetime.date.today()
+        if today == self._today:
+            return
+        self._today = today
+        for key in [key for key in self._entries if key[1] < today]:
+            del self._entries[key]
+
+
+message_cache = MessageCache(settings.message_cache_size)
 
 
 class MemoryService:
-    def __init__(self, pool: asyncpg.Pool) -> None:
+    """Append-only log of a chat's daily conversation, one row per message."""
+
+    def __init__(
+        self,
+        pool: Pool,
+        chat_id: int,
+        cache: MessageCache = message_cache,
+    ) -> None:
         self.pool = pool
+        self.chat_id = chat_id
+        self.cache = cache
 
-    async def save(self, messages: list[ModelMessage]) -> None:
-        """Save messages using pydantic-ai's built-in serialization."""
+    async def save(
+        self,
+        messages: list[ModelMessage],
+        date: datetime.date | None = None,
+    ) -> None:
+        """Append new messages to the day's log.
+
+        Only the messages produced by the latest run should be passed, e.g.
+        `result.new_messages()`, they get the next sequence numbers of the day.
+        """
+        if not messages:
+            return
         try:
             serialized_messages = to_jsonable_python(messages)
-            conn: asyncpg.Connection
-            async with self.pool.acquire() as conn:
-                await conn.execute(
-                    """
-                    INSERT INTO memory (date, messages, updated_at)
-                    VALUES ($1, $2, NOW())
-                ON CONFLICT (date) DO UPDATE
-                SET messages = EXCLUDED.messages,
-                    updated_at = NOW()
-                """,
-                    datetime.date.today(),
-                    json.dumps(serialized_messages),
-                )
-        except UnicodeDecodeError:
+        except (UnicodeDecodeError, PydanticSerializationError):
             # Skip saving when there's binary content
             return
 
-    async def get(self) -> list[ModelMessage] | None:
-        """Load messages using pydantic-ai's built-in deserialization."""
-        today = datetime.date.today()
+        date = date or datetime.date.today()
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
+            # Bumping the head locks the day's row, which serializes
+            # concurrent appends and hands out their sequence numbers
+            version = await conn.fetchval(
                 """
-                SELECT messages
-                FROM memory
-                WHERE date = $1
-            """,
-                today,
+                WITH head AS (
+                    INSERT INTO memory_heads (chat_id, date, version)
+                    VALUES ($1, $2, cardinality($3::jsonb[]))
+                    ON CONFLICT (chat_id, date) DO UPDATE
+                    SET version = memory_heads.version + EXCLUDED.version
+                    RETURNING version
+                ), appended AS (
+                    INSERT INTO memory_messages (chat_id, date, seq, message)
+                    SELECT
+                        $1,
+                        $2,
+                        head.version - cardinality($3::jsonb[]) + message.ordinality - 1,
+                        message.value
+                    FROM head,
+                        unnest($3::jsonb[]) WITH ORDINALITY AS message(value, ordinality)
+                )
+                SELECT version FROM head;
+                """,
+                self.chat_id,
+                date,
+                serialized_messages,
             )
-        if not row:
-            return None
 
-        messages = (
-            json.loads(row["messages"])
-            if isinstance(row["messages"], str)
-            else row["messages"]
-        )
+        # Write through when the cached copy is exactly what preceded this
+        # append, otherwise someone else wrote in between
+        key = (self.chat_id, date)
+        cached = self.cache.get(key)
+        if cached and cached.version == version - len(messages):
+            cached.messages.extend(messages)
+            cached.version = version
+        else:
+            self.cache.invalidate(key)
+
+    async def get(
+        self,
+        after_seq: int = -1,
+        date: datetime.date | None = None,
+    ) -> list[ModelMessage] | None:
+        """Load the day's messages with a sequence number above `after_seq`.
+
+        Full reads are served from the cache, only fetching and validating
+        messages appended since the cached version.
+        """
+        date = date or datetime.date.today()
+        if after_seq >= 0:
+            rows = await self._fetch(date, after_seq)
+            messages = self._validate(rows)
+            return messages or None
+
+        key = (self.chat_id, date)
+        cached = self.cache.get(key)
+        rows = await self._fetch(date, cached.version - 1 if cached else -1)
+        version = rows[0]["version"] if rows else 0
+
+        if cached and cached.version == version:
+            metrics.incr("memory.cache_hits")
+            messages = cached.messages
+        elif cached and cached.version < version:
+            metrics.incr("memory.cache_partial_hits")
+            messages = cached.messages + self._validate(rows)
+            self.cache.put(key, CachedMessages(version, messages))
+        else:
+            metrics.incr("memory.cache_misses")
+            if cached:
+                # The cache is ahead of the database, start over
+                rows = await self._fetch(date, -1)
+                version = rows[0]["version"] if rows else 0
+            messages = self._validate(rows)
+            self.cache.put(key, CachedMessages(version, messages))
 
-        return ModelMessagesTypeAdapter.validate_python(messages)
+        return list(messages) or None
+
+    async def _fetch(self, date: datetime.date, after_seq: int) -> list[asyncpg.Record]:
+        """Fetch the day's version along with the messages after `after_seq`.
+
+        The head row is always returned, with a NULL message when there is
+        nothing new, so a cache check costs a single round trip.
+        """
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(
+                """
+                SELECT head.version, message.message
+                FROM memory_heads head
+                LEFT JOIN memory_messages message
+                    ON message.chat_id = head.chat_id
+                    AND message.date = head.date
+                    AND message.seq > $3
+                WHERE head.chat_id = $1 AND head.date = $2
+                ORDER BY message.seq;
+                """,
+                self.chat_id,
+                date,
+                after_seq,
+            )
+
+    def _validate(self, rows: list[asyncpg.Record]) -> list[ModelMessage]:
+        return ModelMessagesTypeAdapter.validate_python(
+            [row["message"] for row in rows if row["message"] is not None]
+        )
@@ -0,0 +1,100 @@
+import re
+from dataclasses import dataclass
+from typing import Literal
+
+from pydantic_ai.models import Model
+
+from backend.clients.telegram.models import DocumentMessage, ImageMessage, Message
+from backend.metrics import metrics
+
+Tier = Literal["fast", "default", "large"]
+
+# Thanks and greetings, answered without any reasoning
+SMALL_TALK = re.compile(
+    r"^(?:(?:thanks?(?: you)?|thx|ty|cool|great|nice|got it|hi|hello|hey|"
+    r"good (?:morning|night))\b[\s\W]*)+$",
+    re.IGNORECASE,
+)
+
+# Answers to the agent's questions, e.g. a delete confirmation, and emoji
+# only, a thumbs up is a yes. They act on the previous turn, say deleting
+# the right meal id, so they aren't left to the fast model
+CONFIRMATION = re.compile(
+    r"^\W*(?:yes|yep|yeah|yup|y|no|nope|nah|n|ok(?:ay)?|k|sure|do it|go ahead|"
+    r"confirm(?:ed)?|cancel)\b"
+    r"|^[\s\W]+$",
+    re.IGNORECASE,
+)
+
+# Requests for advice, analysis or planning, which need a stronger model
+COMPLEX = re.compile(
+    r"\b(why|plan|compare|analy[sz]e|analysis|trend|recommend|suggest|advice|"
+    r"should i|how (much|many) should|diet|program|progress)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class Route:
+    tier: Tier
+    model: Model | str
+    reason: str
+
+
+class ModelRouter:
+    """Picks the model tier of an update from its type and text, locally.
+
+    Short logs and small talk go to `fast_model`, advice, analysis and
+    documents to `large_model`, everything else, answers to the agent's
+    questions included, to `default_model`. Models are names or instances,
+    e.g. test models. Every tier runs the same agent, so the same tools,
+    only the model differs. When disabled, every update goes to the default
+    tier.
+    """
+
+    def __init__(
+        self,
+        fast_model: Model | str,
+        default_model: Model | str,
+        large_model: Model | str,
+        enabled: bool = True,
+        fast_max_chars: int = 160,
+        large_min_chars: int = 600,
+    ) -> None:
+        self.models: dict[Tier, Model | str] = {
+            "fast": fast_model,
+            "default": default_model,
+            "large": large_model,
+        }
+        self.enabled = enabled
+        self.fast_max_chars = fast_max_chars
+        self.large_min_chars = large_min_chars
+
+    def route(self, message: Message, text: str | None = None) -> Route:
+        """Route `message`, `text` being its text, caption or transcript."""
+        if not self.enabled:
+            return self.to("default", "disabled")
+
+        text = (text or "").strip()
+        match message:
+            case DocumentMessage():
+                return self.to("large", "document")
+            case ImageMessage():
+                if COMPLEX.search(text):
+                    return self.to("large", "image_question")
+                return self.to("default", "image")
+            case _:
+                if CONFIRMATION.match(text):
+                    return self.to("default", "confirmation")
+                if SMALL_TALK.match(text):
+                    return self.to("fast", "small_talk")
+                if len(text) >= self.large_min_chars or COMPLEX.search(text):
+                    return self.to("large", "complex")
+                if len(text) <= self.fast_max_chars:
+                    return self.to("fast", "short")
+                return self.to("default", "text")
+
+    def to(self, tier: Tier, reason: str) -> Route:
+        metrics.incr(f"router.{tier}")
+        metrics.incr(f"router.{tier}.{reason}")
+        return Route(tier=tier, model=self.models[tier], reason=reason)
@@ -0,0 +1,83 @@
+import logging
+import time
+
+import httpx
+
+from backend.metrics import metrics
+from backend.services.telegram_sender import (
+    MAX_MESSAGE_LENGTH,
+    TelegramSender,
+    split_message,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyStream:
+    """Shows a reply while it is being generated, in a single Telegram message.
+
+    The first text is posted as soon as it arrives, later text is coalesced
+    into at most one edit every `edit_interval` seconds, Telegram rate limits
+    edits. `finish` always shows the full reply, a reply too long for one
+    message continues in new ones.
+    """
+
+    def __init__(
+        self,
+        telegram: TelegramSender,
+        chat_id: int,
+        edit_interval: float = 1.0,
+    ) -> None:
+        self.telegram = telegram
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+        self.message_id: int | None = None
+        self.shown = ""
+        self.last_edit = 0.0
+
+    async def update(self, text: str) -> None:
+        """Show the reply so far, unless it was edited too recently."""
+        text = text[:MAX_MESSAGE_LENGTH]
+        if not text.strip() or text == self.shown:
+            return
+        if self.message_id is not None and (
+            time.monotonic() - self.last_edit < self.edit_interval
+        ):
+            return
+        try:
+            if self.message_id is None:
+                await self.post(text)
+            else:
+                await self.edit(text)
+        except httpx.HTTPError:
+            # The next update or `finish` catches up
+            logger.warning("Failed to update a streamed reply", exc_info=True)
+            metrics.incr("reply.stream.edit_failed")
+
+    async def finish(self, text: str) -> None:
+        """Show the full reply."""
+        if self.message_id is None:
+            await self.telegram.send_message(chat_id=self.chat_id, message=text)
+            return
+        # A blank reply leaves what was shown
+        first, *rest = split_message(text) or [self.shown]
+        if first != self.shown:
+            await self.edit(first)
+        for chunk in rest:
+            await self.telegram.send_message(chat_id=self.chat_id, message=chunk)
+
+    async def post(self, text: str) -> None:
+        response = await self.telegram.send_message(chat_id=self.chat_id, message=text)
+        assert response is not None
+        self.message_id = response["result"]["message_id"]
+        self.shown = text
+        self.last_edit = time.monotonic()
+
+    async def edit(self, text: str) -> None:
+        assert self.message_id is not None
+        await self.telegram.edit_message_text(
+            chat_id=self.chat_id, message_id=self.message_id, message=text
+        )
+        metrics.incr("reply.stream.edits")
+        self.shown = text
+        self.last_edit = time.monotonic()
@@ -0,0 +1,126 @@
+import datetime
+from dataclasses import dataclass, field
+
+import asyncpg
+
+from backend.db.pool import Pool
+from backend.models import DailyTotals
+
+
+@dataclass
+class Report:
+    chat_id: int
+    start_date: datetime.date
+    end_date: datetime.date
+    # Sums over the period, `date` is its first day
+    totals: DailyTotals
+    # Sums over the period of the same length right before it
+    previous: DailyTotals
+    top_foods: list[str] = field(default_factory=list)
+
+
+class ReportService:
+    """Builds the periodic reports of every chat at once."""
+
+    def __init__(self, pool: Pool) -> None:
+        self.pool = pool
+
+    async def build_reports(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        top_foods: int = 3,
+    ) -> list[Report]:
+        """Build the reports of the UTC days from `start_date` to `end_date`.
+
+        Every chat with an entry in the period, or the one before it, gets a
+        report. Totals come from the `daily_totals` rollup and top foods from
+        the period's meals, all in a single query.
+        """
+        days = (end_date - start_date).days + 1
+        previous_start = start_date - datetime.timedelta(days=days)
+        start_time = datetime.datetime.combine(
+            start_date, datetime.time(), datetime.UTC
+        )
+        end_time = start_time + datetime.timedelta(days=days)
+
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                WITH totals AS (
+                    SELECT
+                        chat_id,
+                        COALESCE(SUM(calories) FILTER (WHERE date >= $1), 0) AS calories,
+                        COALESCE(SUM(protein) FILTER (WHERE date >= $1), 0) AS protein,
+                        COALESCE(SUM(carbs) FILTER (WHERE date >= $1), 0) AS carbs,
+                        COALESCE(SUM(fat) FILTER (WHERE date >= $1), 0) AS fat,
+                        COALESCE(SUM(calories_burned) FILTER (WHERE date >= $1), 0) AS calories_burned,
+                        COALESCE(SUM(meal_count) FILTER (WHERE date >= $1), 0) AS meal_count,
+                        COALESCE(SUM(workout_count) FILTER (WHERE date >= $1), 0) AS workout_count,
+                        COALESCE(SUM(calories) FILTER (WHERE date < $1), 0) AS previous_calories,
+                        COALESCE(SUM(protein) FILTER (WHERE date < $1), 0) AS previous_protein,
+                        COALESCE(SUM(carbs) FILTER (WHERE date < $1), 0) AS previous_carbs,
+                        COALESCE(SUM(fat) FILTER (WHERE date < $1), 0) AS previous_fat,
+                        COALESCE(SUM(calories_burned) FILTER (WHERE date < $1), 0) AS previous_calories_burned,
+                        COALESCE(SUM(meal_count) FILTER (WHERE date < $1), 0) AS previous_meal_count,
+                        COALESCE(SUM(workout_count) FILTER (WHERE date < $1), 0) AS previous_workout_count
+                    FROM daily_totals
+                    WHERE date BETWEEN $3 AND $2
+                    GROUP BY chat_id
+                ), foods AS (
+                    SELECT
+                        chat_id,
+                        MIN(name) AS name,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY chat_id
+                            ORDER BY COUNT(*) DESC, SUM(calories) DESC NULLS LAST
+                        ) AS rank
+                    FROM meals
+                    WHERE created_at >= $4 AND created_at < $5
+                    GROUP BY chat_id, lower(name)
+                ), top_foods AS (
+                    SELECT chat_id, array_agg(name ORDER BY rank) AS top_foods
+                    FROM foods
+                    WHERE rank <= $6
+                    GROUP BY chat_id
+                )
+                SELECT totals.*, COALESCE(top_foods.top_foods, '{}') AS top_foods
+                FROM totals
+                LEFT JOIN top_foods ON top_foods.chat_id = totals.chat_id
+                ORDER BY totals.chat_id;
+                """,
+                start_date,
+                end_date,
+                previous_start,
+                start_time,
+                end_time,
+                top_foods,
+            )
+
+        return [
+            Report(
+                chat_id=row["chat_id"],
+                start_date=start_date,
+                end_date=end_date,
+                totals=_totals_from_row(row, start_date),
+                previous=_totals_from_row(row, previous_start, prefix="previous_"),
+                top_foods=list(row["top_foods"]),
+            )
+            for row in rows
+        ]
+
+
+def _totals_from_row(
+    row: asyncpg.Record,
+    date: datetime.date,
+    prefix: str = "",
+) -> DailyTotals:
+    return DailyTotals(
+        date=date,
+        **{
+            name: row[prefix + name]
+            for name in DailyTotals.model_fields
+            if name != "date"
+        },
+    )
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Literal
+
+import httpx
+
+from backend.clients.telegram.telegram import TelegramClient, TelegramRetryAfter
+from backend.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Longest text of a single Telegram message, in characters
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Split `text` into messages of at most `max_length` characters.
+
+    Messages end on line boundaries, only a line too long on its own is cut
+    in the middle. Blank messages, which Telegram rejects, are left out.
+    """
+    chunks: list[str] = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_length:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+        if len(current) + len(line) > max_length:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return [chunk.rstrip("\n") for chunk in chunks if chunk.strip()]
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `capacity` saved up for bursts."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, return how long to wait before using it."""
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def time_to_full(self) -> float:
+        """Seconds until the bucket is full again, 0 if it is."""
+        self._refill()
+        return (self.capacity - self.tokens) / self.rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class Outgoing:
+    method: Literal["send", "edit"]
+    chat_id: int
+    text: str
+    message_id: int | None = None
+    status: bool = False
+    future: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    sending: bool = False
+
+
+class TelegramSender:
+    """Outbound Telegram messages, queued per chat and rate limited.
+
+    Messages to a chat are sent in order, under a per chat and a global
+    token bucket. Flood control (429) is waited out for `retry_after`
+    seconds, server and network errors are retried with a backoff, either
+    way for at most `max_attempts` attempts per message. Long
+    texts are split into several messages. A status message replaces the
+    chat's status message still waiting to be sent, and is dropped once a
+    regular message is queued behind it. Edits of a message waiting to be
+    sent are merged, the latest text wins.
+    """
+
+    def __init__(
+        self,
+        telegram: TelegramClient,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_attempts: int = 5,
+        retry_backoff: float = 1.0,
+        max_length: int = MAX_MESSAGE_LENGTH,
+    ) -> None:
+        self.telegram = telegram
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_length = max_length
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets: dict[int, TokenBucket] = {}
+        self._queues: dict[int, deque[Outgoing]] = {}
+        self._drains: dict[int, asyncio.Task] = {}
+        self._depth = 0
+
+    async def send_message(
+        self, chat_id: int, message: str, status: bool = False
+    ) -> dict | None:
+        """Send `message`, return the response of its last part.
+
+        Returns None if the message was a status message superseded before
+        it was sent, or blank.
+        """
+        queue = self._queues.setdefault(chat_id, deque())
+        pending = [item for item in queue if not item.sending]
+        if status:
+            for item in pending:
+                if item.status:
+                    item.text = message[: self.max_length]
+                    metrics.incr("telegram.coalesced")
+                    return await asyncio.shield(item.future)
+        else:
+            for item in pending:
+                if item.status:
+                    queue.remove(item)
+                    item.future.set_result(None)
+                    self._report_depth(-1)
+                    metrics.incr("telegram.coalesced")
+
+        chunks = split_message(message, self.max_length)
+        if not chunks:
+            logger.warning("Not sending a blank message to chat %s", chat_id)
+            return None
+        if len(chunks) > 1:
+            metrics.incr("telegram.split")
+        items = [Outgoing("send", chat_id, chunk, status=status) for chunk in chunks]
+        results = await asyncio.gather(*(self._enqueue(item) for item in items))
+        return results[-1]
+
+    async def edit_message_text(
+        self, chat_id: int, message_id: int, message: str
+    ) -> dict | None:
+        """Replace the text of a message, cut to the maximum length."""
+        message = message[: self.max_length]
+        for item in self._queues.get(chat_id, ()):
+            if (
+                item.method == "edit"
+                and item.message_id == message_id
+                and not item.sending
+            ):
+                item.text = message
+                metrics.incr("telegram.coalesced")
+                return await asyncio.shield(item.future)
+        return await self._enqueue(Outgoing("edit", chat_id, message, message_id))
+
+    async def aclose(self, timeout: float = 10.0) -> None:
+        """Wait up to `timeout` seconds for queued messages, drop the rest."""
+        drains = list(self._drains.values())
+        if not drains:
+            return
+        _, pending = await asyncio.wait(drains, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def _enqueue(self, item: Outgoing) -> asyncio.Future:
+        self._queues.setdefault(item.chat_id, deque()).append(item)
+        self._report_depth(1)
+        if item.chat_id not in self._drains:
+            self._drains[item.chat_id] = asyncio.create_task(
+                self._drain(item.chat_id), name=f"telegram-sender-{item.chat_id}"
+            )
+        return item.future
+
+    async def _drain(self, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        bucket = self._buckets.setdefault(
+            chat_id, TokenBucket(self.chat_rate, self.chat_burst)
+        )
+        try:
+            while queue:
+                item = queue[0]
+                item.sending = True
+                try:
+                    result = await self._deliver(item, bucket)
+                except Exception as e:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                else:
+                    if not item.future.done():
+                        item.future.set_result(result)
+                    metrics.observe(
+                        "telegram.send_latency", time.perf_counter() - item.enqueued_at
+                    )
+                queue.popleft()
+                self._report_depth(-1)
+        finally:
+            for item in queue:
+                item.future.cancel()
+            self._report_depth(-len(queue))
+            del self._queues[chat_id]
+            del self._drains[chat_id]
+            self._forget_bucket(chat_id, bucket)
+
+    def _forget_bucket(self, chat_id: int, bucket: TokenBucket) -> None:
+        """Drop an idle chat's bucket once it is full again.
+
+        A new bucket starts full, so it can't let more through than the
+        dropped one would have. Until then, the bucket is kept.
+        """
+        if chat_id in self._drains or self._buckets.get(chat_id) is not bucket:
+            return
+        delay = bucket.time_to_full()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(
+                delay, self._forget_bucket, chat_id, bucket
+            )
+            return
+        del self._buckets[chat_id]
+
+    async def _deliver(self, item: Outgoing, bucket: TokenBucket) -> dict | None:
+        attempt = 1
+        while True:
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                with metrics.timer("telegram.request"):
+                    return await self._call(item)
+            except TelegramRetryAfter as e:
+                metrics.incr("telegram.retry_after")
+                error: Exception = e
+                delay = e.retry_after
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code < 500:
+                    if (
+                        item.method == "edit"
+                        and "message is not modified" in e.response.text
+                    ):
+                        return None
+                    raise
+                error = e
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+            except httpx.TransportError as e:
+                error = e
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+
+            if attempt >= self.max_attempts:
+                metrics.incr("telegram.failed")
+                raise error
+            metrics.incr("telegram.retried")
+            logger.warning(
+                "Sending to chat %s failed (%r), retrying in %ss",
+                item.chat_id,
+                error,
+                delay,
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _call(self, item: Outgoing) -> dict:
+        if item.method == "edit":
+            assert item.message_id is not None
+            return await self.telegram.edit_message_text(
+                chat_id=item.chat_id, message_id=item.message_id, message=item.text
+            )
+        return await self.telegram.send_message(chat_id=item.chat_id, message=item.text)
+
+    def _report_depth(self, change: int) -> None:
+        self._depth += change
+        metrics.gauge("telegram.queue_depth", self._depth)
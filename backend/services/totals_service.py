@@ -0,0 +1,147 @@
+import datetime
+import zoneinfo
+
+import asyncpg
+
+from backend.db.pool import Pool
+from backend.models import DailyTotals
+
+
+class TotalsService:
+    """Read side of the `daily_totals` rollup, one row per chat and UTC day."""
+
+    def __init__(self, pool: Pool, chat_id: int) -> None:
+        self.pool = pool
+        self.chat_id = chat_id
+
+    async def list_totals(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> list[DailyTotals]:
+        """List daily totals between two UTC dates, inclusive, oldest first.
+
+        Days without any meal or workout are left out.
+        """
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT
+                    date,
+                    calories,
+                    protein,
+                    carbs,
+                    fat,
+                    calories_burned,
+                    meal_count,
+                    workout_count
+                FROM daily_totals
+                WHERE chat_id = $1 AND date BETWEEN $2 AND $3
+                ORDER BY date;
+                """,
+                self.chat_id,
+                start_date,
+                end_date,
+            )
+        return [DailyTotals(**row) for row in rows]
+
+    async def day_totals(self, now: datetime.datetime, timezone: str) -> DailyTotals:
+        """Totals of the day of `now` in `timezone`, so far.
+
+        The rollup is per UTC day, a local day is summed from its entries.
+        """
+        tz = zoneinfo.ZoneInfo(timezone)
+        date = now.astimezone(tz).date()
+        start = datetime.datetime.combine(date, datetime.time(), tz)
+        end = datetime.datetime.combine(
+            date + datetime.timedelta(days=1), datetime.time(), tz
+        )
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT
+                    meals.calories,
+                    meals.protein,
+                    meals.carbs,
+                    meals.fat,
+                    workouts.calories_burned,
+                    meals.meal_count,
+                    workouts.workout_count
+                FROM (
+                    SELECT
+                        COALESCE(SUM(calories), 0) AS calories,
+                        COALESCE(SUM(protein), 0) AS protein,
+                        COALESCE(SUM(carbs), 0) AS carbs,
+                        COALESCE(SUM(fat), 0) AS fat,
+                        COUNT(*) AS meal_count
+                    FROM meals
+                    WHERE chat_id = $1 AND created_at >= $2 AND created_at < $3
+                ) meals, (
+                    SELECT
+                        COALESCE(SUM(calories_burned), 0) AS calories_burned,
+                        COUNT(*) AS workout_count
+                    FROM workouts
+                    WHERE chat_id = $1 AND created_at >= $2 AND created_at < $3
+                ) workouts;
+                """,
+                self.chat_id,
+                start,
+                end,
+            )
+        return DailyTotals(date=date, **row)
+
+
+async def add_to_daily_totals(
+    conn: asyncpg.Connection,
+    chat_id: int,
+    created_at: datetime.datetime,
+    calories: int | None = 0,
+    protein: int | None = 0,
+    carbs: int | None = 0,
+    fat: int | None = 0,
+    calories_burned: int | None = 0,
+    meal_count: int = 0,
+    workout_count: int = 0,
+) -> None:
+    """Add a delta to the totals of the UTC day of `created_at`.
+
+    Meant to run on the connection, and inside the transaction, of the write
+    it accounts for. Pass negative values to remove an entry.
+    """
+    await conn.execute(
+        ADD_TO_DAILY_TOTALS_QUERY,
+        chat_id,
+        created_at,
+        calories or 0,
+        protein or 0,
+        carbs or 0,
+        fat or 0,
+        calories_burned or 0,
+        meal_count,
+        workout_count,
+    )
+
+
+ADD_TO_DAILY_TOTALS_QUERY = """
+    INSERT INTO daily_totals (
+        chat_id,
+        date,
+        calories,
+        protein,
+        carbs,
+        fat,
+        calories_burned,
+        meal_count,
+        workout_count
+    ) VALUES ($1, ($2::timestamptz AT TIME ZONE 'UTC')::date, $3, $4, $5, $6, $7, $8, $9)
+    ON CONFLICT (chat_id, date) DO UPDATE
+    SET calories = daily_totals.calories + EXCLUDED.calories,
+        protein = daily_totals.protein + EXCLUDED.protein,
+        carbs = daily_totals.carbs + EXCLUDED.carbs,
+        fat = daily_totals.fat + EXCLUDED.fat,
+        calories_burned = daily_totals.calories_burned + EXCLUDED.calories_burned,
+        meal_count = daily_totals.meal_count + EXCLUDED.meal_count,
+        workout_count = daily_totals.workout_count + EXCLUDED.workout_count;
+"""
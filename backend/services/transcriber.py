@@ -1,21 +1,62 @@
+import asyncio
 import io
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 from openai.types import AudioModel
 
+from backend.metrics import metrics
+
+
+class TranscriptionQueueFullError(Exception):
+    """Raised when too many voice notes are already waiting to be transcribed."""
+
 
 class Transcriber:
-    def __init__(self, model: AudioModel = "whisper-1") -> None:
-        self.client = OpenAI()
+    """Async Whisper transcriber with bounded concurrency.
+
+    At most `max_concurrency` requests run against OpenAI at once, up to
+    `max_queue` more wait for a slot, and anything beyond that is rejected
+    straight away. `timeout` covers both the wait and the request itself.
+    """
+
+    def __init__(
+        self,
+        model: AudioModel = "whisper-1",
+        max_concurrency: int = 4,
+        max_queue: int = 32,
+        timeout: float = 60.0,
+    ) -> None:
+        self.client = AsyncOpenAI(timeout=timeout)
         self.model = model
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
 
-    def transcribe(self, audio: bytes, mime_type: str) -> str:
+    async def transcribe(self, audio: bytes | memoryview, mime_type: str) -> str:
         assert mime_type == "audio/ogg", "Only OGG audio format is supported"
-        buf = io.BytesIO(audio)
-        buf.name = "voice_message.ogg"  # Set a name for the file
-        buf.seek(0)  # Reset the buffer position
-        transcription = self.client.audio.transcriptions.create(
-            model="whisper-1",
-            file=buf,
-        )
+        if self._waiting >= self.max_queue:
+            metrics.incr("transcriber.rejected")
+            raise TranscriptionQueueFullError("Transcription queue is full")
+
+        async with asyncio.timeout(self.timeout):
+            self._waiting += 1
+            metrics.gauge("transcriber.queue_depth", self._waiting)
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+                metrics.gauge("transcriber.queue_depth", self._waiting)
+
+            try:
+                buf = io.BytesIO(audio)
+                buf.name = "voice_message.ogg"  # Set a name for the file
+                buf.seek(0)  # Reset the buffer position
+                transcription = await self.client.audio.transcriptions.create(
+                    model=self.model,
+                    file=buf,
+                )
+            finally:
+                self._semaphore.release()
+
         return transcription.text
@@ -0,0 +1,177 @@
+import asyncio
+import datetime
+from dataclasses import dataclass
+
+import asyncpg
+
+from backend.clients.telegram.models import Update
+from backend.db.pool import Pool
+
+
+@dataclass
+class Job:
+    update: Update
+    attempts: int
+    created_at: datetime.datetime
+
+
+class UpdateQueue:
+    """Durable queue of Telegram updates backed by the `update_jobs` table.
+
+    Jobs are keyed by `update_id`, so a redelivered update is only stored once.
+    """
+
+    def __init__(self, pool: Pool) -> None:
+        self.pool = pool
+        # Wakes up local workers as soon as something is enqueued, polling
+        # only covers jobs enqueued by other processes and retries
+        self.wakeup = asyncio.Event()
+
+    async def enqueue(self, update: Update) -> bool:
+        """Store an update, return False if it was already queued."""
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            result = await conn.execute(
+                """
+                INSERT INTO update_jobs (update_id, chat_id, payload)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (update_id) DO NOTHING;
+                """,
+                update.update_id,
+                update.message.chat.id,
+                update.model_dump(mode="json", by_alias=True),
+            )
+        self.wakeup.set()
+        return result == "INSERT 0 1"
+
+    async def claim(self, limit: int, visibility_timeout: float) -> list[Job]:
+        """Claim up to `limit` runnable jobs.
+
+        Jobs stuck in processing for longer than `visibility_timeout` seconds,
+        e.g. because the process died mid-job, are claimed again. Only the
+        oldest unfinished job of each chat is claimable, so a chat's updates
+        run one at a time and in order, even across workers and processes.
+        """
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE update_jobs
+                SET status = 'processing',
+                    attempts = attempts + 1,
+                    locked_at = NOW(),
+                    updated_at = NOW()
+                WHERE update_id IN (
+                    SELECT job.update_id
+                    FROM update_jobs job
+                    WHERE (
+                        (job.status = 'pending' AND job.available_at <= NOW())
+                        OR (
+                            job.status = 'processing'
+                            AND job.locked_at < NOW() - make_interval(secs => $2)
+                        )
+                    )
+                    AND NOT EXISTS (
+                        SELECT 1
+                        FROM update_jobs earlier
+                        WHERE earlier.chat_id = job.chat_id
+                            AND earlier.update_id < job.update_id
+                            AND earlier.status IN ('pending', 'processing')
+                    )
+                    ORDER BY job.update_id
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING update_id, payload, attempts, created_at;
+                """,
+                limit,
+                visibility_timeout,
+            )
+        rows = sorted(rows, key=lambda row: row["update_id"])
+        return [
+            Job(
+                update=Update.model_validate(row["payload"]),
+                attempts=row["attempts"],
+                created_at=row["created_at"],
+            )
+            for row in rows
+        ]
+
+    async def complete(self, update_id: int) -> None:
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE update_jobs
+                SET status = 'done',
+                    locked_at = NULL,
+                    updated_at = NOW()
+                WHERE update_id = $1;
+                """,
+                update_id,
+            )
+
+    async def fail(self, update_id: int, error: str, retry_in: float | None) -> None:
+        """Record a failure, retrying after `retry_in` seconds or giving up if None."""
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE update_jobs
+                SET status = CASE WHEN $3::float8 IS NULL THEN 'failed' ELSE 'pending' END,
+                    available_at = NOW() + make_interval(secs => COALESCE($3, 0)),
+                    last_error = $2,
+                    locked_at = NULL,
+                    updated_at = NOW()
+                WHERE update_id = $1;
+                """,
+                update_id,
+                error,
+                retry_in,
+            )
+
+    async def release(self, update_ids: list[int]) -> None:
+        """Hand jobs being processed back to the queue, e.g. on shutdown.
+
+        The interrupted attempt isn't counted.
+        """
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE update_jobs
+                SET status = 'pending',
+                    attempts = GREATEST(attempts - 1, 0),
+                    available_at = NOW(),
+                    locked_at = NULL,
+                    updated_at = NOW()
+                WHERE update_id = ANY($1::bigint[]) AND status = 'processing';
+                """,
+                update_ids,
+            )
+
+    async def depth(self) -> dict[str, int]:
+        """Number of jobs per status, excluding finished ones."""
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT status, COUNT(*) AS count
+                FROM update_jobs
+                WHERE status <> 'done'
+                GROUP BY status;
+                """
+            )
+        return {row["status"]: row["count"] for row in rows}
+
+    async def prune(self, older_than: datetime.timedelta) -> None:
+        """Delete finished jobs, keeping them long enough to dedupe redeliveries."""
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                DELETE FROM update_jobs
+                WHERE status = 'done' AND updated_at < NOW() - $1::interval;
+                """,
+                older_than,
+            )
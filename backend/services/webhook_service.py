@@ -1,10 +1,25 @@
 import asyncio
-from typing import Any, Callable
+import dataclasses
+import functools
+import logging
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from contextlib import AbstractAsyncContextManager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Literal
 
-import asyncpg
-from pydantic_ai import BinaryContent
+import httpx
+from pydantic_ai import Agent, BinaryContent
 from pydantic_ai.agent import AgentRunResult
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    ToolCallPart,
+    UserContent,
+    UserPromptPart,
+)
+from pydantic_ai.models import Model
 
 from backend.agent import Deps, agent
 from backend.clients.telegram.models import (
@@ -14,20 +29,44 @@ from backend.clients.telegram.models import (
     Update,
     VoiceMessage,
 )
-from backend.clients.telegram.telegram import TelegramClient
+from backend.db.pool import Pool
+from backend.metrics import metrics
+from backend.services.audio_transcoder import AudioTranscoder
+from backend.services.chat_context import build_chat_context
+from backend.services.chat_scheduler import ChatScheduler
+from backend.services.chat_settings_service import ChatSettingsService
+from backend.services.food_database import FoodDatabase
+from backend.services.history_service import HistoryService
+from backend.services.image_processor import ImageProcessor
 from backend.services.meal_service import MealService
+from backend.services.media_cache import MediaCache
 from backend.services.memory_service import MemoryService
-from backend.services.transcriber import Transcriber
+from backend.services.model_router import ModelRouter
+from backend.services.reply_stream import ReplyStream
+from backend.services.telegram_sender import TelegramSender
+from backend.services.totals_service import TotalsService
+from backend.services.transcriber import Transcriber, TranscriptionQueueFullError
 from backend.services.workout_service import WorkoutService
 
+logger = logging.getLogger(__name__)
+
+
+# Set by a streamed reply once it starts showing, so the delay notice isn't
+# sent in the middle of, or after, the reply
+reply_started: ContextVar[asyncio.Event | None] = ContextVar(
+    "reply_started", default=None
+)
+
 
 def notify_user_on_delay(seconds: int) -> Any:
     """Decorator to notify user after a delay, in case the processing takes time."""
 
     def decorator(func: Callable) -> Callable:
         async def wrapper(*args: Any, **kwargs: Any) -> Any:
-            # Create an event to signal when the main function completes
+            # Create an event to signal when the main function completes, or
+            # its reply starts showing
             completed = asyncio.Event()
+            token = reply_started.set(completed)
 
             async def delayed_notification() -> None:
                 """Send notification if processing takes too long."""
@@ -39,11 +78,12 @@ def notify_user_on_delay(seconds: int) -> Any:
                         payload = args[1]
                         telegram = args[2]
                         if isinstance(payload, Update) and isinstance(
-                            telegram, TelegramClient
+                            telegram, TelegramSender
                         ):
-                            telegram.send_message(
+                            await telegram.send_message(
                                 chat_id=payload.message.chat.id,
                                 message="Processing your request, please wait a moment...",
+                                status=True,
                             )
 
             # Start the notification task
@@ -54,6 +94,7 @@ def notify_user_on_delay(seconds: int) -> Any:
                 return await func(*args, **kwargs)
             finally:
                 # Signal completion and cleanup
+                reply_started.reset(token)
                 completed.set()
                 notification_task.cancel()
                 try:
@@ -66,34 +107,219 @@ def notify_user_on_delay(seconds: int) -> Any:
     return decorator
 
 
+def record_round_trips(messages: list[ModelMessage]) -> None:
+    """Count the model requests and tool calls of a run, per run and per tool."""
+    model_requests = 0
+    tool_calls = 0
+    for message in messages:
+        if not isinstance(message, ModelResponse):
+            continue
+        model_requests += 1
+        for part in message.parts:
+            if isinstance(part, ToolCallPart):
+                tool_calls += 1
+                metrics.incr(f"agent.tool_calls.{part.tool_name}")
+    metrics.observe("agent.model_requests", model_requests)
+    metrics.observe("agent.tool_calls", tool_calls)
+
+
+def without_files(messages: list[ModelMessage]) -> list[ModelMessage]:
+    """Replace the files the user sent with a note, so the turn can be stored.
+
+    Memory is JSON, which can't hold the raw bytes of a voice note, image or
+    document. The rest of the turn is kept, so follow-ups still have it.
+    """
+
+    def describe(content: UserContent) -> UserContent:
+        if not isinstance(content, BinaryContent):
+            return content
+        if content.is_audio:
+            return "[The user sent a voice message]"
+        if content.is_image:
+            return "[The user sent an image]"
+        return "[The user sent a document]"
+
+    stored: list[ModelMessage] = []
+    for message in messages:
+        if isinstance(message, ModelRequest):
+            message = dataclasses.replace(
+                message,
+                parts=[
+                    dataclasses.replace(part, content=list(map(describe, part.content)))
+                    if isinstance(part, UserPromptPart)
+                    and not isinstance(part.content, str)
+                    else part
+                    for part in message.parts
+                ],
+            )
+        stored.append(message)
+    return stored
+
+
 class WebhookService:
     """Service for handling Telegram webhook updates."""
 
-    def __init__(self, pool: asyncpg.Pool, transcriber: Transcriber):
+    def __init__(
+        self,
+        pool: Pool,
+        transcriber: Transcriber,
+        audio_transcoder: AudioTranscoder,
+        media_cache: MediaCache,
+        image_processor: ImageProcessor,
+        scheduler: ChatScheduler,
+        history_service: HistoryService,
+        food_database: FoodDatabase,
+        router: ModelRouter,
+        unit_of_work: bool = False,
+        voice_mode: Literal["transcribe", "audio"] = "transcribe",
+        voice_audio_model: str | None = None,
+        voice_max_duration: int = 300,
+        voice_audio_max_duration: int = 120,
+        reply_mode: Literal["send", "stream"] = "send",
+        stream_edit_interval: float = 1.0,
+    ):
         self.pool = pool
         self.transcriber = transcriber
+        self.audio_transcoder = audio_transcoder
+        self.media_cache = media_cache
+        self.image_processor = image_processor
+        self.scheduler = scheduler
+        self.history_service = history_service
+        self.food_database = food_database
+        self.router = router
+        self.unit_of_work = unit_of_work
+        self.voice_mode = voice_mode
+        self.voice_audio_model = voice_audio_model
+        self.voice_max_duration = voice_max_duration
+        self.voice_audio_max_duration = voice_audio_max_duration
+        self.reply_mode = reply_mode
+        self.stream_edit_interval = stream_edit_interval
+
+    def connections(self) -> AbstractAsyncContextManager[Pool]:
+        """Connections for processing one update.
+
+        In unit-of-work mode every service shares one connection and one
+        transaction, committed once the update is fully processed, so a failed
+        update leaves nothing behind when it is retried.
+        """
+        if self.unit_of_work:
+            return self.pool.unit_of_work()
+        return nullcontext(self.pool)
+
+    async def reply(
+        self,
+        user_prompt: str | Sequence[UserContent],
+        deps: Deps,
+        message_history: list[ModelMessage],
+        telegram: TelegramSender,
+        model: Model | str | None = None,
+        tier: str = "default",
+    ) -> AgentRunResult[str]:
+        """Run the agent within the global limit of concurrent runs and send its reply.
+
+        In stream mode the reply is shown while it is being generated, by
+        editing the message it was first posted in. `tier` labels the run's
+        latency and token metrics, per model tier.
+        """
+        started = time.perf_counter()
+        if self.reply_mode == "stream":
+            result = await self.stream_reply(
+                user_prompt, deps, message_history, telegram, model, started
+            )
+        else:
+            async with self.scheduler.agent_run():
+                result = await agent.run(
+                    user_prompt,
+                    deps=deps,
+                    message_history=message_history,
+                    model=model,
+                )
+            metrics.observe("reply.send.first_token", time.perf_counter() - started)
+            await self.deliver(
+                telegram.send_message(chat_id=deps.chat_id, message=result.output)
+            )
+        elapsed = time.perf_counter() - started
+        metrics.observe(f"reply.{self.reply_mode}.total", elapsed)
+        metrics.observe(f"agent.{tier}.latency", elapsed)
+
+        usage = result.usage()
+        metrics.observe("agent.request_tokens", usage.request_tokens or 0)
+        metrics.observe("agent.response_tokens", usage.response_tokens or 0)
+        metrics.observe("agent.total_tokens", usage.total_tokens or 0)
+        metrics.incr(f"agent.{tier}.request_tokens", usage.request_tokens or 0)
+        metrics.incr(f"agent.{tier}.response_tokens", usage.response_tokens or 0)
+        record_round_trips(result.new_messages())
+        return result
+
+    async def stream_reply(
+        self,
+        user_prompt: str | Sequence[UserContent],
+        deps: Deps,
+        message_history: list[ModelMessage],
+        telegram: TelegramSender,
+        model: Model | str | None,
+        started: float,
+    ) -> AgentRunResult[str]:
+        stream = ReplyStream(telegram, deps.chat_id, self.stream_edit_interval)
+        first_token = True
+        async with (
+            self.scheduler.agent_run(),
+            agent.iter(
+                user_prompt,
+                deps=deps,
+                message_history=message_history,
+                model=model,
+            ) as run,
+        ):
+            async for node in run:
+                if not Agent.is_model_request_node(node):
+                    continue
+                # A response can write text before calling tools, the tools
+                # still run and the next response's text replaces it, only
+                # the last response is the reply
+                async with node.stream(run.ctx) as response:
+                    async for text in response.stream_text():
+                        if first_token:
+                            metrics.observe(
+                                "reply.stream.first_token",
+                                time.perf_counter() - started,
+                            )
+                            if started_event := reply_started.get():
+                                started_event.set()
+                            first_token = False
+                        await stream.update(text)
+        assert run.result is not None
+        await self.deliver(stream.finish(run.result.output))
+        return run.result
+
+    async def deliver(self, send: Awaitable[Any]) -> None:
+        """Wait for a reply to be sent, without failing the update if it can't be.
+
+        By then the agent's writes are done, retrying the update would redo
+        them. The sender already retried what could be retried.
+        """
+        try:
+            await send
+        except httpx.HTTPError:
+            logger.exception("Failed to deliver a reply")
+            metrics.incr("telegram.undelivered")
 
     async def process_text_message(
         self,
         payload: TextMessage,
-        meal_service: MealService,
-        workout_service: WorkoutService,
-        telegram: TelegramClient,
+        deps: Deps,
+        telegram: TelegramSender,
         message_history: list[ModelMessage],
     ) -> AgentRunResult[str]:
         """Process a text message and return the result."""
-        result = await agent.run(
+        route = self.router.route(payload, payload.text)
+        result = await self.reply(
             payload.text,
-            deps=Deps(
-                meal_service=meal_service,
-                workout_service=workout_service,
-            ),
+            deps=deps,
             message_history=message_history,
-        )
-
-        telegram.send_message(
-            chat_id=payload.chat.id,
-            message=result.output,
+            telegram=telegram,
+            model=route.model,
+            tier=route.tier,
         )
 
         return result
@@ -102,85 +328,140 @@ class WebhookService:
         self,
         payload: ImageMessage,
         caption: str | None,
-        meal_service: MealService,
-        workout_service: WorkoutService,
-        telegram: TelegramClient,
+        deps: Deps,
+        telegram: TelegramSender,
         message_history: list[ModelMessage],
     ) -> AgentRunResult[str]:
         """Process an image message and return the result."""
-        image = telegram.get_file(payload.images[0].file_id)
-
-        result = await agent.run(
-            [
-                (
-                    "The user have sent an image, verify if it's related to a meal or workout and process it accordingly. "
-                    "If it's a meal, echo to the user the meal's name, calories, nutrients, ingredients you see, etc, estimate the quantity. "
-                    "Log the meal in the database. "
-                    "If it's a workout, echo to the user the workout's name, duration, calories burned, etc. "
-                    "Log the workout in the database."
-                ),
-                (
-                    f"User provided this caption to the image:\n{caption}"
-                    if caption
-                    else "No caption provided."
-                ),
-                BinaryContent(data=image, media_type="image/png"),
-            ],
-            deps=Deps(
-                meal_service=meal_service,
-                workout_service=workout_service,
-            ),
-            message_history=message_history,
-        )
+        # Telegram sends the same photo in several sizes, smallest first
+        photo = self.image_processor.select(payload.images)
+        with metrics.timer("image.download"):
+            image = await self.media_cache.get(photo.file_id, photo.file_unique_id)
+        image, media_type = await self.image_processor.prepare(image, photo)
 
-        telegram.send_message(
-            chat_id=payload.chat.id,
-            message=result.output,
-        )
+        route = self.router.route(payload, caption)
+        with metrics.timer("image.agent"):
+            result = await self.reply(
+                [
+                    (
+                        "The user have sent an image, verify if it's related to a meal or workout and process it accordingly. "
+                        "If it's a meal, echo to the user the meal's name, calories, nutrients, ingredients you see, etc, estimate the quantity. "
+                        "Log the meal in the database. "
+                        "If it's a workout, echo to the user the workout's name, duration, calories burned, etc. "
+                        "Log the workout in the database."
+                    ),
+                    (
+                        f"User provided this caption to the image:\n{caption}"
+                        if caption
+                        else "No caption provided."
+                    ),
+                    BinaryContent(data=image, media_type=media_type),
+                ],
+                deps=deps,
+                message_history=message_history,
+                telegram=telegram,
+                model=route.model,
+                tier=route.tier,
+            )
 
         return result
 
+    async def prepare_voice(self, payload: VoiceMessage) -> str | BinaryContent:
+        """Download a voice note and turn it into the agent's input.
+
+        In audio mode, notes up to `voice_audio_max_duration` seconds are
+        converted and sent to the model as audio, in a single model call.
+        Otherwise, or if converting fails, they are transcribed first.
+        """
+        with metrics.timer("voice.download"):
+            voice_message = await self.media_cache.get(
+                payload.voice.file_id, payload.voice.file_unique_id
+            )
+
+        if (
+            self.voice_mode == "audio"
+            and payload.voice.duration <= self.voice_audio_max_duration
+        ):
+            try:
+                with metrics.timer("voice.transcode"):
+                    audio, media_type = await self.audio_transcoder.transcode(
+                        voice_message, payload.voice.mime_type
+                    )
+                return BinaryContent(data=audio, media_type=media_type)
+            except Exception:
+                logger.exception(
+                    "Failed to convert a voice note, transcribing it instead"
+                )
+                metrics.incr("voice.transcode_failed")
+
+        with metrics.timer("voice.transcribe"):
+            return await self.transcriber.transcribe(
+                voice_message, payload.voice.mime_type
+            )
+
+    async def try_prepare_voice(
+        self, payload: VoiceMessage
+    ) -> str | BinaryContent | None:
+        """Prepare a voice note, None if transcription is overloaded or timed out."""
+        try:
+            return await self.prepare_voice(payload)
+        except (TranscriptionQueueFullError, TimeoutError):
+            metrics.incr("voice.unavailable")
+            return None
+
     async def process_voice_message(
         self,
         payload: VoiceMessage,
-        meal_service: MealService,
-        workout_service: WorkoutService,
-        telegram: TelegramClient,
+        voice: str | BinaryContent,
+        deps: Deps,
+        telegram: TelegramSender,
         message_history: list[ModelMessage],
     ) -> AgentRunResult[str] | None:
-        """Process a voice message and return the result."""
-        voice_message = telegram.get_file(payload.voice.file_id)
-
-        # TODO: Use BinaryContent instead of transcribing the audio
-        # Does not work out of the box because of the format, need to convert the audio to different format
-        text = self.transcriber.transcribe(voice_message, payload.voice.mime_type)
-
-        return await self.process_text_message(
-            TextMessage(
-                message_id=payload.message_id,
-                chat=payload.chat,
-                user=payload.user,  # type: ignore
-                date=payload.date,
-                text=text,
-            ),
-            meal_service,
-            workout_service,
-            telegram,
-            message_history,
-        )
+        """Process a voice message, as a transcript or as audio, and return the result."""
+        if isinstance(voice, str):
+            with metrics.timer("voice.agent"):
+                return await self.process_text_message(
+                    TextMessage(
+                        message_id=payload.message_id,
+                        chat=payload.chat,
+                        user=payload.user,
+                        date=payload.date,
+                        text=voice,
+                    ),
+                    deps,
+                    telegram,
+                    message_history,
+                )
+
+        with metrics.timer("voice.agent"):
+            result = await self.reply(
+                [
+                    "The user has sent a voice message, listen to it and respond to what they say as if they had typed it.",
+                    voice,
+                ],
+                deps=deps,
+                message_history=message_history,
+                telegram=telegram,
+                model=self.voice_audio_model,
+                tier="audio",
+            )
+
+        return result
 
     async def process_document_message(
         self,
         payload: DocumentMessage,
-        meal_service: MealService,
-        workout_service: WorkoutService,
-        telegram: TelegramClient,
+        deps: Deps,
+        telegram: TelegramSender,
         message_history: list[ModelMessage],
     ) -> AgentRunResult[str]:
         """Process a document message and return the result."""
-        document = telegram.get_file(payload.document.file_id)
+        document = await self.media_cache.get(
+            payload.document.file_id, payload.document.file_unique_id
+        )
 
-        result = await agent.run(
+        route = self.router.route(payload)
+        result = await self.reply(
             [
                 "The user have sent a document, scan through it, verify if it's related to a meal or workout and process it accordingly.",
                 BinaryContent(
@@ -188,16 +469,11 @@ class WebhookService:
                     media_type=payload.document.mime_type,
                 ),
             ],
-            deps=Deps(
-                meal_service=meal_service,
-                workout_service=workout_service,
-            ),
+            deps=deps,
             message_history=message_history,
-        )
-
-        telegram.send_message(
-            chat_id=payload.chat.id,
-            message=result.output,
+            telegram=telegram,
+            model=route.model,
+            tier=route.tier,
         )
 
         return result
@@ -206,55 +482,114 @@ class WebhookService:
     async def process_update(
         self,
         payload: Update,
-        telegram: TelegramClient,
+        telegram: TelegramSender,
     ) -> None:
-        """Process a Telegram update with proper database connection management."""
-        # Get fresh connections from pool for the background task
-        meal_service = MealService(self.pool)
-        workout_service = WorkoutService(self.pool)
-        memory_service = MemoryService(self.pool)
-
-        # Get message history once for all processors
-        message_history = await memory_service.get()
-        if not message_history:
-            message_history = []
-
-        result = None
-        match payload.message:
-            case TextMessage():
-                result = await self.process_text_message(
-                    payload.message,
-                    meal_service,
-                    workout_service,
-                    telegram,
-                    message_history,
-                )
-            case ImageMessage():
-                result = await self.process_image_message(
-                    payload.message,
-                    payload.caption,
-                    meal_service,
-                    workout_service,
-                    telegram,
-                    message_history,
-                )
-            case VoiceMessage():
-                result = await self.process_voice_message(
-                    payload.message,
-                    meal_service,
-                    workout_service,
-                    telegram,
-                    message_history,
+        """Process a Telegram update with proper database connection management.
+
+        Updates of the same chat are processed one at a time, in arrival order.
+        """
+        async with (
+            self.scheduler.chat(payload.message.chat.id),
+            self.connections() as db,
+        ):
+            # Get fresh connections from pool for the background task, all
+            # data is scoped to the chat the update came from
+            chat_id = payload.message.chat.id
+            meal_service = MealService(db, chat_id)
+            workout_service = WorkoutService(db, chat_id)
+            totals_service = TotalsService(db, chat_id)
+            chat_settings_service = ChatSettingsService(db, chat_id)
+            memory_service = MemoryService(db, chat_id)
+            load_context = functools.partial(
+                build_chat_context,
+                chat_settings_service,
+                meal_service,
+                workout_service,
+                totals_service,
+            )
+
+            # Get message history and the chat's context once for all
+            # processors, concurrently, voice notes are downloaded and
+            # prepared while they are being fetched
+            voice: str | BinaryContent = ""
+            voice_started = time.perf_counter()
+            if isinstance(payload.message, VoiceMessage):
+                if payload.message.voice.duration > self.voice_max_duration:
+                    metrics.incr("voice.too_long")
+                    await telegram.send_message(
+                        chat_id=payload.message.chat.id,
+                        message=f"That voice message is too long, please keep it under {self.voice_max_duration} seconds.",
+                    )
+                    return
+                message_history, context, prepared = await asyncio.gather(
+                    memory_service.get(),
+                    load_context(),
+                    self.try_prepare_voice(payload.message),
                 )
-            case DocumentMessage():
-                result = await self.process_document_message(
-                    payload.message,
-                    meal_service,
-                    workout_service,
-                    telegram,
-                    message_history,
+                if prepared is None:
+                    await telegram.send_message(
+                        chat_id=payload.message.chat.id,
+                        message="I can't process voice messages right now, please try again in a moment.",
+                    )
+                    return
+                voice = prepared
+            else:
+                message_history, context = await asyncio.gather(
+                    memory_service.get(),
+                    load_context(),
                 )
+            # Keep the recent turns, older ones are folded into a summary
+            message_history = await self.history_service.build(
+                chat_id, message_history or [], db=db
+            )
+            deps = Deps(
+                chat_id=chat_id,
+                meal_service=meal_service,
+                workout_service=workout_service,
+                totals_service=totals_service,
+                food_database=self.food_database,
+                chat_settings_service=chat_settings_service,
+                context=context,
+            )
+
+            result = None
+            match payload.message:
+                case TextMessage():
+                    result = await self.process_text_message(
+                        payload.message,
+                        deps,
+                        telegram,
+                        message_history,
+                    )
+                case ImageMessage():
+                    result = await self.process_image_message(
+                        payload.message,
+                        payload.caption,
+                        deps,
+                        telegram,
+                        message_history,
+                    )
+                case VoiceMessage():
+                    result = await self.process_voice_message(
+                        payload.message,
+                        voice,
+                        deps,
+                        telegram,
+                        message_history,
+                    )
+                    # End to end, per way the note reached the model
+                    mode = "transcribe" if isinstance(voice, str) else "audio"
+                    metrics.observe(
+                        f"voice.{mode}.total", time.perf_counter() - voice_started
+                    )
+                case DocumentMessage():
+                    result = await self.process_document_message(
+                        payload.message,
+                        deps,
+                        telegram,
+                        message_history,
+                    )
 
-        # Save the updated message history if a result was produced
-        if result:
-            await memory_service.save(result.all_messages())
+            # Append the messages of this run if a result was produced
+            if result:
+                await memory_service.save(without_files(result.new_messages()))
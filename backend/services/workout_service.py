@@ -1,60 +1,109 @@
 import datetime
 import uuid
+from collections.abc import Mapping, Sequence
+from typing import Any
 
 import asyncpg
+from pydantic import TypeAdapter
 
-from backend.models import Workout
+from backend.db.pool import Pool
+from backend.models import Cursor, Page, Workout
+from backend.services.totals_service import add_to_daily_totals
 
 
 class WorkoutService:
-    def __init__(self, pool: asyncpg.Pool) -> None:
+    def __init__(self, pool: Pool, chat_id: int) -> None:
         self.pool = pool
+        self.chat_id = chat_id
 
     async def save(self, workout: Workout) -> Workout:
+        conn: asyncpg.Connection
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(INSERT_WORKOUT_QUERY, *self._insert_args(workout))
+                await add_to_daily_totals(
+                    conn,
+                    self.chat_id,
+                    workout.created_at,
+                    calories_burned=workout.calories_burned,
+                    workout_count=1,
+                )
+        return workout
+
+    async def save_many(self, workouts: list[Workout]) -> list[Workout]:
+        """Save several workouts at once, all or none of them.
+
+        The rows and their daily totals are written by a single statement,
+        in a single round trip.
+        """
+        if not workouts:
+            return workouts
+
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
             await conn.execute(
-                """
-            INSERT INTO workouts (
-                id,
-                created_at,
-                name,
-                type,
-                duration,
-                calories_burned
-            ) VALUES ($1, $2, $3, $4, $5, $6);
-            """,
-                workout.id,
-                workout.created_at,
-                workout.name,
-                workout.type,
-                workout.duration,
-                workout.calories_burned,
+                SAVE_WORKOUTS_QUERY,
+                self.chat_id,
+                [workout.id for workout in workouts],
+                [workout.created_at for workout in workouts],
+                [workout.name for workout in workouts],
+                [workout.type for workout in workouts],
+                [workout.duration for workout in workouts],
+                [workout.calories_burned for workout in workouts],
             )
-        return workout
+        return workouts
+
+    def _insert_args(self, workout: Workout) -> tuple:
+        return (
+            workout.id,
+            self.chat_id,
+            workout.created_at,
+            workout.name,
+            workout.type,
+            workout.duration,
+            workout.calories_burned,
+        )
 
     async def update(self, id: uuid.UUID, workout: Workout) -> Workout:
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                """
-                UPDATE workouts
-                SET name = $1,
-                    type = $2,
-                    duration = $3,
-                calories_burned = $4
-            WHERE id = $5;
-            """,
-                workout.name,
-                workout.type,
-                workout.duration,
-                workout.calories_burned,
-                id,
-            )
+            async with conn.transaction():
+                # Returns the previous values, to move the totals by the difference
+                old = await conn.fetchrow(
+                    """
+                    UPDATE workouts
+                    SET name = $1,
+                        type = $2,
+                        duration = $3,
+                        calories_burned = $4
+                    FROM (
+                        SELECT id, created_at, calories_burned
+                        FROM workouts
+                        WHERE id = $5 AND chat_id = $6
+                        FOR UPDATE
+                    ) AS old
+                    WHERE workouts.id = old.id
+                    RETURNING old.created_at, old.calories_burned;
+                    """,
+                    workout.name,
+                    workout.type,
+                    workout.duration,
+                    workout.calories_burned,
+                    id,
+                    self.chat_id,
+                )
 
-        # No rows updated means the workout was not found
-        if result == "UPDATE 0":
-            raise ValueError("Workout not found")
+                # No rows updated means the workout was not found
+                if old is None:
+                    raise ValueError("Workout not found")
+
+                await add_to_daily_totals(
+                    conn,
+                    self.chat_id,
+                    old["created_at"],
+                    calories_burned=(workout.calories_burned or 0)
+                    - (old["calories_burned"] or 0),
+                )
 
         return workout
 
@@ -62,23 +111,120 @@ class WorkoutService:
         self,
         start_time: datetime.datetime,
         end_time: datetime.datetime,
+        limit: int | None = None,
+        cursor: Cursor | None = None,
     ) -> list[Workout]:
+        """List workouts in the range, newest first.
+
+        At most `limit` workouts are returned, starting right after `cursor`.
+        """
+        cursor = cursor or Cursor.first(end_time)
         conn: asyncpg.Connection
         async with self.pool.acquire() as conn:
             rows = await conn.fetch(
-                """
-                SELECT 
-                    id,
-                created_at,
-                name,
-                type,
-                duration,
-                calories_burned
-            FROM workouts
-            WHERE created_at BETWEEN $1 AND $2
-            ORDER BY created_at DESC;
-            """,
+                LIST_WORKOUTS_QUERY,
+                self.chat_id,
                 start_time,
-                end_time,
+                cursor.created_at,
+                cursor.id,
+                limit,
             )
-        return [Workout(**row) for row in rows]
+        return workouts_from_rows(rows)
+
+    async def page_workouts(
+        self,
+        start_time: datetime.datetime,
+        end_time: datetime.datetime,
+        limit: int,
+        cursor: Cursor | None = None,
+    ) -> Page[Workout]:
+        """Get a page of workouts in the range, with the cursor of the next one."""
+        workouts = await self.list_workouts(start_time, end_time, limit + 1, cursor)
+        if len(workouts) <= limit:
+            return Page(items=workouts)
+
+        workouts = workouts[:limit]
+        last = workouts[-1]
+        return Page(
+            items=workouts,
+            next_cursor=Cursor(created_at=last.created_at, id=last.id),
+        )
+
+
+INSERT_WORKOUT_QUERY = """
+    INSERT INTO workouts (
+        id,
+        chat_id,
+        created_at,
+        name,
+        type,
+        duration,
+        calories_burned
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7);
+"""
+
+# Inserts a batch of workouts, one array per column, and adds them to the
+# daily totals, grouped per day since a row can only be upserted once per
+# statement
+SAVE_WORKOUTS_QUERY = """
+    WITH inserted AS (
+        INSERT INTO workouts (
+            id,
+            chat_id,
+            created_at,
+            name,
+            type,
+            duration,
+            calories_burned
+        )
+        SELECT id, $1, created_at, name, type, duration, calories_burned
+        FROM unnest(
+            $2::uuid[],
+            $3::timestamptz[],
+            $4::text[],
+            $5::text[],
+            $6::integer[],
+            $7::integer[]
+        ) AS workout(id, created_at, name, type, duration, calories_burned)
+        RETURNING created_at, calories_burned
+    )
+    INSERT INTO daily_totals (chat_id, date, calories_burned, workout_count)
+    SELECT
+        $1,
+        (created_at AT TIME ZONE 'UTC')::date AS day,
+        SUM(COALESCE(calories_burned, 0)),
+        COUNT(*)
+    FROM inserted
+    GROUP BY day
+    ON CONFLICT (chat_id, date) DO UPDATE
+    SET calories_burned = daily_totals.calories_burned + EXCLUDED.calories_burned,
+        workout_count = daily_totals.workout_count + EXCLUDED.workout_count;
+"""
+
+# Keyset pagination on (created_at, id), matching the workouts index. The upper
+# bound is the previous page's last row, or the end of the range for the
+# first page. A NULL limit returns everything.
+LIST_WORKOUTS_QUERY = """
+    SELECT
+        id,
+        created_at,
+        name,
+        type,
+        duration,
+        calories_burned
+    FROM workouts
+    WHERE chat_id = $1
+        AND created_at >= $2
+        AND (created_at, id) < ($3, $4)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $5;
+"""
+
+
+# Validates a whole result in a single call into pydantic-core, cheaper
+# than building and validating each workout on its own
+WORKOUTS_ADAPTER = TypeAdapter(list[Workout])
+
+
+def workouts_from_rows(rows: Sequence[Mapping[str, Any]]) -> list[Workout]:
+    return WORKOUTS_ADAPTER.validate_python([dict(row) for row in rows])
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -13,5 +15,109 @@ class Settings(BaseSettings):
     openai_api_key: str
     database_url: str
 
+    # Telegram Bot API, point it at a local fake server for tests. Outbound
+    # messages are limited per second, globally and per chat, with bursts of
+    # up to telegram_chat_burst messages to a chat
+    telegram_api_url: str = "https://api.telegram.org"
+    telegram_global_rate: float = 30.0
+    telegram_chat_rate: float = 1.0
+    telegram_chat_burst: float = 3.0
+    telegram_send_max_attempts: int = 5
+
+    # Connection pool, timeouts in seconds
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 40
+    db_command_timeout: float = 10.0
+    db_acquire_timeout: float | None = 30.0
+    db_statement_cache_size: int = 100
+    db_max_inactive_connection_lifetime: float = 300.0
+    # Process each update on one connection in one transaction, committed
+    # once the update is done, so a retried update doesn't save its meals and
+    # totals again. This holds the connection for the whole update, the pool
+    # must be larger than the updates in flight, worker_concurrency *
+    # worker_batch_size, so the queue still gets a connection. Without it, a
+    # retried update redoes the writes of its failed attempts
+    db_unit_of_work: bool = True
+
+    # Voice transcription
+    transcription_model: str = "whisper-1"
+    transcription_max_concurrency: int = 4
+    transcription_max_queue: int = 32
+    transcription_timeout: float = 60.0
+
+    # Voice handling: "transcribe" runs Whisper then the agent, "audio" sends
+    # notes up to voice_audio_max_duration seconds to voice_audio_model as
+    # audio, in a single model call. Durations are in seconds.
+    voice_mode: Literal["transcribe", "audio"] = "transcribe"
+    voice_audio_model: str = "openai:gpt-4o-audio-preview"
+    voice_encoder: Literal["pydub", "silence"] = "pydub"
+    voice_transcode_workers: int = 2
+    voice_max_duration: int = 300
+    voice_audio_max_duration: int = 120
+
+    # Agent models. With model_routing, short logs and small talk go to
+    # agent_fast_model, advice, analysis and documents to agent_large_model,
+    # the rest, confirmations included, to agent_model. Text lengths are in
+    # characters
+    agent_model: str = "openai:gpt-4.1-mini"
+    agent_fast_model: str = "openai:gpt-4.1-nano"
+    agent_large_model: str = "openai:gpt-4.1"
+    model_routing: bool = False
+    routing_fast_max_chars: int = 160
+    routing_large_min_chars: int = 600
+
+    # Replies: "send" posts the full reply once the agent is done, "stream"
+    # posts it as soon as text arrives and edits it as more comes in, at most
+    # once every stream_edit_interval seconds
+    reply_mode: Literal["send", "stream"] = "send"
+    stream_edit_interval: float = 1.0
+
+    # Agent message history window and rolling summary
+    history_max_turns: int = 10
+    history_token_budget: int = 6000
+    summary_token_budget: int = 400
+    summary_model: str = "openai:gpt-4.1-mini"
+
+    # Validated message history cached in process, in days (per chat)
+    message_cache_size: int = 256
+
+    # Recent meal estimates cached in process, per chat and global, so
+    # repeat meals are logged without estimating them again. TTL in seconds
+    estimate_cache_size: int = 10000
+    estimate_cache_ttl: float = 7 * 24 * 3600
+
+    # Food composition data, per 100 g, for the lookup_nutrition tool. The
+    # CSV is compiled to foods_compiled_path when that is missing or older
+    foods_path: str = "backend/data/foods.csv"
+    foods_compiled_path: str = ".cache/foods.bin"
+    food_match_min_score: float = 0.7
+
+    # Upper bound on agent runs in flight across all chats
+    max_concurrent_agent_runs: int = 8
+
+    # Update queue workers
+    worker_concurrency: int = 4
+    worker_batch_size: int = 8
+    worker_poll_interval: float = 1.0
+    worker_max_attempts: int = 5
+    worker_retry_backoff: float = 2.0
+    worker_visibility_timeout: float = 300.0
+
+    # Downloaded Telegram files, cached on disk by file_unique_id
+    media_cache_dir: str = ".cache/media"
+    media_cache_max_bytes: int = 512 * 1024 * 1024
+
+    # Photos sent to the model: the smallest Telegram size at least
+    # image_target_side large is picked, and downscaled to it if it is over
+    # image_max_side or image_max_bytes
+    image_target_side: int = 1024
+    image_max_side: int = 1600
+    image_max_bytes: int = 1024 * 1024
+    image_jpeg_quality: int = 85
+    image_max_workers: int = 2
+
+    # Scheduled reports, sent to every chat
+    report_send_concurrency: int = 8
+
 
 settings = Settings()  # type: ignore
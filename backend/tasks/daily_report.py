@@ -1,9 +1,20 @@
-from backend.clients.telegram.telegram import TelegramClient
+import datetime
+
+from backend.db.pool import Pool
+from backend.services.telegram_sender import TelegramSender
 from backend.settings import settings
+from backend.tasks.reports import send_reports
 
 
-# TODO: Implement daily report logic
-def daily_report(chat_id: int) -> None:
-    telegram = TelegramClient(settings.bot_token)
-    message = "Daily report generated."
-    telegram.send_message(chat_id, message=message)
+async def daily_report(pool: Pool, telegram: TelegramSender) -> None:
+    """Send every chat the report of the current UTC day."""
+    today = datetime.datetime.now(datetime.UTC).date()
+    await send_reports(
+        "daily",
+        "Your day so far:",
+        pool,
+        telegram,
+        today,
+        today,
+        concurrency=settings.report_send_concurrency,
+    )
@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+import logging
+
+from backend.db.pool import Pool
+from backend.metrics import metrics
+from backend.services.report_service import Report, ReportService
+from backend.services.telegram_sender import TelegramSender
+
+logger = logging.getLogger(__name__)
+
+
+async def send_reports(
+    name: str,
+    title: str,
+    pool: Pool,
+    telegram: TelegramSender,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    concurrency: int = 8,
+) -> None:
+    """Build every chat's report for the period and send them.
+
+    Sends run at most `concurrency` at a time, a failed send is logged and
+    doesn't stop the others.
+    """
+    with metrics.timer(f"reports.{name}.generate"):
+        reports = await ReportService(pool).build_reports(start_date, end_date)
+    metrics.gauge(f"reports.{name}.chats", len(reports))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(report: Report) -> None:
+        async with semaphore:
+            try:
+                with metrics.timer("reports.send"):
+                    await telegram.send_message(
+                        report.chat_id, message=render_report(title, report)
+                    )
+            except Exception:
+                logger.exception(
+                    "Failed to send the %s report to %s", name, report.chat_id
+                )
+                metrics.incr("reports.failed")
+                return
+        metrics.incr("reports.sent")
+
+    with metrics.timer(f"reports.{name}.total"):
+        await asyncio.gather(*(send(report) for report in reports))
+
+
+def render_report(title: str, report: Report) -> str:
+    """Render a report as plain text, Telegram messages have no Markdown."""
+    totals, previous = report.totals, report.previous
+    lines = [title]
+    if totals.meal_count:
+        lines += [
+            f"• Eaten: {totals.calories} kcal{_change(totals.calories, previous.calories)}",
+            f"• Macros: {totals.protein} g protein • {totals.carbs} g carbs • {totals.fat} g fat",
+            f"• Meals logged: {totals.meal_count}",
+        ]
+    else:
+        lines.append("• No meals logged.")
+    if totals.workout_count:
+        lines += [
+            f"• Burned: {totals.calories_burned} kcal"
+            f"{_change(totals.calories_burned, previous.calories_burned)}",
+            f"• Workouts: {totals.workout_count}",
+        ]
+    if report.top_foods:
+        lines.append(f"Top foods: {', '.join(report.top_foods)}")
+    return "\n".join(lines)
+
+
+def _change(current: int, previous: int) -> str:
+    if not previous:
+        return ""
+    change = round((current - previous) * 100 / previous)
+    return f" ({change:+d}% vs previous)"
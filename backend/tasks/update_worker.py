@@ -0,0 +1,161 @@
+import asyncio
+import datetime
+import logging
+from collections.abc import Awaitable, Callable
+
+from backend.metrics import metrics
+from backend.services.telegram_sender import TelegramSender
+from backend.services.update_queue import Job, UpdateQueue
+from backend.services.webhook_service import WebhookService
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateWorkerPool:
+    """Pool of async workers draining the durable update queue."""
+
+    def __init__(
+        self,
+        queue: UpdateQueue,
+        webhook_service: WebhookService,
+        telegram: TelegramSender,
+        concurrency: int = 4,
+        batch_size: int = 8,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        retry_backoff: float = 2.0,
+        visibility_timeout: float = 300.0,
+        metrics_interval: float = 5.0,
+    ) -> None:
+        self.queue = queue
+        self.webhook_service = webhook_service
+        self.telegram = telegram
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.visibility_timeout = visibility_timeout
+        self.metrics_interval = metrics_interval
+        self._tasks: list[asyncio.Task] = []
+        # Claimed jobs not completed or failed yet, released on stop
+        self._claimed: set[int] = set()
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"update-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        self._tasks.append(
+            asyncio.create_task(self._report_depth(), name="update-queue-depth")
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Interrupted jobs would otherwise hold back their chats' later
+        # updates until the visibility timeout
+        if self._claimed:
+            try:
+                await self.queue.release(sorted(self._claimed))
+                metrics.incr("queue.released", len(self._claimed))
+            except Exception:
+                logger.exception(
+                    "Failed to release %s claimed jobs", len(self._claimed)
+                )
+            self._claimed.clear()
+
+    async def _work(self) -> None:
+        while True:
+            # Cleared before claiming so an enqueue racing with the claim
+            # still wakes us up instead of waiting a full poll interval
+            self.queue.wakeup.clear()
+            try:
+                jobs = await self.queue.claim(self.batch_size, self.visibility_timeout)
+            except Exception:
+                logger.exception("Failed to claim update jobs")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if not jobs:
+                await self._wait_for_work()
+                continue
+
+            self._claimed.update(job.update.update_id for job in jobs)
+
+            metrics.incr("queue.claimed", len(jobs))
+            try:
+                await asyncio.gather(*(self._process(job) for job in jobs))
+            except Exception:
+                # A worker that dies here isn't restarted, keep it going
+                logger.exception("Failed to process a batch of update jobs")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _wait_for_work(self) -> None:
+        try:
+            await asyncio.wait_for(self.queue.wakeup.wait(), self.poll_interval)
+        except TimeoutError:
+            pass
+
+    async def _process(self, job: Job) -> None:
+        update_id = job.update.update_id
+        metrics.observe("queue.wait", _seconds_since(job.created_at))
+        try:
+            with metrics.timer("queue.process"):
+                await self.webhook_service.process_update(job.update, self.telegram)
+        except Exception as e:
+            logger.exception("Update %s failed on attempt %s", update_id, job.attempts)
+            retry_in = None
+            if job.attempts < self.max_attempts:
+                retry_in = self.retry_backoff * 2 ** (job.attempts - 1)
+                metrics.incr("queue.retried")
+            else:
+                metrics.incr("queue.failed")
+            await self._record(
+                update_id, lambda: self.queue.fail(update_id, repr(e), retry_in)
+            )
+            return
+
+        await self._record(update_id, lambda: self.queue.complete(update_id))
+        metrics.incr("queue.completed")
+        metrics.observe("queue.end_to_end", _seconds_since(job.created_at))
+
+    async def _record(
+        self, update_id: int, record: Callable[[], Awaitable[None]], attempts: int = 3
+    ) -> None:
+        """Record a job's outcome, backing off between attempts.
+
+        A job whose outcome can't be recorded stays claimed until the
+        visibility timeout and then runs again.
+        """
+        try:
+            for attempt in range(attempts):
+                try:
+                    await record()
+                    return
+                except Exception:
+                    logger.exception(
+                        "Failed to record the outcome of update %s", update_id
+                    )
+                    if attempt + 1 < attempts:
+                        await asyncio.sleep(self.retry_backoff * 2**attempt)
+            metrics.incr("queue.unrecorded")
+        finally:
+            self._claimed.discard(update_id)
+
+    async def _report_depth(self) -> None:
+        while True:
+            try:
+                depth = await self.queue.depth()
+                for status in ("pending", "processing", "failed"):
+                    metrics.gauge(f"queue.{status}", depth.get(status, 0))
+            except Exception:
+                logger.exception("Failed to read update queue depth")
+            await asyncio.sleep(self.metrics_interval)
+
+
+def _seconds_since(moment: datetime.datetime) -> float:
+    return (datetime.datetime.now(datetime.UTC) - moment).total_seconds()
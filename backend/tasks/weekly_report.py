@@ -1,9 +1,20 @@
-from backend.clients.telegram.telegram import TelegramClient
+import datetime
+
+from backend.db.pool import Pool
+from backend.services.telegram_sender import TelegramSender
 from backend.settings import settings
+from backend.tasks.reports import send_reports
 
 
-# TODO: Implement daily report logic
-def weekly_report(chat_id: int) -> None:
-    telegram = TelegramClient(settings.bot_token)
-    message = "Weekly report generated."
-    telegram.send_message(chat_id, message=message)
+async def weekly_report(pool: Pool, telegram: TelegramSender) -> None:
+    """Send every chat the report of the last 7 UTC days, today included."""
+    today = datetime.datetime.now(datetime.UTC).date()
+    await send_reports(
+        "weekly",
+        "Your week:",
+        pool,
+        telegram,
+        today - datetime.timedelta(days=6),
+        today,
+        concurrency=settings.report_send_concurrency,
+    )
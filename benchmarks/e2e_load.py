@@ -0,0 +1,312 @@
+"""End-to-end load on the webhook, with local Telegram and model stand-ins.
+
+Replays synthetic updates of every message type at a fixed rate against
+the real app (`/telegram/webhook` -> update queue -> workers ->
+`WebhookService.process_update` -> database), with Telegram replaced by
+`benchmarks.fake_telegram` on a local port and the models by
+`benchmarks.fake_model`. Reports webhook latency, end-to-end latency (until
+the reply reaches Telegram) per message type, throughput, the database
+pool's acquire wait and the process' memory growth. Needs a migrated
+database and the usual env, no network. Synthetic chats use large
+negative ids and are deleted afterwards:
+
+    uv run python -m benchmarks.e2e_load --rate 20 --duration 30 --chats 50
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import resource
+import tempfile
+import time
+from collections import defaultdict, deque
+from typing import Any
+
+import httpx
+import uvicorn
+
+from backend.agent import agent, summarizer
+from backend.db.pool import create_pool
+from backend.main import app
+from backend.metrics import metrics, summarize
+from backend.settings import settings
+from benchmarks.fake_model import fake_model, fake_summarizer
+from benchmarks.fake_telegram import FakeTelegram
+
+# Synthetic chats are -(2 * 10**15) - n, away from real chats and from
+# the ones of benchmarks.multi_tenant_load
+FIRST_CHAT_ID = -(2 * 10**15)
+
+STATUS_TEXT = "Processing your request, please wait a moment..."
+
+TABLES = (
+    "meals",
+    "workouts",
+    "daily_totals",
+    "memory_messages",
+    "memory_heads",
+    "memory_summaries",
+    "chat_settings",
+    "update_jobs",
+)
+
+
+def make_update(update_id: int, chat_id: int, kind: str, files: int) -> dict[str, Any]:
+    """A Telegram update of `kind`, files are picked among `files` per kind."""
+    message: dict[str, Any] = {
+        "message_id": update_id,
+        "chat": {"id": chat_id, "first_name": "Load", "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+        "date": int(time.time()),
+    }
+    update: dict[str, Any] = {"update_id": update_id, "message": message}
+    file = random.randrange(files)
+    match kind:
+        case "text":
+            message["text"] = "I had oatmeal with a banana for breakfast"
+        case "small_talk":
+            message["text"] = "thanks!"
+        case "image":
+            message["photo"] = [
+                {
+                    "file_id": f"photo-{file}-{side}",
+                    "file_unique_id": f"photo-{file}-{side}",
+                    "width": side,
+                    "height": side * 3 // 4,
+                }
+                for side in (90, 320, 800, 1280)
+            ]
+            update["caption"] = "breakfast"
+        case "voice":
+            message["voice"] = {
+                "duration": 5,
+                "mime_type": "audio/ogg",
+                "file_id": f"voice-{file}",
+                "file_unique_id": f"voice-{file}",
+            }
+        case "document":
+            message["document"] = {
+                "file_name": "menu.pdf",
+                "mime_type": "application/pdf",
+                "file_id": f"doc-{file}",
+                "file_unique_id": f"doc-{file}",
+            }
+    return update
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for entry in mix.split(","):
+        kind, weight = entry.split("=")
+        weights[kind] = float(weight)
+    return weights
+
+
+def rss_mb() -> float:
+    """Current resident memory, or the peak where that is not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Run:
+    """Matches replies to updates, in order per chat, and keeps the timings."""
+
+    def __init__(self) -> None:
+        self.waiting: dict[int, deque[tuple[str, float]]] = defaultdict(deque)
+        self.webhook: list[float] = []
+        self.end_to_end: dict[str, list[float]] = defaultdict(list)
+        self.answered = 0
+        self.errors = 0
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    def on_message(self, chat_id: int, text: str) -> None:
+        waiting = self.waiting.get(chat_id)
+        if text == STATUS_TEXT or not waiting:
+            return
+        kind, sent_at = waiting.popleft()
+        self.end_to_end[kind].append(time.perf_counter() - sent_at)
+        self.answered += 1
+        if self.answered >= self.expected:
+            self.done.set()
+
+
+async def post_update(
+    client: httpx.AsyncClient, run: Run, update: dict[str, Any], kind: str
+) -> None:
+    chat_id = update["message"]["chat"]["id"]
+    started = time.perf_counter()
+    run.waiting[chat_id].append((kind, started))
+    try:
+        response = await client.post("/telegram/webhook", json=update)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        run.errors += 1
+        run.waiting[chat_id].remove((kind, started))
+        return
+    run.webhook.append(time.perf_counter() - started)
+
+
+async def generate(
+    client: httpx.AsyncClient,
+    run: Run,
+    rate: float,
+    duration: float,
+    chats: int,
+    mix: dict[str, float],
+    files: int,
+) -> None:
+    """Send `rate` updates per second for `duration` seconds, open loop."""
+    total = int(rate * duration)
+    run.expected = total
+    kinds = random.choices(list(mix), weights=list(mix.values()), k=total)
+    # Unique across runs, update ids are the queue's primary key
+    first_id = int(time.time() * 1000) * 1000
+    started = time.perf_counter()
+    tasks = []
+    for i, kind in enumerate(kinds):
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = make_update(
+            first_id + i, FIRST_CHAT_ID - random.randrange(chats), kind, files
+        )
+        tasks.append(asyncio.create_task(post_update(client, run, update, kind)))
+    await asyncio.gather(*tasks)
+
+
+async def cleanup() -> None:
+    pool = await create_pool(settings.database_url)
+    try:
+        async with pool.acquire() as conn:
+            for table in TABLES:
+                await conn.execute(
+                    f"DELETE FROM {table} WHERE chat_id <= $1", FIRST_CHAT_ID
+                )
+    finally:
+        await pool.close()
+
+
+def row(name: str, values: list[float]) -> str:
+    stats = summarize(deque(values))
+    if not stats["count"]:
+        return f"{name:<22}{0:>7}"
+    return (
+        f"{name:<22}{stats['count']:>7}{stats['p50'] * 1000:>10.1f}"
+        f"{stats['p99'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10.0, help="updates per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument(
+        "--mix",
+        default="text=5,small_talk=2,image=2,voice=1,document=1",
+        help="relative weights of the update kinds",
+    )
+    parser.add_argument("--files", type=int, default=20, help="distinct files per kind")
+    parser.add_argument("--model-latency", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--telegram-latency", type=float, default=0.02)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-port", type=int, default=8081)
+    parser.add_argument("--reply-mode", choices=["send", "stream"], default="send")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    run = Run()
+    fake = FakeTelegram(
+        args.telegram_latency, args.flood_rate, on_message=run.on_message
+    )
+    server = uvicorn.Server(
+        uvicorn.Config(
+            fake.app,
+            host="127.0.0.1",
+            port=args.telegram_port,
+            log_level="warning",
+            lifespan="off",
+        )
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    # Everything the app builds at startup reads these
+    settings.telegram_api_url = f"http://127.0.0.1:{args.telegram_port}"
+    settings.voice_mode = "audio"
+    settings.voice_encoder = "silence"
+    settings.reply_mode = args.reply_mode
+    media_dir = tempfile.TemporaryDirectory()
+    settings.media_cache_dir = media_dir.name
+
+    rss_before = rss_mb()
+    try:
+        with (
+            agent.override(model=fake_model(args.model_latency, args.token_delay)),
+            summarizer.override(model=fake_summarizer()),
+        ):
+            async with (
+                app.router.lifespan_context(app),
+                httpx.AsyncClient(
+                    transport=httpx.ASGITransport(app=app), base_url="http://kai"
+                ) as client,
+            ):
+                rss_started = rss_mb()
+                started = time.perf_counter()
+                await generate(
+                    client,
+                    run,
+                    args.rate,
+                    args.duration,
+                    args.chats,
+                    parse_mix(args.mix),
+                    args.files,
+                )
+                try:
+                    await asyncio.wait_for(run.done.wait(), args.drain_timeout)
+                except TimeoutError:
+                    pass
+                elapsed = time.perf_counter() - started
+                rss_after = rss_mb()
+                snapshot = metrics.snapshot()
+    finally:
+        server.should_exit = True
+        await serving
+        media_dir.cleanup()
+        await cleanup()
+
+    print(f"{'':<22}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    print(row("webhook", run.webhook))
+    print(row("end to end", list(itertools.chain(*run.end_to_end.values()))))
+    for kind, values in sorted(run.end_to_end.items()):
+        print(row(f"  {kind}", values))
+    for name in ("db.acquire_wait", "queue.wait", "telegram.send_latency"):
+        timing = snapshot["timings"].get(name, {"count": 0})
+        if timing["count"]:
+            print(
+                f"{name:<22}{timing['count']:>7}{timing['p50'] * 1000:>10.1f}"
+                f"{timing['p99'] * 1000:>10.1f}{timing['max'] * 1000:>10.1f}"
+            )
+
+    print(
+        f"\nsent {run.expected - run.errors} updates ({run.errors} webhook errors), "
+        f"answered {run.answered} in {elapsed:.1f}s, "
+        f"{run.answered / elapsed:.1f} updates/s"
+    )
+    print(
+        f"memory: {rss_before:.0f} MB before startup, {rss_started:.0f} MB started, "
+        f"{rss_after:.0f} MB after (+{rss_after - rss_started:.0f} MB under load)"
+    )
+    print(f"telegram calls: {dict(fake.calls)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""Deterministic stand-ins for the agent's and the summarizer's models.
+
+`fake_model` logs every meal-like prompt with one `save_meal` call, then
+answers "Logged.", and answers small talk directly, so a run exercises the
+same tools and writes as a real one. Every model request waits `latency`
+seconds, streamed replies also wait `token_delay` between words.
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import (
+    AgentInfo,
+    DeltaToolCall,
+    DeltaToolCalls,
+    FunctionModel,
+)
+
+from backend.services.model_router import SMALL_TALK
+
+MEAL = {
+    "name": "Oatmeal with banana",
+    "description": "60 g oats, 1 medium banana",
+    "ingredients": [
+        {"name": "oats", "quantity": 60},
+        {"name": "banana", "quantity": 120},
+    ],
+    "calories": 350,
+    "protein": 10,
+    "carbs": 60,
+    "fat": 6,
+}
+
+
+def reply_to(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    request = messages[-1]
+    assert isinstance(request, ModelRequest)
+    if any(isinstance(part, ToolReturnPart) for part in request.parts):
+        return ModelResponse(parts=[TextPart("Logged. Want to add another? 🙂")])
+
+    prompt = " ".join(
+        content
+        for part in request.parts
+        if isinstance(part, UserPromptPart)
+        for content in (
+            [part.content] if isinstance(part.content, str) else part.content
+        )
+        if isinstance(content, str)
+    )
+    tools = {tool.name for tool in info.function_tools}
+    if SMALL_TALK.match(prompt.strip()) or "save_meal" not in tools:
+        return ModelResponse(parts=[TextPart("You're welcome! Anything else?")])
+    # A tool taking a single model gets its fields as arguments
+    return ModelResponse(parts=[ToolCallPart("save_meal", MEAL)])
+
+
+def fake_model(latency: float = 0.5, token_delay: float = 0.02) -> FunctionModel:
+    async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(latency)
+        return reply_to(messages, info)
+
+    async def stream(
+        messages: list[ModelMessage], info: AgentInfo
+    ) -> AsyncIterator[str | DeltaToolCalls]:
+        await asyncio.sleep(latency)
+        for part in reply_to(messages, info).parts:
+            if isinstance(part, ToolCallPart):
+                yield {
+                    0: DeltaToolCall(
+                        name=part.tool_name, json_args=json.dumps(part.args)
+                    )
+                }
+            elif isinstance(part, TextPart):
+                for i, word in enumerate(part.content.split(" ")):
+                    yield word if i == 0 else f" {word}"
+                    await asyncio.sleep(token_delay)
+
+    return FunctionModel(respond, stream_function=stream)
+
+
+async def summarize(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return ModelResponse(parts=[TextPart("Logged a few meals today.")])
+
+
+def fake_summarizer() -> FunctionModel:
+    return FunctionModel(summarize)
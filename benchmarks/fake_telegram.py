@@ -0,0 +1,142 @@
+"""Local stand-in for the Telegram Bot API, for load runs and manual testing.
+
+Answers `sendMessage`, `editMessageText` and `getFile`, and serves files
+whose content depends on their id prefix: `photo` is a JPEG, `voice` an
+OGG-looking blob and anything else a small PDF. Every call waits `latency`
+seconds, and a `flood_rate` fraction of sends is refused with a 429, like
+Telegram's flood control. Point the app at it with TELEGRAM_API_URL:
+
+    uv run python -m benchmarks.fake_telegram --port 8081 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import random
+import time
+from collections import defaultdict
+from collections.abc import Callable
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+# Called with the chat id and the text of every message sent, edits aside
+OnMessage = Callable[[int, str], None]
+
+
+def make_jpeg(side: int = 1280) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (side, side * 3 // 4), (200, 120, 60)).save(output, "JPEG")
+    return output.getvalue()
+
+
+FILES = {
+    "photo": make_jpeg(),
+    "voice": b"OggS" + b"\0" * 16 * 1024,
+    "doc": b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n" + b"0" * 8 * 1024,
+}
+
+
+class FakeTelegram:
+    """Counts the calls per method, `on_message` sees every message sent.
+
+    Nothing else is kept, so a long run doesn't grow the process' memory.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        flood_rate: float = 0.0,
+        retry_after: int = 1,
+        on_message: OnMessage | None = None,
+    ) -> None:
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.on_message = on_message
+        self.calls: dict[str, int] = defaultdict(int)
+        self._message_ids = itertools.count(1)
+        self.app = self._create_app()
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/bot{token}/{method}")
+        async def call(method: str, request: Request) -> Response:
+            self.calls[method] += 1
+            await asyncio.sleep(self.latency)
+            body = await request.json()
+            match method:
+                case "sendMessage":
+                    if random.random() < self.flood_rate:
+                        self.calls["429"] += 1
+                        return JSONResponse(
+                            {
+                                "ok": False,
+                                "error_code": 429,
+                                "description": f"Too Many Requests: retry after {self.retry_after}",
+                                "parameters": {"retry_after": self.retry_after},
+                            },
+                            status_code=429,
+                        )
+                    return self._sent(body["chat_id"], body["text"])
+                case "editMessageText":
+                    return self._sent(body["chat_id"], body["text"], body["message_id"])
+                case "getFile":
+                    file_id = body["file_id"]
+                    return JSONResponse(
+                        {
+                            "ok": True,
+                            "result": {
+                                "file_id": file_id,
+                                "file_path": f"files/{file_id}",
+                            },
+                        }
+                    )
+            return JSONResponse(
+                {"ok": False, "error_code": 404, "description": "Not Found"},
+                status_code=404,
+            )
+
+        @app.get("/file/bot{token}/files/{file_id}")
+        async def download(file_id: str) -> Response:
+            self.calls["download"] += 1
+            await asyncio.sleep(self.latency)
+            kind = next((kind for kind in FILES if file_id.startswith(kind)), "doc")
+            return Response(FILES[kind], media_type="application/octet-stream")
+
+        return app
+
+    def _sent(self, chat_id: int, text: str, message_id: int | None = None) -> Response:
+        if self.on_message and message_id is None:
+            self.on_message(chat_id, text)
+        return JSONResponse(
+            {
+                "ok": True,
+                "result": {
+                    "message_id": message_id or next(self._message_ids),
+                    "chat": {"id": chat_id},
+                    "date": int(time.time()),
+                    "text": text,
+                },
+            }
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeTelegram(args.latency, args.flood_rate)
+    uvicorn.run(fake.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Encode/decode cost of the jsonb codecs registered on the asyncpg pool.
+
+Payloads are a day of conversation memory, one value per message as stored
+in `memory_messages`, and the ingredients of a meal. "json text" is the
+previous codec (`json.dumps` / `json.loads`, text format), "double" is how
+memory used to be written, a JSON string holding the JSON-encoded messages,
+"orjson binary" is the current one (`encode_jsonb` / `decode_jsonb`). No
+database is needed:
+
+    uv run python -m benchmarks.json_codecs --turns 10 100 --repeat 5
+"""
+
+import argparse
+import json
+import time
+from typing import Any
+from collections.abc import Callable
+
+from pydantic_core import to_jsonable_python
+
+from backend.db.pool import decode_jsonb, encode_jsonb
+from benchmarks.memory_storage import make_turn
+
+Codec = tuple[Callable[[Any], Any], Callable[[Any], Any]]
+
+CODECS: dict[str, Codec] = {
+    "json text": (json.dumps, json.loads),
+    "double": (
+        lambda value: json.dumps(json.dumps(value)),
+        lambda data: json.loads(json.loads(data)),
+    ),
+    "orjson binary": (encode_jsonb, decode_jsonb),
+}
+
+
+def best_of(repeat: int, run: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads: list[tuple[str, list[Any]]] = []
+    for turns in args.turns:
+        messages = [message for i in range(turns) for message in make_turn(i)]
+        payloads.append((f"memory {turns} turns", to_jsonable_python(messages)))
+    meal_turn = to_jsonable_python(make_turn(0))
+    ingredients = meal_turn[1]["parts"][0]["args"]["meal"]["ingredients"]
+    payloads.append(("ingredients x1000", [ingredients] * 1000))
+
+    print(
+        f"{'payload':<22}{'codec':<15}{'encode ms':>11}{'decode ms':>11}{'bytes':>11}"
+    )
+    for name, values in payloads:
+        for codec, (encode, decode) in CODECS.items():
+            encoded = [encode(value) for value in values]
+            encode_time = best_of(args.repeat, lambda: [encode(v) for v in values])
+            decode_time = best_of(args.repeat, lambda: [decode(e) for e in encoded])
+            size = sum(len(e) for e in encoded)
+            print(
+                f"{name:<22}{codec:<15}{encode_time * 1000:>11.2f}"
+                f"{decode_time * 1000:>11.2f}{size:>11,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Cost of saving and loading conversation memory as the day grows.
+
+For each day length (turns per day) a synthetic conversation is saved one
+turn at a time, then loaded back. "blob" rewrites the whole day's JSONB
+array on every turn (the old `memory` table), "log" appends only the new
+messages to `memory_messages` through `MemoryService`.
+
+Bytes written are computed locally. Timings need a migrated database, the
+benchmark writes to a synthetic chat and removes its rows afterwards:
+
+    uv run python -m benchmarks.memory_storage --turns 10 50 100 200
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import time
+
+import asyncpg
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_core import to_jsonable_python
+
+from backend.db.pool import create_pool
+from backend.services.memory_service import MemoryService, MessageCache
+from backend.settings import settings
+
+# Synthetic chat, far away from real Telegram chat ids
+BENCHMARK_CHAT_ID = -(10**15)
+
+
+def make_turn(i: int) -> list[ModelMessage]:
+    meal = {
+        "name": f"Meal {i}",
+        "description": "Chicken breast with rice and a side salad",
+        "ingredients": [
+            {"name": "chicken breast", "quantity": 150},
+            {"name": "rice", "quantity": 200},
+            {"name": "salad", "quantity": 80},
+        ],
+        "calories": 650,
+        "protein": 50,
+        "carbs": 70,
+        "fat": 15,
+    }
+    return [
+        ModelRequest(parts=[UserPromptPart(content=f"I ate chicken and rice #{i}")]),
+        ModelResponse(parts=[ToolCallPart(tool_name="save_meal", args={"meal": meal})]),
+        ModelRequest(
+            parts=[
+                ToolReturnPart(
+                    tool_name="save_meal",
+                    content=None,
+                    tool_call_id=f"call_{i}",
+                )
+            ]
+        ),
+        ModelResponse(parts=[TextPart(content="Logged. ≈ 650 kcal • 50P • 70C • 15F")]),
+    ]
+
+
+def bytes_written(turns: int) -> tuple[int, int]:
+    history: list[ModelMessage] = []
+    blob = log = 0
+    for i in range(turns):
+        turn = make_turn(i)
+        history.extend(turn)
+        blob += len(json.dumps(to_jsonable_python(history)))
+        log += len(json.dumps(to_jsonable_python(turn)))
+    return blob, log
+
+
+async def time_blob(conn: asyncpg.Connection, date: datetime.date, turns: int):
+    await conn.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS memory_blob (
+            date DATE PRIMARY KEY,
+            messages JSONB NOT NULL
+        );
+        """
+    )
+    history: list[ModelMessage] = []
+    started = time.perf_counter()
+    for i in range(turns):
+        history.extend(make_turn(i))
+        await conn.execute(
+            """
+            INSERT INTO memory_blob (date, messages) VALUES ($1, $2)
+            ON CONFLICT (date) DO UPDATE SET messages = EXCLUDED.messages;
+            """,
+            date,
+            to_jsonable_python(history),
+        )
+    save = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await conn.fetchval("SELECT messages FROM memory_blob WHERE date = $1", date)
+    get = time.perf_counter() - started
+    return save, get
+
+
+async def time_log(service: MemoryService, date: datetime.date, turns: int):
+    started = time.perf_counter()
+    for i in range(turns):
+        await service.save(make_turn(i), date=date)
+    save = time.perf_counter() - started
+
+    # Cold read, without the write-through cache of the saving service
+    started = time.perf_counter()
+    await MemoryService(service.pool, service.chat_id, MessageCache()).get(date=date)
+    get = time.perf_counter() - started
+    return save, get
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--no-db", action="store_true", help="only bytes written")
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'blob bytes':>12} {'log bytes':>12}")
+    for turns in args.turns:
+        blob, log = bytes_written(turns)
+        print(f"{turns:>6} {blob:>12,} {log:>12,}")
+
+    if args.no_db:
+        return
+
+    pool = await create_pool(settings.database_url)
+    service = MemoryService(pool, BENCHMARK_CHAT_ID)
+    print(
+        f"\n{'turns':>6} {'blob save':>10} {'log save':>10} {'blob get':>10} {'log get':>10}"
+    )
+    try:
+        async with pool.acquire() as conn:
+            for n, turns in enumerate(args.turns):
+                date = datetime.date(1970, 1, 1) + datetime.timedelta(days=n)
+                blob_save, blob_get = await time_blob(conn, date, turns)
+                log_save, log_get = await time_log(service, date, turns)
+                print(
+                    f"{turns:>6} {blob_save:>9.3f}s {log_save:>9.3f}s "
+                    f"{blob_get * 1000:>8.1f}ms {log_get * 1000:>8.1f}ms"
+                )
+                for table in ("memory_messages", "memory_heads"):
+                    await conn.execute(
+                        f"DELETE FROM {table} WHERE chat_id = $1 AND date = $2",
+                        BENCHMARK_CHAT_ID,
+                        date,
+                    )
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
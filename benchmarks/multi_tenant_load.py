@@ -0,0 +1,135 @@
+"""Per-user query latency as the number of users grows.
+
+Seeds meals and workouts for many synthetic chats through the chat-scoped
+services, then times `list_meals` / `list_workouts` for random users over
+a one-day range. With the (chat_id, created_at) indexes the latency should
+stay flat as users are added. Needs a migrated database, synthetic chats
+use large negative ids and are deleted afterwards:
+
+    uv run python -m benchmarks.multi_tenant_load --users 100 1000 5000
+"""
+
+import argparse
+import asyncio
+import datetime
+import random
+import time
+
+from backend.db.pool import Pool, create_pool
+from backend.metrics import summarize
+from backend.models import Ingredient, Meal, Workout
+from backend.services.meal_service import MealService
+from backend.services.workout_service import WorkoutService
+from backend.settings import settings
+
+# Synthetic chats are -(10**15) - n, far away from real Telegram chat ids
+FIRST_CHAT_ID = -(10**15)
+
+
+def chat_id(n: int) -> int:
+    return FIRST_CHAT_ID - n
+
+
+async def seed_user(pool: Pool, n: int, days: int, per_day: int) -> None:
+    meal_service = MealService(pool, chat_id(n))
+    workout_service = WorkoutService(pool, chat_id(n))
+    now = datetime.datetime.now(datetime.UTC)
+    for day in range(days):
+        for i in range(per_day):
+            created_at = now - datetime.timedelta(days=day, hours=i)
+            await meal_service.save(
+                Meal(
+                    created_at=created_at,
+                    name="Oatmeal with banana",
+                    ingredients=[
+                        Ingredient(name="oats", quantity=60),
+                        Ingredient(name="banana", quantity=120),
+                    ],
+                    calories=350,
+                    protein=10,
+                    carbs=60,
+                    fat=6,
+                )
+            )
+        await workout_service.save(
+            Workout(
+                created_at=now - datetime.timedelta(days=day),
+                name="running",
+                type="cardio",
+                duration=30,
+                calories_burned=300,
+            )
+        )
+
+
+async def seed(pool: Pool, start: int, end: int, days: int, per_day: int):
+    semaphore = asyncio.Semaphore(20)
+
+    async def bounded(n: int) -> None:
+        async with semaphore:
+            await seed_user(pool, n, days, per_day)
+
+    await asyncio.gather(*(bounded(n) for n in range(start, end)))
+
+
+async def measure(pool: Pool, users: int, queries: int) -> dict:
+    end = datetime.datetime.now(datetime.UTC)
+    start = end - datetime.timedelta(days=1)
+    samples = []
+    for _ in range(queries):
+        n = random.randrange(users)
+        started = time.perf_counter()
+        await MealService(pool, chat_id(n)).list_meals(start, end)
+        await WorkoutService(pool, chat_id(n)).list_workouts(start, end)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def cleanup(pool: Pool) -> None:
+    async with pool.acquire() as conn:
+        for table in ("meals", "workouts"):
+            await conn.execute(
+                f"DELETE FROM {table} WHERE chat_id <= $1", FIRST_CHAT_ID
+            )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--meals-per-day", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    pool = await create_pool(settings.database_url)
+    try:
+        seeded = 0
+        print(f"{'users':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for users in sorted(args.users):
+            await seed(pool, seeded, users, args.days, args.meals_per_day)
+            seeded = users
+            async with pool.acquire() as conn:
+                await conn.execute("ANALYZE meals; ANALYZE workouts;")
+            stats = await measure(pool, users, args.queries)
+            print(
+                f"{users:>7} {stats['p50'] * 1000:>8.2f} "
+                f"{stats['p95'] * 1000:>8.2f} {stats['p99'] * 1000:>8.2f}"
+            )
+
+        async with pool.acquire() as conn:
+            plan = await conn.fetch(
+                """
+                EXPLAIN SELECT * FROM meals
+                WHERE chat_id = $1 AND created_at BETWEEN NOW() - INTERVAL '1 day' AND NOW()
+                ORDER BY created_at DESC;
+                """,
+                chat_id(0),
+            )
+        print("\n" + "\n".join(row[0] for row in plan))
+    finally:
+        await cleanup(pool)
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
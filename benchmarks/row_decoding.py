@@ -0,0 +1,106 @@
+"""Rows per second turning database rows into meals and workouts.
+
+"per row" is the previous decoding, building and validating one model (and
+one `Ingredient` per ingredient) at a time, "batched" is `meals_from_rows` /
+`workouts_from_rows`, a single `TypeAdapter` call over the whole result.
+Rows are synthetic mappings shaped like the asyncpg records of
+`LIST_MEALS_QUERY` / `LIST_WORKOUTS_QUERY`, so no database is needed:
+
+    uv run python -m benchmarks.row_decoding --rows 1000 10000 100000
+"""
+
+import argparse
+import datetime
+import time
+import uuid
+from typing import Any
+from collections.abc import Callable
+
+from backend.models import Ingredient, Meal, Workout
+from backend.services.meal_service import meals_from_rows
+from backend.services.workout_service import workouts_from_rows
+
+
+def make_meal_row(i: int) -> dict[str, Any]:
+    return {
+        "id": uuid.uuid4(),
+        "created_at": datetime.datetime.now(datetime.UTC)
+        - datetime.timedelta(minutes=i),
+        "name": f"Meal {i}",
+        "description": "Chicken breast with rice and a side salad",
+        "ingredients": [
+            {"name": "chicken breast", "quantity": 150},
+            {"name": "rice", "quantity": 200},
+            {"name": "salad", "quantity": 80},
+        ],
+        "calories": 650,
+        "protein": 50,
+        "carbs": 70,
+        "fat": 15,
+    }
+
+
+def make_workout_row(i: int) -> dict[str, Any]:
+    return {
+        "id": uuid.uuid4(),
+        "created_at": datetime.datetime.now(datetime.UTC)
+        - datetime.timedelta(minutes=i),
+        "name": "running",
+        "type": "cardio",
+        "duration": 30,
+        "calories_burned": 300,
+    }
+
+
+def meals_per_row(rows: list[dict[str, Any]]) -> list[Meal]:
+    meals = []
+    for row in rows:
+        row_dict = dict(row)
+        row_dict["ingredients"] = [
+            Ingredient(**ingredient) for ingredient in row_dict["ingredients"]
+        ]
+        meals.append(Meal(**row_dict))
+    return meals
+
+
+def workouts_per_row(rows: list[dict[str, Any]]) -> list[Workout]:
+    return [Workout(**row) for row in rows]
+
+
+def rows_per_second(
+    decode: Callable[[list[dict[str, Any]]], list[Any]],
+    rows: list[dict[str, Any]],
+    repeat: int,
+) -> float:
+    # Best of `repeat`, the least disturbed by the rest of the machine
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decode(rows)
+        best = min(best, time.perf_counter() - started)
+    return len(rows) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ("meals", make_meal_row, meals_per_row, meals_from_rows),
+        ("workouts", make_workout_row, workouts_per_row, workouts_from_rows),
+    ]
+    print(f"{'model':<10}{'rows':>8}{'per row/s':>15}{'batched/s':>15}{'speedup':>9}")
+    for name, make_row, per_row, batched in cases:
+        for count in args.rows:
+            rows = [make_row(i) for i in range(count)]
+            before = rows_per_second(per_row, rows, args.repeat)
+            after = rows_per_second(batched, rows, args.repeat)
+            print(
+                f"{name:<10}{count:>8}{before:>15,.0f}{after:>15,.0f}{after / before:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
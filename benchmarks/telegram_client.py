@@ -0,0 +1,105 @@
+"""Concurrent-update throughput of the Telegram client, blocking vs async.
+
+Simulates N updates arriving at once, each doing what `WebhookService` does
+against Telegram (one `get_file` + one `send_message`), with a fixed network
+latency injected by a mock transport. "before" drives a synchronous
+`httpx.Client` from inside coroutines (the old behaviour), "after" uses the
+async `TelegramClient`. Event-loop lag is sampled throughout to show how
+long something like `/health` would have been stuck.
+
+Usage:
+    uv run python -m benchmarks.telegram_client --updates 50 --latency 0.1
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from backend.clients.telegram.telegram import TelegramClient
+
+FILE_BYTES = b"\0" * 32 * 1024
+
+
+def _response(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/getFile"):
+        return httpx.Response(200, json={"ok": True, "result": {"file_path": "f"}})
+    if "/file/" in request.url.path:
+        return httpx.Response(200, content=FILE_BYTES)
+    return httpx.Response(200, json={"ok": True, "result": {}})
+
+
+async def _probe_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_blocking(updates: int, latency: float) -> tuple[float, float]:
+    def handler(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return _response(request)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    base = "https://api.telegram.org/botTOKEN"
+
+    async def process_update(i: int) -> None:
+        client.post(f"{base}/getFile", json={"file_id": str(i)})
+        client.get("https://api.telegram.org/file/botTOKEN/f")
+        client.post(f"{base}/sendMessage", json={"chat_id": i, "text": "ok"})
+
+    return await _measure(updates, process_update, client.close)
+
+
+async def run_async(updates: int, latency: float) -> tuple[float, float]:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return _response(request)
+
+    telegram = TelegramClient("TOKEN", transport=httpx.MockTransport(handler))
+
+    async def process_update(i: int) -> None:
+        await telegram.get_file(str(i))
+        await telegram.send_message(chat_id=i, message="ok")
+
+    async def close() -> None:
+        await telegram.aclose()
+
+    return await _measure(updates, process_update, close)
+
+
+async def _measure(updates, process_update, close) -> tuple[float, float]:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_loop_lag(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(process_update(i) for i in range(updates)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await probe
+    result = close()
+    if asyncio.iscoroutine(result):
+        await result
+    return updates / elapsed, worst_lag
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{args.updates} concurrent updates, {args.latency * 1000:.0f} ms per call")
+    for name, runner in (("before (sync)", run_blocking), ("after (async)", run_async)):
+        throughput, lag = await runner(args.updates, args.latency)
+        print(
+            f"{name:>14}: {throughput:8.1f} updates/s, max loop lag {lag * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,19 @@
+-- migrate:up
+CREATE TABLE update_jobs (
+    update_id BIGINT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+-- Partial indexes so claiming only looks at runnable or stale jobs
+CREATE INDEX idx_update_jobs_pending ON update_jobs(available_at)
+WHERE status = 'pending';
+CREATE INDEX idx_update_jobs_processing ON update_jobs(locked_at)
+WHERE status = 'processing';
+-- migrate:down
+DROP TABLE update_jobs;
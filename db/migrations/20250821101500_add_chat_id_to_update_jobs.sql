@@ -0,0 +1,11 @@
+-- migrate:up
+ALTER TABLE update_jobs ADD COLUMN chat_id BIGINT;
+UPDATE update_jobs
+SET chat_id = (payload->'message'->'chat'->>'id')::BIGINT;
+ALTER TABLE update_jobs ALTER COLUMN chat_id SET NOT NULL;
+-- Used to find the oldest unfinished job of each chat when claiming
+CREATE INDEX idx_update_jobs_chat_unfinished ON update_jobs(chat_id, update_id)
+WHERE status IN ('pending', 'processing');
+-- migrate:down
+DROP INDEX idx_update_jobs_chat_unfinished;
+ALTER TABLE update_jobs DROP COLUMN chat_id;
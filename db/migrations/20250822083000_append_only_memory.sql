@@ -0,0 +1,35 @@
+-- migrate:up
+CREATE TABLE memory_messages (
+    date DATE NOT NULL,
+    seq INTEGER NOT NULL,
+    message JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (date, seq)
+);
+-- Split the per-day blobs into one row per message. Older rows hold the
+-- array itself, or a JSON string containing it.
+INSERT INTO memory_messages (date, seq, message, created_at)
+SELECT memory.date, message.ordinality - 1, message.value, memory.updated_at
+FROM memory
+CROSS JOIN LATERAL jsonb_array_elements(
+    CASE jsonb_typeof(memory.messages)
+        WHEN 'string' THEN (memory.messages #>> '{}')::jsonb
+        ELSE memory.messages
+    END
+) WITH ORDINALITY AS message(value, ordinality);
+DROP TABLE memory;
+-- migrate:down
+CREATE TABLE memory (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    date DATE NOT NULL DEFAULT CURRENT_DATE,
+    messages JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE(date)
+);
+CREATE INDEX idx_memory_date ON memory(date);
+INSERT INTO memory (date, messages, created_at, updated_at)
+SELECT date, jsonb_agg(message ORDER BY seq), MIN(created_at), MAX(created_at)
+FROM memory_messages
+GROUP BY date;
+DROP TABLE memory_messages;
@@ -0,0 +1,11 @@
+-- migrate:up
+CREATE TABLE memory_summaries (
+    date DATE PRIMARY KEY,
+    summary TEXT NOT NULL,
+    -- Highest memory_messages.seq of the day folded into the summary
+    through_seq INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+-- migrate:down
+DROP TABLE memory_summaries;
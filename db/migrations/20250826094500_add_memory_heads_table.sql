@@ -0,0 +1,14 @@
+-- migrate:up
+-- Number of messages stored per day, bumped on every append. Appends lock the
+-- day's row to allocate sequence numbers, and readers compare it with their
+-- cached copy to know whether anything changed.
+CREATE TABLE memory_heads (
+    date DATE PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT INTO memory_heads (date, version)
+SELECT date, MAX(seq) + 1
+FROM memory_messages
+GROUP BY date;
+-- migrate:down
+DROP TABLE memory_heads;
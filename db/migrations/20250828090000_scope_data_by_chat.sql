@@ -0,0 +1,44 @@
+-- migrate:up
+-- Rows written before data was scoped by chat end up in chat 0. To keep them,
+-- move them to your chat before anyone else starts using the bot, e.g.
+-- UPDATE meals SET chat_id = <CHAT_ID> WHERE chat_id = 0;
+ALTER TABLE meals ADD COLUMN chat_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE meals ALTER COLUMN chat_id DROP DEFAULT;
+CREATE INDEX idx_meals_chat_id_created_at ON meals(chat_id, created_at);
+
+ALTER TABLE workouts ADD COLUMN chat_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE workouts ALTER COLUMN chat_id DROP DEFAULT;
+CREATE INDEX idx_workouts_chat_id_created_at ON workouts(chat_id, created_at);
+
+ALTER TABLE memory_messages ADD COLUMN chat_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE memory_messages ALTER COLUMN chat_id DROP DEFAULT;
+ALTER TABLE memory_messages DROP CONSTRAINT memory_messages_pkey;
+ALTER TABLE memory_messages ADD PRIMARY KEY (chat_id, date, seq);
+
+ALTER TABLE memory_heads ADD COLUMN chat_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE memory_heads ALTER COLUMN chat_id DROP DEFAULT;
+ALTER TABLE memory_heads DROP CONSTRAINT memory_heads_pkey;
+ALTER TABLE memory_heads ADD PRIMARY KEY (chat_id, date);
+
+ALTER TABLE memory_summaries ADD COLUMN chat_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE memory_summaries ALTER COLUMN chat_id DROP DEFAULT;
+ALTER TABLE memory_summaries DROP CONSTRAINT memory_summaries_pkey;
+ALTER TABLE memory_summaries ADD PRIMARY KEY (chat_id, date);
+-- migrate:down
+ALTER TABLE memory_summaries DROP CONSTRAINT memory_summaries_pkey;
+ALTER TABLE memory_summaries DROP COLUMN chat_id;
+ALTER TABLE memory_summaries ADD PRIMARY KEY (date);
+
+ALTER TABLE memory_heads DROP CONSTRAINT memory_heads_pkey;
+ALTER TABLE memory_heads DROP COLUMN chat_id;
+ALTER TABLE memory_heads ADD PRIMARY KEY (date);
+
+ALTER TABLE memory_messages DROP CONSTRAINT memory_messages_pkey;
+ALTER TABLE memory_messages DROP COLUMN chat_id;
+ALTER TABLE memory_messages ADD PRIMARY KEY (date, seq);
+
+DROP INDEX idx_workouts_chat_id_created_at;
+ALTER TABLE workouts DROP COLUMN chat_id;
+
+DROP INDEX idx_meals_chat_id_created_at;
+ALTER TABLE meals DROP COLUMN chat_id;
@@ -0,0 +1,14 @@
+-- migrate:up
+-- Match the listing order, created_at DESC with id as a tie-breaker, so
+-- keyset pagination walks the index without sorting
+CREATE INDEX idx_meals_chat_id_created_at_id
+ON meals(chat_id, created_at DESC, id DESC);
+DROP INDEX idx_meals_chat_id_created_at;
+CREATE INDEX idx_workouts_chat_id_created_at_id
+ON workouts(chat_id, created_at DESC, id DESC);
+DROP INDEX idx_workouts_chat_id_created_at;
+-- migrate:down
+CREATE INDEX idx_workouts_chat_id_created_at ON workouts(chat_id, created_at);
+DROP INDEX idx_workouts_chat_id_created_at_id;
+CREATE INDEX idx_meals_chat_id_created_at ON meals(chat_id, created_at);
+DROP INDEX idx_meals_chat_id_created_at_id;
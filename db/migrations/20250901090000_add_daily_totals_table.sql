@@ -0,0 +1,64 @@
+-- migrate:up
+-- Per chat and UTC day rollup of meals and workouts, maintained by the
+-- services in the same transaction as every write
+CREATE TABLE daily_totals (
+    chat_id BIGINT NOT NULL,
+    date DATE NOT NULL,
+    calories INTEGER NOT NULL DEFAULT 0,
+    protein INTEGER NOT NULL DEFAULT 0,
+    carbs INTEGER NOT NULL DEFAULT 0,
+    fat INTEGER NOT NULL DEFAULT 0,
+    calories_burned INTEGER NOT NULL DEFAULT 0,
+    meal_count INTEGER NOT NULL DEFAULT 0,
+    workout_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, date)
+);
+INSERT INTO daily_totals (
+    chat_id,
+    date,
+    calories,
+    protein,
+    carbs,
+    fat,
+    calories_burned,
+    meal_count,
+    workout_count
+)
+SELECT
+    chat_id,
+    date,
+    SUM(calories),
+    SUM(protein),
+    SUM(carbs),
+    SUM(fat),
+    SUM(calories_burned),
+    SUM(meal_count),
+    SUM(workout_count)
+FROM (
+    SELECT
+        chat_id,
+        (created_at AT TIME ZONE 'UTC')::date AS date,
+        COALESCE(calories, 0) AS calories,
+        COALESCE(protein, 0) AS protein,
+        COALESCE(carbs, 0) AS carbs,
+        COALESCE(fat, 0) AS fat,
+        0 AS calories_burned,
+        1 AS meal_count,
+        0 AS workout_count
+    FROM meals
+    UNION ALL
+    SELECT
+        chat_id,
+        (created_at AT TIME ZONE 'UTC')::date,
+        0,
+        0,
+        0,
+        0,
+        COALESCE(calories_burned, 0),
+        0,
+        1
+    FROM workouts
+) AS entries
+GROUP BY chat_id, date;
+-- migrate:down
+DROP TABLE daily_totals;
@@ -0,0 +1,14 @@
+-- migrate:up
+-- Rows written while payloads were JSON-encoded before reaching the jsonb
+-- codec hold a JSON string wrapping the actual value, store the value itself
+UPDATE memory_messages
+SET message = (message #>> '{}')::jsonb
+WHERE jsonb_typeof(message) = 'string';
+UPDATE meals
+SET ingredients = (ingredients #>> '{}')::jsonb
+WHERE jsonb_typeof(ingredients) = 'string';
+UPDATE update_jobs
+SET payload = (payload #>> '{}')::jsonb
+WHERE jsonb_typeof(payload) = 'string';
+-- migrate:down
+-- Nothing to do, the unwrapped values are what the application reads
@@ -0,0 +1,10 @@
+-- migrate:up
+-- Per chat preferences, a missing row means the defaults
+CREATE TABLE chat_settings (
+    chat_id BIGINT PRIMARY KEY,
+    timezone TEXT NOT NULL DEFAULT 'UTC',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+-- migrate:down
+DROP TABLE chat_settings;
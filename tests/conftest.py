@@ -0,0 +1,61 @@
+import datetime
+import os
+
+# Settings are read at import time, these only need to be present
+os.environ.setdefault("BOT_TOKEN", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/test")
+
+import pytest  # noqa: E402
+from pydantic_ai import models  # noqa: E402
+
+from backend.agent import Deps  # noqa: E402
+from backend.clients.telegram.models import Chat, TextMessage, User  # noqa: E402
+from backend.models import ChatContext, DailyTotals  # noqa: E402
+
+# Tests run on local test models only, a real model request fails
+models.ALLOW_MODEL_REQUESTS = False
+
+CHAT_ID = 42
+CHAT = Chat(id=CHAT_ID, first_name="Test", type="private")
+USER = User(id=CHAT_ID, is_bot=False, first_name="Test")
+
+
+class FakeSender:
+    """Records what would be sent to Telegram."""
+
+    def __init__(self) -> None:
+        self.sent: list[tuple[int, str, bool]] = []
+        self.edits: list[tuple[int, int, str]] = []
+
+    async def send_message(self, chat_id: int, message: str, status: bool = False):
+        self.sent.append((chat_id, message, status))
+        return {"ok": True, "result": {"message_id": len(self.sent)}}
+
+    async def edit_message_text(self, chat_id: int, message_id: int, message: str):
+        self.edits.append((chat_id, message_id, message))
+        return {"ok": True, "result": {"message_id": message_id}}
+
+
+def text_message(text: str) -> TextMessage:
+    return TextMessage(message_id=1, chat=CHAT, user=USER, date=0, text=text)
+
+
+@pytest.fixture
+def sender() -> FakeSender:
+    return FakeSender()
+
+
+@pytest.fixture
+def deps() -> Deps:
+    """Deps without services, for runs whose tools don't touch the database."""
+    now = datetime.datetime.now(datetime.UTC)
+    return Deps(
+        chat_id=CHAT_ID,
+        meal_service=None,  # type: ignore[arg-type]
+        workout_service=None,  # type: ignore[arg-type]
+        totals_service=None,  # type: ignore[arg-type]
+        food_database=None,  # type: ignore[arg-type]
+        chat_settings_service=None,  # type: ignore[arg-type]
+        context=ChatContext(now=now, today=DailyTotals(date=now.date())),
+    )
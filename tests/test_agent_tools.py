@@ -0,0 +1,33 @@
+import pytest
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RetryPromptPart,
+    TextPart,
+    ToolCallPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from backend.agent import Deps, agent
+
+
+@pytest.mark.parametrize("limit", [0, -1, 201])
+async def test_list_limit_out_of_bounds_is_retried(deps: Deps, limit: int):
+    def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        if len(messages) == 1:
+            args = {
+                "start_time": "2025-09-01T00:00:00Z",
+                "end_time": "2025-09-02T00:00:00Z",
+                "limit": limit,
+            }
+            return ModelResponse(parts=[ToolCallPart("list_meals", args)])
+        return ModelResponse(parts=[TextPart("done")])
+
+    # The meal service isn't called, the arguments are rejected first
+    result = await agent.run("list", deps=deps, model=FunctionModel(respond))
+
+    retry = result.all_messages()[2]
+    assert isinstance(retry, ModelRequest)
+    assert isinstance(retry.parts[0], RetryPromptPart)
+    assert result.output == "done"
@@ -0,0 +1,83 @@
+import dataclasses
+import datetime
+from contextlib import asynccontextmanager
+
+from pydantic_ai.messages import ModelMessage, ModelResponse, SystemPromptPart, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from backend.agent import Deps, agent
+from backend.models import Meal, Workout
+from backend.services.totals_service import TotalsService
+from tests.conftest import CHAT_ID
+
+# 23:30 on 2025-09-05 in Los Angeles, already the 6th in UTC
+NOW = datetime.datetime(2025, 9, 6, 6, 30, tzinfo=datetime.UTC)
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.args: tuple = ()
+
+    async def fetchrow(self, query: str, *args):
+        self.args = args
+        return {
+            "calories": 1800,
+            "protein": 90,
+            "carbs": 200,
+            "fat": 60,
+            "calories_burned": 300,
+            "meal_count": 3,
+            "workout_count": 1,
+        }
+
+
+class FakePool:
+    def __init__(self) -> None:
+        self.conn = FakeConnection()
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+async def test_today_is_the_users_local_day():
+    pool = FakePool()
+    totals = await TotalsService(pool, CHAT_ID).day_totals(  # type: ignore[arg-type]
+        NOW, "America/Los_Angeles"
+    )
+
+    assert totals.date == datetime.date(2025, 9, 5)
+    assert totals.calories == 1800
+    _, start, end = pool.conn.args
+    assert start == datetime.datetime(2025, 9, 5, 7, tzinfo=datetime.UTC)
+    assert end == datetime.datetime(2025, 9, 6, 7, tzinfo=datetime.UTC)
+
+
+def system_prompt(messages: list[ModelMessage]) -> str:
+    return "\n".join(
+        part.content
+        for message in messages
+        for part in message.parts
+        if isinstance(part, SystemPromptPart)
+    )
+
+
+async def test_missing_values_are_shown_as_unknown(deps: Deps):
+    deps = dataclasses.replace(
+        deps,
+        context=deps.context.model_copy(
+            update={
+                "recent_meals": [Meal(name="Toast", ingredients=[])],
+                "recent_workouts": [Workout(name="running", type="cardio")],
+            }
+        ),
+    )
+
+    def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[TextPart(system_prompt(messages))])
+
+    result = await agent.run("hi", deps=deps, model=FunctionModel(respond))
+
+    assert "Toast: unknown (id" in result.output
+    assert "running, unknown (id" in result.output
+    assert "None" not in result.output
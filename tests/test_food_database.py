@@ -0,0 +1,84 @@
+import pytest
+
+from backend.models import Ingredient
+from backend.services.food_database import BUNDLED_FOODS, FoodDatabase
+
+
+@pytest.fixture(scope="module")
+def foods(tmp_path_factory: pytest.TempPathFactory):
+    database = FoodDatabase.load(
+        BUNDLED_FOODS, tmp_path_factory.mktemp("foods") / "foods.bin"
+    )
+    yield database
+    database.close()
+
+
+def matched(foods: FoodDatabase, name: str) -> tuple[str, float] | None:
+    match = foods.match(name)
+    return match and (foods.names[match[0]], round(match[1], 2))
+
+
+@pytest.mark.parametrize(
+    ("name", "food"),
+    [
+        ("banana", "banana"),
+        ("Bananas,", "banana"),
+        ("green apple", "apple"),
+        ("grilled chicken breast", "chicken breast"),
+        ("large ripe banana", "banana"),
+    ],
+)
+def test_exact_matches(foods: FoodDatabase, name: str, food: str):
+    assert matched(foods, name) == (food, 1.0)
+
+
+@pytest.mark.parametrize(
+    ("name", "food"),
+    [
+        ("bananna", "banana"),
+        ("chiken breast", "chicken breast"),
+        ("peanut buter", "peanut butter"),
+    ],
+)
+def test_typos_are_guesses(foods: FoodDatabase, name: str, food: str):
+    match = matched(foods, name)
+    assert match is not None
+    assert match[0] == food
+    assert foods.min_score <= match[1] < 1.0
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        # Dishes, not their main ingredient
+        "carrot cake",
+        "banana bread",
+        "butter chicken",
+        "orange chicken",
+        "sweet potato fries",
+        "strawberry jam",
+        "coconut water",
+        # Word order counts
+        "chocolate milk",
+        # Only preparation words
+        "grilled",
+    ],
+)
+def test_no_match(foods: FoodDatabase, name: str):
+    assert foods.match(name) is None
+
+
+def test_lookup_totals_only_exact_matches(foods: FoodDatabase):
+    lookup = foods.lookup(
+        [
+            Ingredient(name="banana", quantity=200),
+            Ingredient(name="bananna", quantity=100),
+            Ingredient(name="carrot cake", quantity=100),
+        ]
+    )
+
+    banana, typo, cake = lookup.ingredients
+    assert banana.match_score == 1.0
+    assert lookup.calories == round(banana.calories)
+    assert typo.food == "banana" and typo.match_score < 1.0
+    assert cake.food is None and cake.calories is None
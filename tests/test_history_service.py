@@ -0,0 +1,151 @@
+import datetime
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from backend.services.history_service import (
+    HistoryService,
+    Summary,
+    estimate_tokens,
+    split_turns,
+)
+from tests.conftest import CHAT_ID
+
+DATE = datetime.date(2025, 9, 5)
+
+
+class StubHistoryService(HistoryService):
+    """Reads `summary` instead of the database, records refreshes."""
+
+    def __init__(self, summary: Summary | None = None, **kwargs) -> None:
+        super().__init__(None, **kwargs)  # type: ignore[arg-type]
+        self.summary = summary
+        self.refreshed: list[list[ModelMessage]] = []
+
+    async def get_summary(self, chat_id, date, db=None) -> Summary | None:
+        return self.summary
+
+    def refresh_in_background(self, chat_id, folded, summary, date) -> None:
+        self.refreshed.append(folded)
+
+
+def turn(text: str, tool: bool = False) -> list[ModelMessage]:
+    """A user prompt and its reply, with a tool call in between if `tool`."""
+    messages: list[ModelMessage] = [ModelRequest(parts=[UserPromptPart(text)])]
+    if tool:
+        messages += [
+            ModelResponse(parts=[ToolCallPart("list_meals", {}, "call-1")]),
+            ModelRequest(parts=[ToolReturnPart("list_meals", [], "call-1")]),
+        ]
+    messages.append(ModelResponse(parts=[TextPart("ok")]))
+    return messages
+
+
+def day(*turns: list[ModelMessage]) -> list[ModelMessage]:
+    """A day's memory, the system prompt lives in its first request."""
+    messages = [message for messages in turns for message in messages]
+    first = messages[0]
+    assert isinstance(first, ModelRequest)
+    messages[0] = ModelRequest(parts=[SystemPromptPart("You are Kai"), *first.parts])
+    return messages
+
+
+def user_prompts(messages: list[ModelMessage]) -> list[str]:
+    return [
+        part.content
+        for message in messages
+        for part in message.parts
+        if isinstance(part, UserPromptPart)
+    ]
+
+
+def system_prompts(messages: list[ModelMessage]) -> list[str]:
+    return [
+        part.content for part in messages[0].parts if isinstance(part, SystemPromptPart)
+    ]
+
+
+def test_split_turns_keeps_tool_calls_with_their_turn():
+    messages = day(turn("one"), turn("two", tool=True), turn("three"))
+
+    assert split_turns(messages) == [(0, 2), (2, 6), (6, 8)]
+
+
+async def test_everything_fits():
+    messages = day(turn("one"), turn("two", tool=True))
+    history = StubHistoryService()
+
+    assert await history.build(CHAT_ID, messages, DATE) == messages
+    assert history.refreshed == []
+
+
+async def test_older_turns_over_the_budget_are_folded():
+    messages = day(*(turn(f"turn {i} " + "x" * 400) for i in range(5)))
+    per_turn = estimate_tokens(turn("turn 0 " + "x" * 400))
+    # Room for two turns and a bit, next to the summary
+    history = StubHistoryService(
+        token_budget=100 + per_turn * 5 // 2, summary_token_budget=100
+    )
+
+    window = await history.build(CHAT_ID, messages, DATE)
+
+    assert [prompt[:6] for prompt in user_prompts(window)] == ["turn 3", "turn 4"]
+    assert history.refreshed == [messages[:6]]
+    # The system prompt moves to the first kept request
+    assert system_prompts(window) == ["You are Kai"]
+
+
+async def test_turns_over_max_turns_are_folded():
+    messages = day(*(turn(f"turn {i}") for i in range(5)))
+    history = StubHistoryService(max_turns=3)
+
+    window = await history.build(CHAT_ID, messages, DATE)
+
+    assert user_prompts(window) == ["turn 2", "turn 3", "turn 4"]
+
+
+async def test_an_oversized_latest_turn_is_still_kept():
+    messages = day(turn("earlier"), turn("huge " + "x" * 10_000, tool=True))
+    history = StubHistoryService(token_budget=500, summary_token_budget=100)
+
+    window = await history.build(CHAT_ID, messages, DATE)
+
+    assert [prompt[:4] for prompt in user_prompts(window)] == ["huge"]
+    assert window[1:] == messages[3:]
+    assert history.refreshed == [messages[:2]]
+
+
+async def test_stale_summary_is_used_and_refreshed():
+    messages = day(*(turn(f"turn {i}") for i in range(5)))
+    # Covers the first turn only, the window starts at the fourth
+    history = StubHistoryService(
+        summary=Summary(text="Had oatmeal", through_seq=1), max_turns=2
+    )
+
+    window = await history.build(CHAT_ID, messages, DATE)
+
+    assert system_prompts(window) == [
+        "You are Kai",
+        "Summary of the earlier conversation today:\nHad oatmeal",
+    ]
+    assert user_prompts(window) == ["turn 3", "turn 4"]
+    assert history.refreshed == [messages[:6]]
+
+
+async def test_up_to_date_summary_is_not_refreshed():
+    messages = day(*(turn(f"turn {i}") for i in range(5)))
+    history = StubHistoryService(
+        summary=Summary(text="Had oatmeal", through_seq=5), max_turns=2
+    )
+
+    await history.build(CHAT_ID, messages, DATE)
+
+    assert history.refreshed == []
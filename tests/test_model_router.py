@@ -0,0 +1,114 @@
+import pytest
+
+from backend.clients.telegram.models import (
+    Document,
+    DocumentMessage,
+    Image,
+    ImageMessage,
+)
+from backend.metrics import metrics
+from backend.services.model_router import ModelRouter
+from tests.conftest import CHAT, USER, text_message
+
+
+@pytest.fixture
+def router() -> ModelRouter:
+    return ModelRouter(
+        fast_model="fast-model",
+        default_model="default-model",
+        large_model="large-model",
+        fast_max_chars=160,
+        large_min_chars=600,
+    )
+
+
+def image_message() -> ImageMessage:
+    return ImageMessage(
+        message_id=1,
+        chat=CHAT,
+        user=USER,
+        date=0,
+        images=[Image(file_id="photo", file_unique_id="photo", width=800, height=600)],
+    )
+
+
+def document_message() -> DocumentMessage:
+    return DocumentMessage(
+        message_id=1,
+        chat=CHAT,
+        user=USER,
+        date=0,
+        document=Document(
+            file_name="menu.pdf",
+            mime_type="application/pdf",
+            file_id="doc",
+            file_unique_id="doc",
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    ("text", "tier", "reason"),
+    [
+        ("thanks!", "fast", "small_talk"),
+        ("Thank you, good night", "fast", "small_talk"),
+        ("I had oatmeal with a banana", "fast", "short"),
+        ("yes", "default", "confirmation"),
+        ("No, keep it", "default", "confirmation"),
+        ("sure", "default", "confirmation"),
+        ("ok", "default", "confirmation"),
+        ("👍", "default", "confirmation"),
+        ("nothing for lunch, just coffee", "fast", "short"),
+        ("For lunch I had " + "a big salad with chicken, " * 8, "default", "text"),
+        ("Why am I not losing weight?", "large", "complex"),
+        ("Should I eat more protein", "large", "complex"),
+        ("I had " + "a very long meal description, " * 25, "large", "complex"),
+    ],
+)
+def test_routes_text(router: ModelRouter, text: str, tier: str, reason: str):
+    route = router.route(text_message(text), text)
+
+    assert (route.tier, route.reason) == (tier, reason)
+    assert route.model == f"{tier}-model"
+
+
+def test_routes_images_on_their_caption(router: ModelRouter):
+    assert router.route(image_message(), None).reason == "image"
+    assert router.route(image_message(), "lunch").tier == "default"
+
+    route = router.route(image_message(), "Should I eat this before a run?")
+    assert (route.tier, route.reason) == ("large", "image_question")
+
+
+def test_routes_documents_to_the_large_model(router: ModelRouter):
+    route = router.route(document_message())
+
+    assert (route.tier, route.reason, route.model) == (
+        "large",
+        "document",
+        "large-model",
+    )
+
+
+def test_disabled_routes_everything_to_the_default_model(router: ModelRouter):
+    router.enabled = False
+
+    for message, text in [
+        (text_message("thanks"), "thanks"),
+        (document_message(), None),
+        (text_message("Why?"), "Why?"),
+    ]:
+        route = router.route(message, text)
+        assert (route.tier, route.reason) == ("default", "disabled")
+
+
+def test_counts_routes_per_tier_and_reason(router: ModelRouter):
+    before = metrics.snapshot()["counters"]
+
+    router.route(text_message("thanks"), "thanks")
+
+    after = metrics.snapshot()["counters"]
+    assert after["router.fast"] == before.get("router.fast", 0) + 1
+    assert (
+        after["router.fast.small_talk"] == before.get("router.fast.small_talk", 0) + 1
+    )
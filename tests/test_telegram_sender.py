@@ -0,0 +1,162 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.clients.telegram.telegram import TelegramRetryAfter
+from backend.services.telegram_sender import TelegramSender, split_message
+from tests.conftest import CHAT_ID, FakeSender
+
+
+class FloodedSender(FakeSender):
+    """Answers its first `floods` sends with flood control."""
+
+    def __init__(self, floods: int, retry_after: float) -> None:
+        super().__init__()
+        self.floods = floods
+        self.retry_after = retry_after
+        self.calls = 0
+
+    async def send_message(self, chat_id: int, message: str, status: bool = False):
+        self.calls += 1
+        if self.floods:
+            self.floods -= 1
+            response = httpx.Response(
+                429, request=httpx.Request("POST", "https://telegram.test")
+            )
+            raise TelegramRetryAfter(response, self.retry_after)
+        return await super().send_message(chat_id, message, status)
+
+
+class BlockedSender(FakeSender):
+    """Holds every call until `release` is set."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def send_message(self, chat_id: int, message: str, status: bool = False):
+        await self.release.wait()
+        return await super().send_message(chat_id, message, status)
+
+    async def edit_message_text(self, chat_id: int, message_id: int, message: str):
+        await self.release.wait()
+        return await super().edit_message_text(chat_id, message_id, message)
+
+
+def sender_for(telegram: FakeSender, **kwargs) -> TelegramSender:
+    """A sender whose rate limits don't get in the way."""
+    return TelegramSender(
+        telegram,  # type: ignore[arg-type]
+        chat_rate=1000,
+        chat_burst=1000,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize(
+    ("text", "chunks"),
+    [
+        ("hello", ["hello"]),
+        ("one\ntwo\nthree", ["one\ntwo", "three"]),
+        ("abcdefghij", ["abcdefgh", "ij"]),
+        ("one" + "\n" * 12, ["one"]),
+        ("\n\n", []),
+        ("   ", []),
+        ("", []),
+    ],
+)
+def test_split_message(text: str, chunks: list[str]):
+    assert split_message(text, max_length=8) == chunks
+
+
+async def test_blank_messages_are_not_sent():
+    sender = FakeSender()
+    telegram = TelegramSender(sender)  # type: ignore[arg-type]
+
+    assert await telegram.send_message(CHAT_ID, "\n\n") is None
+    assert sender.sent == []
+
+
+async def test_idle_chat_buckets_are_dropped_once_full():
+    sender = FakeSender()
+    telegram = TelegramSender(sender, chat_rate=20, chat_burst=2)  # type: ignore[arg-type]
+
+    await telegram.send_message(CHAT_ID, "hello")
+    await asyncio.sleep(0)
+    # A token short of full, refilled in 50 ms
+    assert CHAT_ID in telegram._buckets
+
+    await asyncio.sleep(0.1)
+    assert CHAT_ID not in telegram._buckets
+    assert sender.sent == [(CHAT_ID, "hello", False)]
+
+
+async def test_flood_control_is_waited_out():
+    telegram = FloodedSender(floods=1, retry_after=0.05)
+    sender = sender_for(telegram)
+
+    started = asyncio.get_running_loop().time()
+    result = await sender.send_message(CHAT_ID, "hello")
+
+    assert asyncio.get_running_loop().time() - started >= 0.05
+    assert result == {"ok": True, "result": {"message_id": 1}}
+    assert telegram.calls == 2
+
+
+async def test_flood_control_counts_towards_max_attempts():
+    telegram = FloodedSender(floods=100, retry_after=0)
+    sender = sender_for(telegram, max_attempts=3)
+
+    with pytest.raises(TelegramRetryAfter):
+        await sender.send_message(CHAT_ID, "hello")
+    assert telegram.calls == 3
+    assert telegram.sent == []
+
+
+async def test_status_messages_are_coalesced_and_dropped():
+    telegram = BlockedSender()
+    sender = sender_for(telegram)
+
+    first = asyncio.create_task(sender.send_message(CHAT_ID, "first"))
+    await asyncio.sleep(0)
+    # Queued behind the message being sent, the second replaces the first
+    waits = [
+        asyncio.create_task(sender.send_message(CHAT_ID, text, status=True))
+        for text in ("wait", "still waiting")
+    ]
+    await asyncio.sleep(0)
+    telegram.release.set()
+    await asyncio.gather(first, *waits)
+    assert [text for _, text, _ in telegram.sent] == ["first", "still waiting"]
+
+    # Dropped by the regular message queued behind it
+    telegram.release.clear()
+    blocking = asyncio.create_task(sender.send_message(CHAT_ID, "second"))
+    await asyncio.sleep(0)
+    wait = asyncio.create_task(sender.send_message(CHAT_ID, "wait", status=True))
+    await asyncio.sleep(0)
+    reply = asyncio.create_task(sender.send_message(CHAT_ID, "reply"))
+    await asyncio.sleep(0)
+    telegram.release.set()
+    await asyncio.gather(blocking, reply)
+
+    assert await wait is None
+    assert [text for _, text, _ in telegram.sent[2:]] == ["second", "reply"]
+
+
+async def test_pending_edits_are_merged():
+    telegram = BlockedSender()
+    sender = sender_for(telegram)
+
+    first = asyncio.create_task(sender.send_message(CHAT_ID, "Let"))
+    await asyncio.sleep(0)
+    edits = [
+        asyncio.create_task(sender.edit_message_text(CHAT_ID, 1, text))
+        for text in ("Let me", "Let me check", "Let me check that")
+    ]
+    await asyncio.sleep(0)
+    telegram.release.set()
+    await asyncio.gather(first, *edits)
+
+    assert telegram.edits == [(CHAT_ID, 1, "Let me check that")]
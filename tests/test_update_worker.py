@@ -0,0 +1,105 @@
+import asyncio
+import datetime
+
+from backend.clients.telegram.models import Update
+from backend.services.update_queue import Job
+from backend.tasks.update_worker import UpdateWorkerPool
+from tests.conftest import text_message
+
+
+class FakeQueue:
+    """Hands out the given jobs once, its first `flaky` writes fail."""
+
+    def __init__(self, jobs: list[Job], flaky: int = 0) -> None:
+        self.jobs = jobs
+        self.flaky = flaky
+        self.wakeup = asyncio.Event()
+        self.completed: list[int] = []
+        self.failed: list[tuple[int, float | None]] = []
+
+    async def claim(self, limit: int, visibility_timeout: float) -> list[Job]:
+        jobs, self.jobs = self.jobs[:limit], self.jobs[limit:]
+        return jobs
+
+    def _write(self) -> None:
+        if self.flaky:
+            self.flaky -= 1
+            raise ConnectionError("connection lost")
+
+    async def complete(self, update_id: int) -> None:
+        self._write()
+        self.completed.append(update_id)
+
+    async def fail(self, update_id: int, error: str, retry_in: float | None) -> None:
+        self._write()
+        self.failed.append((update_id, retry_in))
+
+    async def release(self, update_ids: list[int]) -> None:
+        pass
+
+    async def depth(self) -> dict[str, int]:
+        return {}
+
+
+class FakeWebhookService:
+    def __init__(self, failing: frozenset[int] = frozenset()) -> None:
+        self.failing = failing
+
+    async def process_update(self, payload: Update, telegram) -> None:
+        if payload.update_id in self.failing:
+            raise RuntimeError("agent run failed")
+
+
+def job(update_id: int, attempts: int = 1) -> Job:
+    return Job(
+        update=Update(update_id=update_id, message=text_message("hi")),
+        attempts=attempts,
+        created_at=datetime.datetime.now(datetime.UTC),
+    )
+
+
+def worker_pool(queue: FakeQueue, service: FakeWebhookService) -> UpdateWorkerPool:
+    return UpdateWorkerPool(
+        queue,  # type: ignore[arg-type]
+        service,  # type: ignore[arg-type]
+        None,  # type: ignore[arg-type]
+        concurrency=1,
+        poll_interval=0.01,
+        retry_backoff=0.01,
+    )
+
+
+async def wait_for(condition, timeout: float = 1.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_outcome_is_recorded_after_a_transient_error():
+    queue = FakeQueue([job(1), job(2)], flaky=1)
+    workers = worker_pool(queue, FakeWebhookService(failing=frozenset({2})))
+    workers.start()
+    try:
+        await wait_for(lambda: queue.completed and queue.failed)
+    finally:
+        await workers.stop()
+
+    assert queue.completed == [1]
+    assert queue.failed == [(2, 0.01)]
+    assert not workers._claimed
+
+
+async def test_worker_keeps_running_when_outcomes_cant_be_recorded():
+    queue = FakeQueue([job(1)], flaky=3)
+    workers = worker_pool(queue, FakeWebhookService())
+    workers.start()
+    try:
+        await wait_for(lambda: not workers._claimed)
+        queue.jobs.append(job(2))
+        queue.wakeup.set()
+        await wait_for(lambda: queue.completed)
+        assert not workers._tasks[0].done()
+    finally:
+        await workers.stop()
+
+    assert queue.completed == [2]
@@ -0,0 +1,195 @@
+import asyncio
+import dataclasses
+import json
+from collections.abc import AsyncIterator
+
+import pytest
+from pydantic_ai import BinaryContent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import (
+    AgentInfo,
+    DeltaToolCall,
+    DeltaToolCalls,
+    FunctionModel,
+)
+from pydantic_core import to_jsonable_python
+
+from backend.agent import Deps, agent
+from backend.clients.telegram.models import Update
+from backend.models import Meal
+from backend.services.chat_scheduler import ChatScheduler
+from backend.services.model_router import ModelRouter
+from backend.services.telegram_sender import TelegramSender
+from backend.services.webhook_service import (
+    WebhookService,
+    notify_user_on_delay,
+    without_files,
+)
+from tests.conftest import CHAT_ID, FakeSender, text_message
+
+
+def answers_as(name: str) -> FunctionModel:
+    """A model always answering with its own name."""
+
+    def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[TextPart(name)])
+
+    return FunctionModel(respond)
+
+
+def webhook_service(router: ModelRouter, **kwargs) -> WebhookService:
+    """A service for replying to text, none of the media or storage is used."""
+    return WebhookService(
+        None,  # type: ignore[arg-type]
+        None,  # type: ignore[arg-type]
+        None,  # type: ignore[arg-type]
+        None,  # type: ignore[arg-type]
+        None,  # type: ignore[arg-type]
+        ChatScheduler(),
+        None,  # type: ignore[arg-type]
+        None,  # type: ignore[arg-type]
+        router,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def router() -> ModelRouter:
+    return ModelRouter(
+        fast_model=answers_as("fast"),
+        default_model=answers_as("default"),
+        large_model=answers_as("large"),
+    )
+
+
+@pytest.mark.parametrize(
+    ("text", "model"),
+    [
+        ("thanks!", "fast"),
+        ("yes", "default"),
+        ("Why am I not losing weight?", "large"),
+    ],
+)
+async def test_replies_with_the_routed_model(
+    router: ModelRouter, deps: Deps, sender: FakeSender, text: str, model: str
+):
+    service = webhook_service(router)
+
+    result = await service.process_text_message(text_message(text), deps, sender, [])
+
+    assert result.output == model
+    assert sender.sent == [(CHAT_ID, model, False)]
+
+
+async def test_replies_with_the_default_model_when_routing_is_disabled(
+    router: ModelRouter, deps: Deps, sender: FakeSender
+):
+    router.enabled = False
+    service = webhook_service(router)
+
+    result = await service.process_text_message(
+        text_message("thanks!"), deps, sender, []
+    )
+
+    assert result.output == "default"
+
+
+class FakeMealService:
+    def __init__(self) -> None:
+        self.saved: list[Meal] = []
+
+    async def save(self, meal: Meal) -> Meal:
+        self.saved.append(meal)
+        return meal
+
+
+def called_tools(messages: list[ModelMessage]) -> bool:
+    request = messages[-1]
+    assert isinstance(request, ModelRequest)
+    return any(isinstance(part, ToolReturnPart) for part in request.parts)
+
+
+async def talks_then_logs(
+    messages: list[ModelMessage], info: AgentInfo
+) -> AsyncIterator[str | DeltaToolCalls]:
+    """Writes a sentence before calling save_meal, in the same response."""
+    if called_tools(messages):
+        yield "Logged."
+        return
+    yield "Sure, logging "
+    yield "your eggs."
+    meal = {"name": "Eggs", "ingredients": [{"name": "egg", "quantity": 100}]}
+    yield {0: DeltaToolCall(name="save_meal", json_args=json.dumps(meal))}
+
+
+async def test_stream_runs_tool_calls_written_after_text(
+    router: ModelRouter, deps: Deps, sender: FakeSender
+):
+    meal_service = FakeMealService()
+    deps = dataclasses.replace(deps, meal_service=meal_service)  # type: ignore[arg-type]
+    service = webhook_service(router, reply_mode="stream", stream_edit_interval=0)
+
+    with agent.override(model=FunctionModel(stream_function=talks_then_logs)):
+        result = await service.reply("two eggs", deps, [], sender)
+
+    assert [meal.name for meal in meal_service.saved] == ["Eggs"]
+    assert result.output == "Logged."
+    # The first response's text is replaced by the reply
+    assert sender.sent == [(CHAT_ID, "Sure, logging your eggs.", False)]
+    assert sender.edits[-1] == (CHAT_ID, 1, "Logged.")
+
+
+async def test_stream_skips_the_delay_notice_once_the_reply_shows(
+    router: ModelRouter, deps: Deps, sender: FakeSender
+):
+    async def slow(messages: list[ModelMessage], info: AgentInfo) -> AsyncIterator[str]:
+        yield "Let me"
+        await asyncio.sleep(0.6)
+        yield " think."
+
+    service = webhook_service(router, reply_mode="stream", stream_edit_interval=0)
+    telegram = TelegramSender(sender, chat_rate=100, chat_burst=100)  # type: ignore[arg-type]
+
+    @notify_user_on_delay(seconds=0.3)  # type: ignore[arg-type]
+    async def process_update(
+        service: WebhookService, payload: Update, telegram: TelegramSender
+    ) -> None:
+        await service.reply("hi", deps, [], telegram)
+
+    with agent.override(model=FunctionModel(stream_function=slow)):
+        await process_update(
+            service, Update(update_id=1, message=text_message("hi")), telegram
+        )
+    await telegram.aclose()
+
+    assert [message for _, message, _ in sender.sent] == ["Let me"]
+    assert sender.edits[-1][2] == "Let me think."
+
+
+async def test_audio_turns_are_stored_without_the_audio(
+    router: ModelRouter, deps: Deps, sender: FakeSender
+):
+    service = webhook_service(router)
+    result = await service.reply(
+        ["Listen to this", BinaryContent(data=b"\xff\xfb", media_type="audio/mpeg")],
+        deps,
+        [],
+        sender,  # type: ignore[arg-type]
+        model=answers_as("logged"),
+    )
+
+    stored = without_files(result.new_messages())
+
+    # JSON, as memory stores it
+    assert json.dumps(to_jsonable_python(stored))
+    prompt = stored[0].parts[-1]
+    assert isinstance(prompt, UserPromptPart)
+    assert prompt.content == ["Listen to this", "[The user sent a voice message]"]
+    assert stored[1:] == result.new_messages()[1:]